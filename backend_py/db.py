@@ -18,6 +18,7 @@ def init_db():
     import backend_py.models.users
     import backend_py.models.model_metrics
     import backend_py.models.enterprises
+    import backend_py.models.fx
     Base.metadata.create_all(bind=engine)
     try:
         with engine.connect() as conn:
@@ -34,4 +35,62 @@ def init_db():
             conn.execute(text("ALTER TABLE orders ADD COLUMN route TEXT"))
     except Exception:
         pass
+    for table, column in [
+        ('customs_items', 'hs_digits TEXT'),
+        ('customs_items', 'hs_chapter TEXT'),
+        ('customs_items', 'hs_heading TEXT'),
+        ('customs_headers', 'has_bad_hs INTEGER'),
+        ('customs_headers', 'has_missing_unit INTEGER'),
+        ('customs_headers', 'has_abnormal_qty INTEGER'),
+        ('logistics', 'etd_ts INTEGER'),
+        ('logistics', 'eta_ts INTEGER'),
+        ('logistics', 'atd_ts INTEGER'),
+        ('logistics', 'ata_ts INTEGER'),
+        ('logistics', 'last_event_ts INTEGER'),
+        ('logistics', 'milestones_parsed INTEGER'),
+    ]:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column}"))
+        except Exception:
+            pass
+    # 先回填再建索引，避免逐行维护新索引
+    from backend_py.services.milestones import backfill_milestones
+    with engine.begin() as conn:
+        backfill_milestones(conn)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logistics_milestones_pending ON logistics (milestones_parsed) WHERE milestones_parsed IS NULL"))
+    # 已存在的表不会由 create_all 补建索引，这里补齐 keyset 分页所需的 (排序键, id) 复合索引
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_headers_declare_date_id ON customs_headers (declare_date, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_enterprises_last_active_id ON enterprises (last_active, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_items_hs_digits_header ON customs_items (hs_digits, header_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_items_hs_chapter_header ON customs_items (hs_chapter, header_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_items_hs_heading_header ON customs_items (hs_heading, header_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_headers_has_bad_hs ON customs_headers (has_bad_hs)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_headers_has_missing_unit ON customs_headers (has_missing_unit)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_headers_has_abnormal_qty ON customs_headers (has_abnormal_qty)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_headers_updated_at ON customs_headers (updated_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customs_headers_order_id ON customs_headers (order_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logistics_etd_ts ON logistics (etd_ts)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logistics_eta_ts ON logistics (eta_ts)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logistics_open_eta ON logistics (eta_ts, carrier) WHERE ata_ts IS NULL"))
+    from backend_py.services.customs_index import backfill_customs_index
+    from backend_py.services.customs_facets import ensure_facets
+    from backend_py.services.enterprise_stats import ensure_stats
+    from backend_py.services.fx import ensure_rates
+    from backend_py.services.kpi_rollup import ensure_kpis
+    from backend_py.services.model_rollup import ensure_rollup
+    from backend_py.services.port_congestion import ensure_ports
+    with engine.begin() as conn:
+        backfill_customs_index(conn)
+        ensure_facets(conn)
+        ensure_rates(conn)
+        ensure_stats(conn)
+        ensure_kpis(conn)
+        ensure_rollup(conn)
+        ensure_ports(conn)
+    from backend_py.services.fts import ensure_fts
+    ensure_fts(engine)
 
@@ -13,9 +13,12 @@ from backend_py.routers.enterprises import router as enterprises_router
 from backend_py.routers.jobs import router as jobs_router
 from backend_py.routers.risk import router as risk_router
 from backend_py.routers.model_metrics import router as model_metrics_router
+from backend_py.routers.fx import router as fx_router
 from backend_py.routers.auth import router as auth_router
 from backend_py.routers.users import router as users_router
 from backend_py.seed import seed_all
+from backend_py.services.logistics_events import buffer as logistics_event_buffer
+from backend_py.services.model_traces import buffer as model_trace_buffer
 
 app = FastAPI()
 
@@ -51,6 +54,14 @@ app.include_router(enterprises_router)
 app.include_router(jobs_router)
 app.include_router(risk_router)
 app.include_router(model_metrics_router)
+app.include_router(fx_router)
+
+
+@app.on_event('shutdown')
+def flush_write_buffers():
+    # 退出前把缓冲中的轨迹事件与模型执行记录全部落库
+    logistics_event_buffer.stop()
+    model_trace_buffer.stop()
 
 
 @app.get('/api/health')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Date, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from backend_py.db import Base
 
@@ -20,8 +20,16 @@ class CustomsHeader(Base):
     country_dest = Column(String)
     status = Column(String)
     declare_date = Column(Date)
-    order_id = Column(String)
-    updated_at = Column(String)
+    order_id = Column(String, index=True)
+    updated_at = Column(String, index=True)
+    # 由明细聚合的数据质量标记（0/1），随 insert_item/upsert_header 维护
+    has_bad_hs = Column(Integer, index=True)
+    has_missing_unit = Column(Integer, index=True)
+    has_abnormal_qty = Column(Integer, index=True)
+
+    __table_args__ = (
+        Index('ix_customs_headers_declare_date_id', 'declare_date', 'id'),
+    )
 
 class CustomsItem(Base):
     __tablename__ = 'customs_items'
@@ -40,3 +48,71 @@ class CustomsItem(Base):
     tariff = Column(Float, default=0.0)
     excise = Column(Float, default=0.0)
     vat = Column(Float, default=0.0)
+    # 去掉 '.' 后的 HS 编码及其章(2位)/品目(4位)，用于走索引的 HS 筛选
+    hs_digits = Column(String)
+    hs_chapter = Column(String)
+    hs_heading = Column(String)
+
+    __table_args__ = (
+        Index('ix_customs_items_hs_digits_header', 'hs_digits', 'header_id'),
+        Index('ix_customs_items_hs_chapter_header', 'hs_chapter', 'header_id'),
+        Index('ix_customs_items_hs_heading_header', 'hs_heading', 'header_id'),
+    )
+
+# 报关单分面计数汇总（无筛选时的 status/port_code/trade_mode/hs_chapter 计数），随写入增量维护
+class CustomsFacetCount(Base):
+    __tablename__ = 'customs_facet_counts'
+    facet = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+
+# HS 编码前缀税率表：按最长前缀匹配明细的 hs_digits，供税费计算引擎使用
+class HsTaxRate(Base):
+    __tablename__ = 'hs_tax_rates'
+    hs_prefix = Column(String, primary_key=True)
+    tariff_rate = Column(Float, default=0.0)
+    excise_rate = Column(Float, default=0.0)
+    vat_rate = Column(Float, default=0.13)
+    description = Column(String)
+    updated_at = Column(String)
+
+# 数据质量扫描结果：每条命中规则的明细一行，按报关单增量重算
+class CustomsFinding(Base):
+    __tablename__ = 'customs_findings'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    rule = Column(String, nullable=False)
+    header_id = Column(String, index=True)
+    item_id = Column(String)
+    order_id = Column(String)
+    message = Column(String)
+    detected_at = Column(String)
+
+    __table_args__ = (
+        Index('ix_customs_findings_rule_id', 'rule', 'id'),
+    )
+
+# 口岸维度表：看板只展示登记在此的口岸
+class Port(Base):
+    __tablename__ = 'ports'
+    code = Column(String, primary_key=True)
+    name = Column(String)
+
+# 口岸拥堵当前值：按 order_id 关联的 (报关单, 运单) 对的 efficiency 合计与对数，随两侧写入增量维护
+class PortStats(Base):
+    __tablename__ = 'port_stats'
+    port_code = Column(String, primary_key=True)
+    eff_sum = Column(Float, default=0.0)
+    pairs = Column(Integer, default=0)
+    updated_at = Column(String)
+
+# 口岸拥堵时间序列：每个口岸每小时 / 每天一行，记录该时段内最后一次变更后的 port_stats 状态。
+# 按 (port_code, grain, bucket) 聚簇存储（WITHOUT ROWID），取一个窗口是一段主键范围扫描
+class PortCongestion(Base):
+    __tablename__ = 'port_congestion'
+    port_code = Column(String, primary_key=True)
+    grain = Column(String, primary_key=True)  # hour / day
+    bucket = Column(String, primary_key=True)  # YYYY-MM-DDTHH / YYYY-MM-DD（UTC）
+    eff_sum = Column(Float, default=0.0)
+    pairs = Column(Integer, default=0)
+
+    __table_args__ = {'sqlite_with_rowid': False}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime
+from sqlalchemy import Column, String, Integer, Float, DateTime, Index
 from datetime import datetime
 from backend_py.db import Base
 
@@ -16,3 +16,21 @@ class Enterprise(Base):
     service_eligible = Column(Integer, default=0)  # 0/1
     active_orders = Column(Integer, default=0)
     last_active = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_enterprises_last_active_id', 'last_active', 'id'),
+    )
+
+# 按企业名称（与 orders/customs_headers.enterprise 一致）维护的汇总指标，随路由写入增量更新，可全量重建纠偏
+class EnterpriseStats(Base):
+    __tablename__ = 'enterprise_stats'
+
+    enterprise = Column(String, primary_key=True)
+    orders_total = Column(Integer, default=0)
+    active_orders = Column(Integer, default=0, index=True)
+    gmv_cny = Column(Float, default=0.0, index=True)
+    settled_orders = Column(Integer, default=0)
+    declarations = Column(Integer, default=0, index=True)
+    cleared_declarations = Column(Integer, default=0)
+    clearance_rate = Column(Float, index=True)  # cleared_declarations / declarations，无报关单时为 NULL
+    updated_at = Column(String)
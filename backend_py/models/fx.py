@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Float
+from backend_py.db import Base
+
+# 折算人民币的汇率版本：同一币种按 valid_from 起效，订单按下单日取当日有效的版本。
+# 按 (currency, valid_from) 聚簇存储（WITHOUT ROWID），折算时按币种取不晚于某日的最新版本是一次索引查找
+class FxRate(Base):
+    __tablename__ = 'fx_rates'
+    currency = Column(String, primary_key=True)
+    valid_from = Column(String, primary_key=True)  # YYYY-MM-DD
+    rate = Column(Float, nullable=False)
+    updated_at = Column(String)
+
+    __table_args__ = {'sqlite_with_rowid': False}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float
+from sqlalchemy import Column, String, Integer, Float, Index, text
 from backend_py.db import Base
 
 class Logistics(Base):
@@ -24,3 +24,35 @@ class Logistics(Base):
     insurance_cost = Column(Float, default=0.0)
     carrier = Column(String, nullable=True)
     warehouse_status = Column(String, nullable=True)
+    # etd/eta/atd/ata 解析后的 UTC epoch 秒，随写入维护，用于时间范围与超期查询
+    etd_ts = Column(Integer, index=True)
+    eta_ts = Column(Integer, index=True)
+    atd_ts = Column(Integer)
+    ata_ts = Column(Integer)
+    # 已投影到本行的最新轨迹事件时间，用于丢弃乱序到达的旧事件
+    last_event_ts = Column(Integer)
+    # 里程碑字符串已解析过（含无法解析的原值）时为 1；为 NULL 的行由启动时回填处理
+    milestones_parsed = Column(Integer)
+
+    __table_args__ = (
+        # 仅覆盖未到港（ata 为空）的在途运单，超期查询按 eta_ts 范围扫描
+        Index('ix_logistics_open_eta', 'eta_ts', 'carrier', sqlite_where=text('ata_ts IS NULL')),
+        # 只含待回填的行，启动时的回填检查不再扫全表
+        Index('ix_logistics_milestones_pending', 'milestones_parsed', sqlite_where=text('milestones_parsed IS NULL')),
+    )
+
+# 承运商轨迹事件（只追加）；logistics 的 status/atd/ata 是这些事件的增量投影
+class LogisticsEvent(Base):
+    __tablename__ = 'logistics_events'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    shipment_id = Column(String)
+    tracking_no = Column(String)
+    event_code = Column(String)
+    location = Column(String)
+    event_time = Column(String)
+    event_ts = Column(Integer)
+    received_at = Column(String)
+
+    __table_args__ = (
+        Index('ix_logistics_events_shipment_ts', 'shipment_id', 'event_ts'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Text, DateTime, Boolean
+from sqlalchemy import Column, String, Integer, Float, Text, DateTime, Boolean, Index
 from backend_py.db import Base
 from datetime import datetime
 
@@ -23,3 +23,30 @@ class ModelExecutionLog(Base):
     latency_ms = Column(Integer)
     status = Column(String) # 'success', 'warning', 'error'
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+# 看板 KPI 计数器：每个计数器一行，随业务写入在同一事务内累加，定期按明细表对账
+class KpiCounter(Base):
+    __tablename__ = 'kpi_counters'
+    name = Column(String, primary_key=True)  # 按日计数的键形如 gmv_cny:YYYY-MM-DD
+    value = Column(Float, default=0.0)
+    updated_at = Column(String)
+
+# 模型按日汇总：每个模型每天一行，写入执行记录 / 准确率指标时累加，ROI 与准确率趋势直接按日读取。
+# 按 (model_id, day) 聚簇存储（WITHOUT ROWID），单模型趋势是一段主键范围扫描
+class ModelDailyRollup(Base):
+    __tablename__ = 'model_daily_rollup'
+    model_id = Column(String, primary_key=True)  # 执行记录无 model_id 时记为 ''
+    day = Column(String, primary_key=True)  # YYYY-MM-DD（UTC）
+    calls = Column(Integer, default=0)
+    passed = Column(Integer, default=0)  # business_outcome 不属于 blocked/reject/error
+    risk = Column(Integer, default=0)  # business_outcome 含 block / reject
+    errors = Column(Integer, default=0)  # status = 'error'
+    impact_sum = Column(Float, default=0.0)
+    latency_sum = Column(Float, default=0.0)
+    accuracy_sum = Column(Float, default=0.0)
+    accuracy_n = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index('ix_model_daily_rollup_day', 'day'),
+        {'sqlite_with_rowid': False},
+    )
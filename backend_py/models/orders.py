@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime
+from sqlalchemy import Column, String, Integer, Float, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend_py.db import Base
@@ -17,3 +17,7 @@ class Order(Base):
     incoterms = Column(String, default='')
     trade_terms = Column(String, default='')
     route = Column(String, default='')
+
+    __table_args__ = (
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
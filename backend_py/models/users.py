@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Table, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, Table, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend_py.db import Base
@@ -27,6 +27,10 @@ class User(Base):
 
     roles = relationship('Role', secondary=user_roles, back_populates='users')
 
+    __table_args__ = (
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
+
     def set_password(self, password: str) -> None:
         self.password_hash = hashlib.sha256(password.encode()).hexdigest()
 
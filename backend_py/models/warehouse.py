@@ -9,3 +9,16 @@ class Inventory(Base):
     production = Column(Integer, default=0)
     sales = Column(Integer, default=0)
     efficiency = Column(Integer, default=0)
+
+# 库存日快照：每个产品每天一行，当天多次变更保留最后一次，供需求预测使用。
+# 按 (name, day) 聚簇存储（WITHOUT ROWID），按产品读取日序列时是顺序扫描
+class InventorySnapshot(Base):
+    __tablename__ = 'inventory_snapshots'
+    name = Column(String, primary_key=True)
+    day = Column(String, primary_key=True)  # YYYY-MM-DD（UTC）
+    current = Column(Integer, default=0)
+    production = Column(Integer, default=0)
+    sales = Column(Integer, default=0)
+    taken_at = Column(String)
+
+    __table_args__ = {'sqlite_with_rowid': False}
@@ -0,0 +1,61 @@
+import base64
+import json
+from sqlalchemy import String, tuple_, type_coerce
+
+
+def encode_cursor(key, id):
+    raw = json.dumps([key, id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """解析 cursor，非法 cursor 视为从第一页开始"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        key, id = json.loads(raw)
+        return key, id
+    except Exception:
+        return None
+
+
+def keyset_page(query, sort_col, id_col, cursor: str, limit: int, desc: bool = True):
+    """
+    Keyset 分页：按 (sort_col, id_col) 定位上一页末尾，避免 OFFSET 扫描丢弃前面的行。
+    排序键按数据库原始文本比较，与 ORDER BY 的顺序保持一致。
+    返回 (rows, next_cursor)，没有下一页时 next_cursor 为 None。
+    """
+    key = type_coerce(sort_col, String)
+    ident = type_coerce(id_col, String)
+    query = query.add_columns(key.label('_cursor_key'), ident.label('_cursor_id'))
+    pos = decode_cursor(cursor)
+    if sort_col is id_col:
+        if pos:
+            query = query.filter(key < pos[1] if desc else key > pos[1])
+        segments = [(query, [sort_col.desc() if desc else sort_col.asc()])]
+    else:
+        # NULL 排序键在 DESC 时排在最后，ASC 时排在最前；分段查询以便每段都能走 (sort_col, id) 索引
+        id_order = id_col.desc() if desc else id_col.asc()
+        values = (query.filter(sort_col.isnot(None)), [sort_col.desc() if desc else sort_col.asc(), id_order])
+        nulls = (query.filter(sort_col.is_(None)), [id_order])
+        segments = [values, nulls] if desc else [nulls, values]
+        if pos:
+            k, i = pos
+            idx = int((k is None) == desc)
+            q, order = segments[idx]
+            if k is None:
+                q = q.filter(ident < i if desc else ident > i)
+            else:
+                q = q.filter(tuple_(key, ident) < tuple_(k, i) if desc else tuple_(key, ident) > tuple_(k, i))
+            segments = [(q, order)] + segments[idx + 1:]
+    rows = []
+    for q, order in segments:
+        rows += q.order_by(*order).limit(limit + 1 - len(rows)).all()
+        if len(rows) > limit:
+            break
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return [r[0] for r in rows], next_cursor
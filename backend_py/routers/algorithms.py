@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from backend_py.db import SessionLocal
 from backend_py.models.algorithms import Algorithm
+from backend_py.services.kpi_rollup import on_algorithms_written
 from backend_py.schemas.algorithms import AlgorithmIn
 
 router = APIRouter(prefix='/api/algorithms')
@@ -42,9 +43,13 @@ def count_algorithms(q: str = '', db: Session = Depends(get_db)):
         query = query.filter((Algorithm.id.like(f'%{q}%')) | (Algorithm.name.like(f'%{q}%')))
     return {'count': query.count()}
 
+def _kpi_row(r):
+    return {'status': r.status, 'accuracy': r.accuracy}
+
 @router.post('')
 def upsert_algorithm(data: AlgorithmIn, db: Session = Depends(get_db)):
     r = db.query(Algorithm).filter(Algorithm.id == data.id).first()
+    old = {r.id: _kpi_row(r)} if r else {}
     if r:
         r.name = data.name
         r.category = data.category
@@ -75,5 +80,6 @@ def upsert_algorithm(data: AlgorithmIn, db: Session = Depends(get_db)):
             code=data.code
         )
         db.add(r)
+    on_algorithms_written(db, old, {r.id: _kpi_row(r)})
     db.commit()
     return {'ok': True}
@@ -1,9 +1,24 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import distinct, func, select
 from sqlalchemy.orm import Session
-from backend_py.db import SessionLocal
-from backend_py.models.customs import CustomsHeader, CustomsItem
-from backend_py.schemas.customs import CustomsHeaderIn, CustomsItemIn
+from backend_py.db import SessionLocal, engine
+from backend_py.pagination import keyset_page
+from backend_py.services import port_congestion
+from backend_py.services.count_cache import customs_header_counts
+from backend_py.services.customs_facets import FACETS, HEADER_FACETS, on_header_change, on_item_added, summary_facets
+from backend_py.services.customs_import import import_file
+from backend_py.services.customs_index import apply_hs_columns, refresh_header_flags
+from backend_py.services.customs_quality import RULES, last_watermark, scan_findings
+from backend_py.services.enterprise_stats import on_headers_written
+from backend_py.services.export import export_response
+from backend_py.services.fts import search_filter
+from backend_py.models.customs import CustomsFinding, CustomsHeader, CustomsItem, HsTaxRate
+from backend_py.schemas.customs import CustomsHeaderIn, CustomsItemIn, HsTaxRateIn
 
 router = APIRouter(prefix='/api/customs')
 
@@ -14,33 +29,94 @@ def get_db():
     finally:
         db.close()
 
-@router.get('/headers')
-def list_headers(q: str = '', status: str = 'all', portCode: str = 'all', tradeMode: str = 'all', hsChap: str = 'all', hsHead: str = 'all', hsSub: str = 'all', onlyBadHs: bool = False, onlyMissingUnit: bool = False, onlyAbnormalQty: bool = False, orderId: str = '', offset: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def _norm(v):
+    return None if not v or v == 'all' else v
+
+def _header_filter_key(q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId):
+    """规范化后的筛选条件元组，既用于编译查询，也作为计数缓存的 key"""
+    return (_norm(q), _norm(status), _norm(portCode), _norm(tradeMode), _norm(hsChap), _norm(hsHead), _norm(hsSub),
+            bool(onlyBadHs), bool(onlyMissingUnit), bool(onlyAbnormalQty), _norm(orderId))
+
+def _filter_headers(db: Session, key):
+    q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId = key
     query = db.query(CustomsHeader)
     if q:
-        query = query.filter((CustomsHeader.declaration_no.like(f'%{q}%')) | (CustomsHeader.enterprise.like(f'%{q}%')))
-    if status and status != 'all':
+        query = query.filter(search_filter(CustomsHeader, q))
+    if status:
         query = query.filter(CustomsHeader.status == status)
-    if portCode and portCode != 'all':
+    if portCode:
         query = query.filter(CustomsHeader.port_code == portCode)
-    if tradeMode and tradeMode != 'all':
+    if tradeMode:
         query = query.filter(CustomsHeader.trade_mode == tradeMode)
     if orderId:
         query = query.filter(CustomsHeader.order_id == orderId)
-    if hsChap and hsChap != 'all':
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.substr(func.replace(CustomsItem.hs_code, '.', ''), 1, 2) == hsChap).exists())
-    if hsHead and hsHead != 'all':
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.substr(func.replace(CustomsItem.hs_code, '.', ''), 1, 4) == hsHead).exists())
-    if hsSub and hsSub != 'all':
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.replace(CustomsItem.hs_code, '.', '') == hsSub).exists())
+    if hsChap:
+        query = query.filter(CustomsHeader.id.in_(db.query(CustomsItem.header_id).filter(CustomsItem.hs_chapter == hsChap)))
+    if hsHead:
+        query = query.filter(CustomsHeader.id.in_(db.query(CustomsItem.header_id).filter(CustomsItem.hs_heading == hsHead)))
+    if hsSub:
+        query = query.filter(CustomsHeader.id.in_(db.query(CustomsItem.header_id).filter(CustomsItem.hs_digits == hsSub)))
     if onlyBadHs:
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.length(func.replace(CustomsItem.hs_code, '.', '')) < 8).exists())
+        query = query.filter(CustomsHeader.has_bad_hs == 1)
     if onlyMissingUnit:
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter((CustomsItem.unit == None) | (CustomsItem.unit == '')).exists())
+        query = query.filter(CustomsHeader.has_missing_unit == 1)
     if onlyAbnormalQty:
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter((CustomsItem.qty == None) | (CustomsItem.qty <= 0)).exists())
-    rows = query.order_by(CustomsHeader.declare_date.desc()).offset(offset).limit(limit).all()
-    return [{
+        query = query.filter(CustomsHeader.has_abnormal_qty == 1)
+    return query
+
+def _count_headers(query, key):
+    total = customs_header_counts.get(key)
+    if total is None:
+        total = query.count()
+        customs_header_counts.set(key, total)
+    return total
+
+def _item_out(r):
+    return {
+        'id': r.id,
+        'headerId': r.header_id,
+        'lineNo': r.line_no,
+        'hsCode': r.hs_code,
+        'name': r.name,
+        'spec': r.spec,
+        'unit': r.unit,
+        'qty': r.qty,
+        'unitPrice': r.unit_price,
+        'amount': r.amount,
+        'taxRate': r.tax_rate,
+        'tariff': r.tariff,
+        'excise': r.excise,
+        'vat': r.vat
+    }
+
+def _items_by_header(db: Session, header_ids):
+    """一次 IN 查询取出多张报关单的明细并按报关单分组（按块查询以避开 SQLite 变量数上限）"""
+    grouped = {h: [] for h in header_ids}
+    ids = list(grouped)
+    for i in range(0, len(ids), 500):
+        rows = db.query(CustomsItem).filter(CustomsItem.header_id.in_(ids[i:i + 500])).order_by(CustomsItem.header_id.asc(), CustomsItem.line_no.asc()).all()
+        for r in rows:
+            grouped[r.header_id].append(_item_out(r))
+    return grouped
+
+@router.get('/headers')
+def list_headers(q: str = '', status: str = 'all', portCode: str = 'all', tradeMode: str = 'all', hsChap: str = 'all', hsHead: str = 'all', hsSub: str = 'all', onlyBadHs: bool = False, onlyMissingUnit: bool = False, onlyAbnormalQty: bool = False, orderId: str = '', offset: int = 0, limit: int = 10, cursor: Optional[str] = None, withTotal: bool = False, include: str = '', db: Session = Depends(get_db)):
+    key = _header_filter_key(q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId)
+    query = _filter_headers(db, key)
+    next_cursor = None
+    total = customs_header_counts.get(key) if withTotal else None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, CustomsHeader.declare_date, CustomsHeader.id, cursor, limit)
+    elif withTotal and total is None:
+        # 没有缓存时用窗口函数在同一条语句里带出总数
+        res = query.add_columns(func.count().over().label('_total')).order_by(CustomsHeader.declare_date.desc()).offset(offset).limit(limit).all()
+        rows = [r[0] for r in res]
+        if res:
+            total = res[0][-1]
+            customs_header_counts.set(key, total)
+    else:
+        rows = query.order_by(CustomsHeader.declare_date.desc()).offset(offset).limit(limit).all()
+    items = [{
         'id': r.id,
         'declarationNo': r.declaration_no,
         'enterprise': r.enterprise,
@@ -52,37 +128,106 @@ def list_headers(q: str = '', status: str = 'all', portCode: str = 'all', tradeM
         'declareDate': str(r.declare_date),
         'orderId': r.order_id
     } for r in rows]
+    if 'items' in include.split(','):
+        grouped = _items_by_header(db, [r['id'] for r in items])
+        for r in items:
+            r['items'] = grouped[r['id']]
+    if not withTotal:
+        if cursor is not None:
+            return {'items': items, 'nextCursor': next_cursor}
+        return items
+    if total is None:
+        total = _count_headers(query, key)
+    res = {'items': items, 'total': total}
+    if cursor is not None:
+        res['nextCursor'] = next_cursor
+    return res
+
+@router.get('/headers/by-order')
+def list_headers_by_order(ids: str = '', include: str = '', db: Session = Depends(get_db)):
+    """按订单批量取报关单：ids 为逗号分隔的订单 id，走 order_id 索引分块 IN 查询，按订单 id 分组返回；include=items 时附带明细"""
+    grouped = {x: [] for x in ids.split(',') if x}
+    keys = list(grouped)
+    headers = []
+    for i in range(0, len(keys), 500):
+        rows = db.query(CustomsHeader).filter(CustomsHeader.order_id.in_(keys[i:i + 500])).order_by(CustomsHeader.order_id.asc(), CustomsHeader.declare_date.desc()).all()
+        for r in rows:
+            h = {
+                'id': r.id,
+                'declarationNo': r.declaration_no,
+                'enterprise': r.enterprise,
+                'portCode': r.port_code,
+                'tradeMode': r.trade_mode,
+                'currency': r.currency,
+                'totalValue': r.total_value,
+                'status': r.status,
+                'declareDate': str(r.declare_date)
+            }
+            grouped[r.order_id].append(h)
+            headers.append(h)
+    if 'items' in include.split(','):
+        items = _items_by_header(db, [h['id'] for h in headers])
+        for h in headers:
+            h['items'] = items[h['id']]
+    return grouped
 
 @router.get('/headers/count')
 def count_headers(q: str = '', status: str = 'all', portCode: str = 'all', tradeMode: str = 'all', hsChap: str = 'all', hsHead: str = 'all', hsSub: str = 'all', onlyBadHs: bool = False, onlyMissingUnit: bool = False, onlyAbnormalQty: bool = False, orderId: str = '', db: Session = Depends(get_db)):
-    query = db.query(CustomsHeader)
-    if q:
-        query = query.filter((CustomsHeader.declaration_no.like(f'%{q}%')) | (CustomsHeader.enterprise.like(f'%{q}%')))
-    if status and status != 'all':
-        query = query.filter(CustomsHeader.status == status)
-    if portCode and portCode != 'all':
-        query = query.filter(CustomsHeader.port_code == portCode)
-    if tradeMode and tradeMode != 'all':
-        query = query.filter(CustomsHeader.trade_mode == tradeMode)
-    if orderId:
-        query = query.filter(CustomsHeader.order_id == orderId)
-    if hsChap and hsChap != 'all':
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.substr(func.replace(CustomsItem.hs_code, '.', ''), 1, 2) == hsChap).exists())
-    if hsHead and hsHead != 'all':
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.substr(func.replace(CustomsItem.hs_code, '.', ''), 1, 4) == hsHead).exists())
-    if hsSub and hsSub != 'all':
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.replace(CustomsItem.hs_code, '.', '') == hsSub).exists())
-    if onlyBadHs:
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter(func.length(func.replace(CustomsItem.hs_code, '.', '')) < 8).exists())
-    if onlyMissingUnit:
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter((CustomsItem.unit == None) | (CustomsItem.unit == '')).exists())
-    if onlyAbnormalQty:
-        query = query.filter(db.query(CustomsItem).filter(CustomsItem.header_id == CustomsHeader.id).filter((CustomsItem.qty == None) | (CustomsItem.qty <= 0)).exists())
-    return {'count': query.count()}
+    key = _header_filter_key(q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId)
+    return {'count': _count_headers(_filter_headers(db, key), key)}
+
+@router.get('/headers/export')
+def export_headers(format: str = 'csv', q: str = '', status: str = 'all', portCode: str = 'all', tradeMode: str = 'all', hsChap: str = 'all', hsHead: str = 'all', hsSub: str = 'all', onlyBadHs: bool = False, onlyMissingUnit: bool = False, onlyAbnormalQty: bool = False, orderId: str = '', db: Session = Depends(get_db)):
+    key = _header_filter_key(q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId)
+    query = _filter_headers(db, key).with_entities(
+        CustomsHeader.id.label('id'),
+        CustomsHeader.declaration_no.label('declarationNo'),
+        CustomsHeader.enterprise.label('enterprise'),
+        CustomsHeader.port_code.label('portCode'),
+        CustomsHeader.trade_mode.label('tradeMode'),
+        CustomsHeader.currency.label('currency'),
+        CustomsHeader.total_value.label('totalValue'),
+        CustomsHeader.status.label('status'),
+        CustomsHeader.declare_date.label('declareDate'),
+        CustomsHeader.order_id.label('orderId'),
+    )
+    return export_response(engine, query.order_by(CustomsHeader.declare_date.desc()).statement, format, 'customs_headers')
+
+# 每个分面计数时忽略自身的筛选条件（对应 _header_filter_key 中的位置），便于侧栏切换取值
+_FACET_KEY_POS = {'status': (1,), 'portCode': (2,), 'tradeMode': (3,), 'hsChapter': (4, 5, 6)}
+
+@router.get('/facets')
+def get_facets(q: str = '', status: str = 'all', portCode: str = 'all', tradeMode: str = 'all', hsChap: str = 'all', hsHead: str = 'all', hsSub: str = 'all', onlyBadHs: bool = False, onlyMissingUnit: bool = False, onlyAbnormalQty: bool = False, orderId: str = '', db: Session = Depends(get_db)):
+    key = _header_filter_key(q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId)
+    summary = None
+    facets = {}
+    for facet in FACETS:
+        pos = _FACET_KEY_POS[facet]
+        fkey = tuple(None if i in pos else v for i, v in enumerate(key))
+        if not any(fkey):
+            # 无筛选：直接读汇总表
+            if summary is None:
+                summary = summary_facets(db)
+            facets[facet] = summary[facet]
+            continue
+        base = _filter_headers(db, fkey)
+        if facet in HEADER_FACETS:
+            col = getattr(CustomsHeader, HEADER_FACETS[facet])
+            rows = base.with_entities(col, func.count()).group_by(col).all()
+        else:
+            rows = db.query(CustomsItem.hs_chapter, func.count(distinct(CustomsItem.header_id))).filter(CustomsItem.header_id.in_(base.with_entities(CustomsHeader.id))).filter(CustomsItem.hs_chapter != None, CustomsItem.hs_chapter != '').group_by(CustomsItem.hs_chapter).all()
+        facets[facet] = sorted([{'value': v or '', 'count': c} for v, c in rows], key=lambda x: (-x['count'], x['value']))
+    if any(key):
+        total = _count_headers(_filter_headers(db, key), key)
+    else:
+        total = sum(x['count'] for x in facets['status'])
+    return {'total': total, 'facets': facets}
 
 @router.post('/headers')
 def upsert_header(data: CustomsHeaderIn, db: Session = Depends(get_db)):
     r = db.query(CustomsHeader).filter(CustomsHeader.id == data.id).first()
+    old = {'status': r.status, 'portCode': r.port_code, 'tradeMode': r.trade_mode} if r else None
+    old_stats = {r.id: {'enterprise': r.enterprise, 'status': r.status, 'order_id': r.order_id, 'port_code': r.port_code}} if r else {}
     if r:
         r.declaration_no = data.declaration_no
         r.enterprise = data.enterprise
@@ -98,7 +243,6 @@ def upsert_header(data: CustomsHeaderIn, db: Session = Depends(get_db)):
         declare_date = None
         try:
             if data.declare_date:
-                from datetime import datetime
                 declare_date = datetime.strptime(str(data.declare_date), '%Y-%m-%d').date()
         except Exception:
             declare_date = None
@@ -117,51 +261,25 @@ def upsert_header(data: CustomsHeaderIn, db: Session = Depends(get_db)):
             order_id=data.order_id
         )
         db.add(r)
+    r.updated_at = datetime.utcnow().isoformat()
+    on_header_change(db, old, {'status': r.status, 'portCode': r.port_code, 'tradeMode': r.trade_mode})
+    new_stats = {r.id: {'enterprise': r.enterprise, 'status': r.status, 'order_id': r.order_id, 'port_code': r.port_code}}
+    on_headers_written(db, old_stats, new_stats)
+    port_congestion.on_headers_written(db, old_stats, new_stats)
+    refresh_header_flags(db, [r.id])
     db.commit()
+    customs_header_counts.clear()
     return {'ok': True}
 
-@router.get('/items/{header_id}')
-def list_items(header_id: str, db: Session = Depends(get_db)):
-    rows = db.query(CustomsItem).filter(CustomsItem.header_id == header_id).order_by(CustomsItem.line_no.asc()).all()
-    return [{
-        'id': r.id,
-        'headerId': r.header_id,
-        'lineNo': r.line_no,
-        'hsCode': r.hs_code,
-        'name': r.name,
-        'spec': r.spec,
-        'unit': r.unit,
-        'qty': r.qty,
-        'unitPrice': r.unit_price,
-        'amount': r.amount,
-        'taxRate': r.tax_rate,
-        'tariff': r.tariff,
-        'excise': r.excise,
-        'vat': r.vat
-    } for r in rows]
-
 @router.get('/items/batch')
 def list_items_batch(headerIds: str = '', db: Session = Depends(get_db)):
     ids = [x for x in (headerIds or '').split(',') if x]
-    if not ids:
-        return []
-    rows = db.query(CustomsItem).filter(CustomsItem.header_id.in_(ids)).order_by(CustomsItem.header_id.asc(), CustomsItem.line_no.asc()).all()
-    return [{
-        'id': r.id,
-        'headerId': r.header_id,
-        'lineNo': r.line_no,
-        'hsCode': r.hs_code,
-        'name': r.name,
-        'spec': r.spec,
-        'unit': r.unit,
-        'qty': r.qty,
-        'unitPrice': r.unit_price,
-        'amount': r.amount,
-        'taxRate': r.tax_rate,
-        'tariff': r.tariff,
-        'excise': r.excise,
-        'vat': r.vat
-    } for r in rows]
+    return _items_by_header(db, ids)
+
+@router.get('/items/{header_id}')
+def list_items(header_id: str, db: Session = Depends(get_db)):
+    rows = db.query(CustomsItem).filter(CustomsItem.header_id == header_id).order_by(CustomsItem.line_no.asc()).all()
+    return [_item_out(r) for r in rows]
 
 @router.post('/items')
 def insert_item(data: CustomsItemIn, db: Session = Depends(get_db)):
@@ -182,6 +300,137 @@ def insert_item(data: CustomsItemIn, db: Session = Depends(get_db)):
         excise=data.excise,
         vat=data.vat
     )
+    apply_hs_columns(r)
+    on_item_added(db, r.header_id, r.hs_chapter)
     db.add(r)
+    db.query(CustomsHeader).filter(CustomsHeader.id == r.header_id).update({CustomsHeader.updated_at: datetime.utcnow().isoformat()}, synchronize_session=False)
+    refresh_header_flags(db, [r.header_id])
     db.commit()
+    customs_header_counts.clear()
     return {'ok': True}
+
+@router.post('/import')
+async def import_declarations(request: Request, format: str = 'xlsx'):
+    """
+    批量导入报关单：请求体为 报关单数据样例.xlsx 格式的工作簿（format=xlsx）或 CSV（format=csv）。
+    请求体先落盘为临时文件再流式解析，按块批量写入；单行校验错误随结果返回，不中断整批。
+    """
+    fmt = (format or '').lower()
+    if fmt not in ('xlsx', 'csv'):
+        raise HTTPException(status_code=400, detail='format 仅支持 xlsx 或 csv')
+    tmp = tempfile.NamedTemporaryFile(suffix=f'.{fmt}', delete=False)
+    try:
+        with tmp:
+            async for chunk in request.stream():
+                tmp.write(chunk)
+        res = await run_in_threadpool(import_file, engine, tmp.name, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.unlink(tmp.name)
+    return {'ok': True, **res}
+
+@router.get('/tax-rates')
+def list_tax_rates(db: Session = Depends(get_db)):
+    rows = db.query(HsTaxRate).order_by(HsTaxRate.hs_prefix.asc()).all()
+    return [{
+        'hsPrefix': r.hs_prefix,
+        'tariffRate': r.tariff_rate,
+        'exciseRate': r.excise_rate,
+        'vatRate': r.vat_rate,
+        'description': r.description,
+        'updatedAt': r.updated_at
+    } for r in rows]
+
+@router.post('/tax-rates')
+def upsert_tax_rate(data: HsTaxRateIn, recompute: bool = True, db: Session = Depends(get_db)):
+    """维护 HS 前缀税率；默认随即重算该前缀下所有报关单的税费"""
+    prefix = data.hs_prefix.replace('.', '').strip()
+    if not prefix.isdigit():
+        raise HTTPException(status_code=400, detail='hsPrefix 须为非空的数字 HS 前缀')
+    tariff_rate = 0.0 if data.tariff_rate is None else data.tariff_rate
+    excise_rate = 0.0 if data.excise_rate is None else data.excise_rate
+    vat_rate = 0.13 if data.vat_rate is None else data.vat_rate
+    # 消费税按 (完税价格 + 关税) / (1 - 税率) 组价，税率须小于 1
+    if not 0 <= excise_rate < 1:
+        raise HTTPException(status_code=400, detail='消费税率须在 [0, 1) 范围内')
+    if not (0 <= tariff_rate < float('inf') and 0 <= vat_rate < float('inf')):
+        raise HTTPException(status_code=400, detail='关税率与增值税率须为非负数')
+    r = db.query(HsTaxRate).filter(HsTaxRate.hs_prefix == prefix).first()
+    if not r:
+        r = HsTaxRate(hs_prefix=prefix)
+        db.add(r)
+    r.tariff_rate = tariff_rate
+    r.excise_rate = excise_rate
+    r.vat_rate = vat_rate
+    r.description = data.description
+    r.updated_at = datetime.utcnow().isoformat()
+    db.flush()
+    res = {'ok': True}
+    if recompute:
+        from backend_py.services.duty_engine import recompute_duties
+        scope = select(CustomsItem.header_id).where(CustomsItem.hs_digits.like(f'{prefix}%'))
+        res.update(recompute_duties(db.connection(), where=scope))
+    db.commit()
+    return res
+
+@router.post('/duties/recompute')
+def recompute_duties_api(headerIds: str = '', q: str = '', status: str = 'all', portCode: str = 'all', tradeMode: str = 'all', hsChap: str = 'all', hsHead: str = 'all', hsSub: str = 'all', onlyBadHs: bool = False, onlyMissingUnit: bool = False, onlyAbnormalQty: bool = False, orderId: str = '', all: bool = False, db: Session = Depends(get_db)):
+    """
+    按税率表重算明细金额与税费并汇总报关单总价。
+    范围取 headerIds（逗号分隔）、与列表一致的筛选条件（含 orderId）或 all=true 全库，三者必须指定其一。
+    """
+    from backend_py.services.duty_engine import recompute_duties
+    ids = [x for x in (headerIds or '').split(',') if x]
+    key = _header_filter_key(q, status, portCode, tradeMode, hsChap, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderId)
+    if ids:
+        res = recompute_duties(db.connection(), header_ids=ids)
+    elif any(key):
+        res = recompute_duties(db.connection(), where=_filter_headers(db, key).with_entities(CustomsHeader.id).statement)
+    elif all:
+        res = recompute_duties(db.connection())
+    else:
+        raise HTTPException(status_code=400, detail='需指定 headerIds、筛选条件或 all=true')
+    db.commit()
+    return {'ok': True, **res}
+
+@router.get('/findings')
+def list_findings(rule: str = 'all', headerId: str = '', orderId: str = '', offset: int = 0, limit: int = 50, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    query = db.query(CustomsFinding)
+    if rule and rule != 'all':
+        query = query.filter(CustomsFinding.rule == rule)
+    if headerId:
+        query = query.filter(CustomsFinding.header_id == headerId)
+    if orderId:
+        query = query.filter(CustomsFinding.order_id == orderId)
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, CustomsFinding.id, CustomsFinding.id, cursor, limit)
+    else:
+        rows = query.order_by(CustomsFinding.id.desc()).offset(offset).limit(limit).all()
+    items = [{
+        'id': r.id,
+        'rule': r.rule,
+        'headerId': r.header_id,
+        'itemId': r.item_id,
+        'orderId': r.order_id,
+        'message': r.message,
+        'detectedAt': r.detected_at
+    } for r in rows]
+    if cursor is not None:
+        return {'items': items, 'nextCursor': next_cursor}
+    return items
+
+@router.get('/findings/summary')
+def findings_summary(db: Session = Depends(get_db)):
+    counts = dict(db.query(CustomsFinding.rule, func.count()).group_by(CustomsFinding.rule).all())
+    return {
+        'rules': [{'rule': rule, 'message': message, 'count': counts.get(rule, 0)} for rule, message, _ in RULES],
+        'headers': db.query(func.count(distinct(CustomsFinding.header_id))).scalar(),
+        'lastScan': last_watermark(db.connection())
+    }
+
+@router.post('/findings/scan')
+def run_findings_scan(full: bool = False):
+    """增量扫描自上次以来有变更的报关单；full=true 时全量重建"""
+    return {'ok': True, **scan_findings(engine, full=full)}
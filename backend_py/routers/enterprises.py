@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
-from backend_py.db import SessionLocal
-from backend_py.models.enterprises import Enterprise
+from backend_py.db import SessionLocal, engine
+from backend_py.pagination import keyset_page
+from backend_py.services.bulk_upsert import PREFETCH_SIZE, iter_record_chunks
+from backend_py.services.enterprise_stats import rebuild_stats
+from backend_py.services.export import export_response
+from backend_py.services.fts import search_filter
+from backend_py.models.enterprises import Enterprise, EnterpriseStats
 
 router = APIRouter(prefix='/api/enterprises')
 
+# 批量导入响应中最多返回的失败明细条数
+MAX_ERRORS = 100
+
 def get_db():
     db = SessionLocal()
     try:
@@ -12,12 +25,19 @@ def get_db():
     finally:
         db.close()
 
-@router.get('')
-def list_enterprises(q: str = '', type: str = 'all', status: str = 'all', category: str = 'all', region: str = 'all', offset: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+# list_enterprises 的 sort 参数 -> 排序列；汇总指标需要关联 enterprise_stats，没有汇总行的企业按 0 展示（NULL 排在最小端）
+SORT_COLUMNS = {
+    'lastActive': Enterprise.last_active,
+    'activeOrders': EnterpriseStats.active_orders,
+    'gmv': EnterpriseStats.gmv_cny,
+    'declarations': EnterpriseStats.declarations,
+    'clearanceRate': EnterpriseStats.clearance_rate,
+}
+
+def _filter_enterprises(db: Session, q, type, status, category, region, minActiveOrders=0, minGmv=0.0, minClearanceRate=0.0, join_stats=False):
     query = db.query(Enterprise)
     if q:
-        like = f'%{q}%'
-        query = query.filter((Enterprise.name.like(like)) | (Enterprise.reg_no.like(like)) | (Enterprise.region.like(like)))
+        query = query.filter(search_filter(Enterprise, q))
     if type and type != 'all':
         query = query.filter(Enterprise.type == type)
     if status and status != 'all':
@@ -26,62 +46,164 @@ def list_enterprises(q: str = '', type: str = 'all', status: str = 'all', catego
         query = query.filter(Enterprise.category == category)
     if region and region != 'all':
         query = query.filter(Enterprise.region == region)
-    rows = query.order_by(Enterprise.last_active.desc()).offset(offset).limit(limit).all()
-    return [{
-        'id': r.id,
-        'regNo': r.reg_no,
-        'name': r.name,
-        'type': r.type,
-        'category': r.category,
-        'region': r.region,
-        'status': r.status,
-        'compliance': r.compliance,
-        'eligible': bool(r.service_eligible),
-        'activeOrders': r.active_orders,
-        'lastActive': (r.last_active.isoformat() if getattr(r.last_active, 'isoformat', None) else (r.last_active if r.last_active else None)),
-    } for r in rows]
+    if join_stats or minActiveOrders or minGmv or minClearanceRate:
+        query = query.outerjoin(EnterpriseStats, EnterpriseStats.enterprise == Enterprise.name)
+    if minActiveOrders:
+        query = query.filter(EnterpriseStats.active_orders >= minActiveOrders)
+    if minGmv:
+        query = query.filter(EnterpriseStats.gmv_cny >= minGmv)
+    if minClearanceRate:
+        query = query.filter(EnterpriseStats.clearance_rate >= minClearanceRate)
+    return query
+
+@router.get('')
+def list_enterprises(q: str = '', type: str = 'all', status: str = 'all', category: str = 'all', region: str = 'all', minActiveOrders: int = 0, minGmv: float = 0.0, minClearanceRate: float = 0.0, sort: str = 'lastActive', order: str = 'desc', offset: int = 0, limit: int = 50, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """sort 可选 lastActive/activeOrders/gmv/declarations/clearanceRate；minClearanceRate 取 0~1"""
+    sort_col = SORT_COLUMNS.get(sort)
+    if sort_col is None:
+        raise HTTPException(status_code=400, detail=f'不支持的排序字段: {sort}')
+    desc = order != 'asc'
+    query = _filter_enterprises(db, q, type, status, category, region, minActiveOrders, minGmv, minClearanceRate, join_stats=sort != 'lastActive')
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, sort_col, Enterprise.id, cursor, limit, desc)
+    else:
+        rows = query.order_by(sort_col.desc() if desc else sort_col.asc(), Enterprise.id.desc() if desc else Enterprise.id.asc()).offset(offset).limit(limit).all()
+    stats = {}
+    names = [r.name for r in rows if r.name]
+    if names:
+        stats = {s.enterprise: s for s in db.query(EnterpriseStats).filter(EnterpriseStats.enterprise.in_(names)).all()}
+    items = []
+    for r in rows:
+        st = stats.get(r.name)
+        items.append({
+            'id': r.id,
+            'regNo': r.reg_no,
+            'name': r.name,
+            'type': r.type,
+            'category': r.category,
+            'region': r.region,
+            'status': r.status,
+            'compliance': r.compliance,
+            'eligible': bool(r.service_eligible),
+            'activeOrders': st.active_orders if st else 0,
+            'gmvCny': round(st.gmv_cny, 2) if st else 0.0,
+            'declarations': st.declarations if st else 0,
+            'clearanceRate': st.clearance_rate if st else None,
+            'lastActive': (r.last_active.isoformat() if getattr(r.last_active, 'isoformat', None) else (r.last_active if r.last_active else None)),
+        })
+    if cursor is not None:
+        return {'items': items, 'nextCursor': next_cursor}
+    return items
 
 @router.get('/count')
-def count_enterprises(q: str = '', type: str = 'all', status: str = 'all', category: str = 'all', region: str = 'all', db: Session = Depends(get_db)):
-    query = db.query(Enterprise)
-    if q:
-        like = f'%{q}%'
-        query = query.filter((Enterprise.name.like(like)) | (Enterprise.reg_no.like(like)) | (Enterprise.region.like(like)))
-    if type and type != 'all':
-        query = query.filter(Enterprise.type == type)
-    if status and status != 'all':
-        query = query.filter(Enterprise.status == status)
-    if category and category != 'all':
-        query = query.filter(Enterprise.category == category)
-    if region and region != 'all':
-        query = query.filter(Enterprise.region == region)
+def count_enterprises(q: str = '', type: str = 'all', status: str = 'all', category: str = 'all', region: str = 'all', minActiveOrders: int = 0, minGmv: float = 0.0, minClearanceRate: float = 0.0, db: Session = Depends(get_db)):
+    query = _filter_enterprises(db, q, type, status, category, region, minActiveOrders, minGmv, minClearanceRate)
     return {'count': query.count()}
 
+@router.get('/export')
+def export_enterprises(format: str = 'csv', q: str = '', type: str = 'all', status: str = 'all', category: str = 'all', region: str = 'all', minActiveOrders: int = 0, minGmv: float = 0.0, minClearanceRate: float = 0.0, db: Session = Depends(get_db)):
+    query = _filter_enterprises(db, q, type, status, category, region, minActiveOrders, minGmv, minClearanceRate, join_stats=True).with_entities(
+        Enterprise.id.label('id'),
+        Enterprise.reg_no.label('regNo'),
+        Enterprise.name.label('name'),
+        Enterprise.type.label('type'),
+        Enterprise.category.label('category'),
+        Enterprise.region.label('region'),
+        Enterprise.status.label('status'),
+        Enterprise.compliance.label('compliance'),
+        Enterprise.service_eligible.label('eligible'),
+        func.coalesce(EnterpriseStats.active_orders, 0).label('activeOrders'),
+        Enterprise.last_active.label('lastActive'),
+    )
+    return export_response(engine, query.order_by(Enterprise.last_active.desc()).statement, format, 'enterprises')
+
+# 批量导入时为空则保留库中原值的列
+KEEP_IF_EMPTY = ('reg_no', 'name', 'type', 'category', 'region', 'status', 'last_active')
+
+def _flag(v):
+    if isinstance(v, str):
+        return 1 if v.strip().lower() in ('1', 'true', 'yes', 'y') else 0
+    return 1 if v else 0
+
+def _enterprise_row(rec, index):
+    try:
+        compliance = float(rec.get('compliance') or 0)
+    except (TypeError, ValueError):
+        compliance = 0.0
+    try:
+        active_orders = int(float(rec.get('activeOrders') or rec.get('active_orders') or 0))
+    except (TypeError, ValueError):
+        active_orders = 0
+    last_active = rec.get('lastActive') or rec.get('last_active')
+    if last_active:
+        # 格式错误时抛 ValueError，该条记为失败
+        last_active = datetime.fromisoformat(str(last_active).replace('Z', '+00:00')).replace(tzinfo=None)
+    return {
+        'id': rec.get('id') or f'E{index + 1}',
+        'reg_no': rec.get('regNo') or rec.get('reg_no') or None,
+        'name': rec.get('name') or None,
+        'type': rec.get('type') or None,
+        'category': rec.get('category') or None,
+        'region': rec.get('region') or None,
+        'status': rec.get('status') or None,
+        'compliance': compliance,
+        'service_eligible': _flag(rec.get('eligible', rec.get('service_eligible'))),
+        'active_orders': active_orders,
+        'last_active': last_active or None
+    }
+
+def _upsert_enterprise_chunk(rows):
+    """预取已存在的 id 后整块 INSERT ... ON CONFLICT；KEEP_IF_EMPTY 中的列传空值时保留原值"""
+    table = Enterprise.__table__
+    latest = {r['id']: r for r in rows}
+    keys = list(latest)
+    stmt = insert(table)
+    set_ = {c.name: stmt.excluded[c.name] for c in table.columns if c.name != 'id'}
+    for c in KEEP_IF_EMPTY:
+        set_[c] = func.coalesce(stmt.excluded[c], table.c[c])
+    stmt = stmt.on_conflict_do_update(index_elements=['id'], set_=set_)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        existing = set()
+        for k in range(0, len(keys), PREFETCH_SIZE):
+            existing.update(conn.execute(select(table.c.id).where(table.c.id.in_(keys[k:k + PREFETCH_SIZE]))).scalars())
+        for key, r in latest.items():
+            if key not in existing and r['last_active'] is None:
+                r['last_active'] = now
+        conn.execute(stmt, list(latest.values()))
+    created = len(keys) - len(existing)
+    return created, len(rows) - created
+
 @router.post('/batch')
-def batch_upsert_enterprises(payload: list[dict], db: Session = Depends(get_db)):
-    count = 0
-    for row in payload:
-        eid = row.get('id') or f'E{count+1}'
-        ent = db.query(Enterprise).filter(Enterprise.id == eid).first()
-        if not ent:
-            ent = Enterprise(id=eid)
-            db.add(ent)
-        ent.reg_no = row.get('regNo') or row.get('reg_no') or ent.reg_no
-        ent.name = row.get('name') or ent.name
-        ent.type = row.get('type') or ent.type
-        ent.category = row.get('category') or ent.category
-        ent.region = row.get('region') or ent.region
-        ent.status = row.get('status') or ent.status
-        try:
-            ent.compliance = float(row.get('compliance') or 0)
-        except:
-            ent.compliance = 0.0
-        ent.service_eligible = 1 if (row.get('eligible') or row.get('service_eligible')) else 0
-        try:
-            ent.active_orders = int(row.get('activeOrders') or row.get('active_orders') or 0)
-        except:
-            ent.active_orders = 0
-        # last_active optional
-        count += 1
-    db.commit()
-    return {'ok': True, 'count': count}
+async def batch_upsert_enterprises(request: Request):
+    """
+    批量导入企业：JSON 数组、NDJSON 或带表头的 CSV（Content-Type: text/csv），后两者按块流式处理。
+    每块一个事务；名称、地区等文本列为空时保留原值，合规分/接入状态/活跃订单数按导入值覆盖。
+    """
+    summary = {'count': 0, 'created': 0, 'updated': 0, 'failed': 0}
+    errors = []
+    index = 0
+    async for chunk in iter_record_chunks(request):
+        rows = []
+        for rec in chunk:
+            try:
+                if not isinstance(rec, dict):
+                    raise ValueError('记录不是 JSON 对象')
+                rows.append(_enterprise_row(rec, index))
+            except ValueError as e:
+                summary['failed'] += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append({'index': index, 'error': str(e)})
+            index += 1
+        if rows:
+            created, updated = await run_in_threadpool(_upsert_enterprise_chunk, rows)
+            summary['created'] += created
+            summary['updated'] += updated
+            summary['count'] += len(rows)
+    return {'ok': True, **summary, 'errors': errors}
+
+@router.post('/stats/rebuild')
+def rebuild_enterprise_stats():
+    """按业务表全量重算企业汇总指标，返回企业数与发生漂移的企业数"""
+    return {'ok': True, **rebuild_stats(engine)}
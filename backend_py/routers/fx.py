@@ -0,0 +1,54 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from backend_py.db import SessionLocal
+from backend_py.models.fx import FxRate
+from backend_py.schemas.fx import FxRateIn
+from backend_py.services.count_cache import gmv_reports, replenishment_plans
+from backend_py.services.enterprise_stats import refresh_enterprise_gmv
+from backend_py.services.fx import invalidate, set_rate
+from backend_py.services.kpi_rollup import refresh_gmv_counters
+
+router = APIRouter(prefix='/api/fx-rates')
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@router.get('')
+def list_rates(currency: str = 'all', db: Session = Depends(get_db)):
+    query = db.query(FxRate)
+    if currency and currency != 'all':
+        query = query.filter(FxRate.currency == currency.upper())
+    rows = query.order_by(FxRate.currency.asc(), FxRate.valid_from.desc()).all()
+    return [{
+        'currency': r.currency,
+        'validFrom': r.valid_from,
+        'rate': r.rate,
+        'updatedAt': r.updated_at
+    } for r in rows]
+
+@router.post('')
+def upsert_rate(data: FxRateIn, db: Session = Depends(get_db)):
+    """
+    新增或修改一个汇率版本（自 valid_from 起效）。同一事务内按下单日汇率重算受影响日期的 GMV 计数器
+    与各企业 GMV，提交后使汇率缓存及 GMV 报表、补货计划缓存失效。
+    """
+    currency = data.currency.strip().upper()
+    try:
+        valid_from = date.fromisoformat(data.valid_from.strip()[:10]).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail='valid_from 应为 YYYY-MM-DD')
+    if not currency or data.rate <= 0:
+        raise HTTPException(status_code=400, detail='currency 不能为空，rate 必须大于 0')
+    since = set_rate(db, currency, valid_from, data.rate)
+    refresh_gmv_counters(db, since)
+    refresh_enterprise_gmv(db)
+    db.commit()
+    invalidate()
+    gmv_reports.clear()
+    replenishment_plans.clear()
+    return {'ok': True, 'recomputedFrom': since or None}
@@ -1,7 +1,21 @@
-from fastapi import APIRouter, Depends
+import time
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from backend_py.db import SessionLocal
-from backend_py.models.logistics import Logistics
+from backend_py.db import SessionLocal, engine
+from backend_py.pagination import keyset_page
+from backend_py.services import port_congestion
+from backend_py.services.bulk_upsert import bulk_upsert, fetch_by_ids, read_records
+from backend_py.services.export import export_response
+from backend_py.services.fts import search_filter
+from backend_py.services.kpi_rollup import on_logistics_written
+from backend_py.services.logistics_events import buffer as event_buffer, normalize_event
+from backend_py.services.milestones import apply_milestone_columns, milestone_columns
+from backend_py.services.write_buffer import BufferFull
+from backend_py.models.logistics import Logistics, LogisticsEvent
 from backend_py.models.orders import Order
 from backend_py.schemas.logistics import LogisticsIn
 
@@ -14,21 +28,29 @@ def get_db():
     finally:
         db.close()
 
-@router.get('')
-def list_logistics(q: str = '', status: str = 'all', offset: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def _filter_logistics(db: Session, q, status):
     query = db.query(Logistics)
     if q:
-        query = query.filter((Logistics.tracking_no.like(f'%{q}%')) | (Logistics.origin.like(f'%{q}%')) | (Logistics.destination.like(f'%{q}%')) | (Logistics.order_id.like(f'%{q}%')))
+        query = query.filter(search_filter(Logistics, q))
     if status and status != 'all':
         query = query.filter(Logistics.status == status)
-    rows = query.order_by(Logistics.id.desc()).offset(offset).limit(limit).all()
+    return query
+
+@router.get('')
+def list_logistics(q: str = '', status: str = 'all', offset: int = 0, limit: int = 10, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    query = _filter_logistics(db, q, status)
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, Logistics.id, Logistics.id, cursor, limit)
+    else:
+        rows = query.order_by(Logistics.id.desc()).offset(offset).limit(limit).all()
     order_map = {}
     if rows:
         ids = [r.order_id for r in rows if r.order_id]
         if ids:
             ors = db.query(Order).filter(Order.id.in_(ids)).all()
             order_map = {o.id: o for o in ors}
-    return [{
+    items = [{
         'id': r.id,
         'trackingNo': r.tracking_no,
         'origin': r.origin,
@@ -53,19 +75,161 @@ def list_logistics(q: str = '', status: str = 'all', offset: int = 0, limit: int
         'orderNumber': (order_map.get(r.order_id).order_number if r.order_id in order_map else None),
         'enterprise': (order_map.get(r.order_id).enterprise if r.order_id in order_map else None)
     } for r in rows]
+    if cursor is not None:
+        return {'items': items, 'nextCursor': next_cursor}
+    return items
+
+@router.get('/by-order')
+def list_logistics_by_order(ids: str = '', db: Session = Depends(get_db)):
+    """按订单批量取运单：ids 为逗号分隔的订单 id，走 order_id 索引分块 IN 查询，按订单 id 分组返回"""
+    grouped = {x: [] for x in ids.split(',') if x}
+    keys = list(grouped)
+    for i in range(0, len(keys), 500):
+        rows = db.query(Logistics).filter(Logistics.order_id.in_(keys[i:i + 500])).order_by(Logistics.order_id.asc(), Logistics.id.desc()).all()
+        for r in rows:
+            grouped[r.order_id].append({
+                'id': r.id,
+                'trackingNo': r.tracking_no,
+                'origin': r.origin,
+                'destination': r.destination,
+                'status': r.status,
+                'mode': r.mode,
+                'carrier': r.carrier,
+                'etd': r.etd,
+                'eta': r.eta,
+                'atd': r.atd,
+                'ata': r.ata,
+                'warehouseStatus': r.warehouse_status
+            })
+    return grouped
 
 @router.get('/count')
 def count_logistics(q: str = '', status: str = 'all', db: Session = Depends(get_db)):
-    query = db.query(Logistics)
-    if q:
-        query = query.filter((Logistics.tracking_no.like(f'%{q}%')) | (Logistics.origin.like(f'%{q}%')) | (Logistics.destination.like(f'%{q}%')) | (Logistics.order_id.like(f'%{q}%')))
-    if status and status != 'all':
-        query = query.filter(Logistics.status == status)
+    query = _filter_logistics(db, q, status)
     return {'count': query.count()}
 
+@router.get('/export')
+def export_logistics(format: str = 'csv', q: str = '', status: str = 'all', db: Session = Depends(get_db)):
+    query = _filter_logistics(db, q, status).outerjoin(Order, Order.id == Logistics.order_id).with_entities(
+        Logistics.id.label('id'),
+        Logistics.tracking_no.label('trackingNo'),
+        Logistics.origin.label('origin'),
+        Logistics.destination.label('destination'),
+        Logistics.status.label('status'),
+        Logistics.estimated_time.label('estimatedTime'),
+        Logistics.actual_time.label('actualTime'),
+        Logistics.efficiency.label('efficiency'),
+        Logistics.order_id.label('orderId'),
+        Logistics.mode.label('mode'),
+        Logistics.etd.label('etd'),
+        Logistics.eta.label('eta'),
+        Logistics.atd.label('atd'),
+        Logistics.ata.label('ata'),
+        Logistics.bl_no.label('blNo'),
+        Logistics.awb_no.label('awbNo'),
+        Logistics.is_fcl.label('isFcl'),
+        Logistics.freight_cost.label('freightCost'),
+        Logistics.insurance_cost.label('insuranceCost'),
+        Logistics.carrier.label('carrier'),
+        Logistics.warehouse_status.label('warehouseStatus'),
+        Order.order_number.label('orderNumber'),
+        Order.enterprise.label('enterprise'),
+    )
+    return export_response(engine, query.order_by(Logistics.id.desc()).statement, format, 'logistics')
+
+@router.get('/overdue')
+def list_overdue(carrier: str = 'all', minHours: float = 0, offset: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+    """已过 ETA 仍未到港（ata 为空）的运单，按超期时长降序，并按承运商汇总；走 ix_logistics_open_eta 部分索引"""
+    now = int(time.time())
+    cutoff = now - int(minHours * 3600)
+    base = db.query(Logistics).filter(Logistics.ata_ts == None, Logistics.eta_ts < cutoff)
+    groups = base.with_entities(Logistics.carrier, func.count(), func.min(Logistics.eta_ts)).group_by(Logistics.carrier).all()
+    by_carrier = sorted([{
+        'carrier': c,
+        'count': n,
+        'maxLatenessHours': round((now - oldest) / 3600, 1)
+    } for c, n, oldest in groups], key=lambda x: (-x['count'], x['carrier'] or ''))
+    if carrier and carrier != 'all':
+        base = base.filter(Logistics.carrier == carrier)
+        total = sum(x['count'] for x in by_carrier if x['carrier'] == carrier)
+    else:
+        total = sum(x['count'] for x in by_carrier)
+    rows = base.order_by(Logistics.eta_ts.asc()).offset(offset).limit(limit).all()
+    items = [{
+        'id': r.id,
+        'trackingNo': r.tracking_no,
+        'orderId': r.order_id,
+        'carrier': r.carrier,
+        'status': r.status,
+        'origin': r.origin,
+        'destination': r.destination,
+        'etd': r.etd,
+        'eta': r.eta,
+        'atd': r.atd,
+        'latenessHours': round((now - r.eta_ts) / 3600, 1)
+    } for r in rows]
+    return {'total': total, 'byCarrier': by_carrier, 'items': items}
+
+@router.post('/events')
+async def ingest_events(request: Request, wait: bool = False):
+    """
+    承运商轨迹事件批量接入：JSON 数组或 NDJSON，每条含 shipmentId 或 trackingNo、eventCode、eventTime、location。
+    校验通过的事件进入写缓冲，由后台线程攒批写入并更新运单 status/atd/ata；wait=true 时等待本批落库再返回，
+    本批重试后仍写入失败时返回 503。
+    """
+    records = await read_records(request)
+    received_at = datetime.utcnow().isoformat()
+    accepted, errors = [], []
+    for i, rec in enumerate(records):
+        try:
+            if not isinstance(rec, dict):
+                raise ValueError('记录不是 JSON 对象')
+            accepted.append(normalize_event(rec, received_at))
+        except ValueError as e:
+            errors.append({'index': i, 'error': str(e)})
+    res = {'ok': True, 'accepted': len(accepted), 'failed': len(errors), 'errors': errors}
+    if accepted:
+        try:
+            seq = event_buffer.put_many(accepted)
+        except BufferFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+        if wait:
+            first = seq - len(accepted) + 1
+            res['flushed'] = await run_in_threadpool(event_buffer.wait, seq, 30, first)
+            if event_buffer.failed(first, seq):
+                raise HTTPException(status_code=503, detail='事件写入失败，请稍后重试', headers={'Retry-After': '1'})
+    res['pending'] = event_buffer.pending()
+    return res
+
+@router.get('/events')
+def list_events(shipmentId: str = '', trackingNo: str = '', limit: int = 100, db: Session = Depends(get_db)):
+    query = db.query(LogisticsEvent)
+    if shipmentId:
+        query = query.filter(LogisticsEvent.shipment_id == shipmentId)
+    if trackingNo:
+        query = query.filter(LogisticsEvent.tracking_no == trackingNo)
+    rows = query.order_by(LogisticsEvent.event_ts.desc(), LogisticsEvent.id.desc()).limit(limit).all()
+    return [{
+        'id': r.id,
+        'shipmentId': r.shipment_id,
+        'trackingNo': r.tracking_no,
+        'eventCode': r.event_code,
+        'location': r.location,
+        'eventTime': r.event_time,
+        'receivedAt': r.received_at
+    } for r in rows]
+
+def _kpi_row(r):
+    return {'status': r.status, 'efficiency': r.efficiency, 'order_id': r.order_id}
+
+def _on_written(conn, old, new):
+    on_logistics_written(conn, old, new)
+    port_congestion.on_logistics_written(conn, old, new)
+
 @router.post('')
 def upsert_logistics(data: LogisticsIn, db: Session = Depends(get_db)):
     r = db.query(Logistics).filter(Logistics.id == data.id).first()
+    old = {r.id: _kpi_row(r)} if r else {}
     if r:
         r.tracking_no = data.tracking_no
         r.origin = data.origin
@@ -110,11 +274,54 @@ def upsert_logistics(data: LogisticsIn, db: Session = Depends(get_db)):
             carrier=data.carrier
         )
         db.add(r)
+    apply_milestone_columns(r)
+    _on_written(db, old, {r.id: _kpi_row(r)})
     db.commit()
     return {'ok': True}
 
+def _logistics_row(rec):
+    data = LogisticsIn(**rec)
+    row = {
+        'id': data.id,
+        'tracking_no': data.tracking_no,
+        'origin': data.origin,
+        'destination': data.destination,
+        'status': data.status,
+        'estimated_time': data.estimated_time,
+        'actual_time': data.actual_time or 0,
+        'efficiency': data.efficiency or 0,
+        'order_id': data.order_id or '',
+        'mode': data.mode,
+        'etd': data.etd,
+        'eta': data.eta,
+        'atd': data.atd,
+        'ata': data.ata,
+        'bl_no': data.bl_no,
+        'awb_no': data.awb_no,
+        'is_fcl': data.is_fcl,
+        'freight_cost': data.freight_cost,
+        'insurance_cost': data.insurance_cost,
+        'carrier': data.carrier
+    }
+    row.update(milestone_columns(row))
+    return row
+
+# 批量写入钩子：同一事务内写入前读取旧值，更新看板计数器与口岸拥堵
+def _logistics_hook(conn, rows):
+    new = {r['id']: r for r in rows}
+    _on_written(conn, fetch_by_ids(conn, 'logistics', ('status', 'efficiency', 'order_id'), new), new)
+
+@router.post('/bulk')
+async def bulk_upsert_logistics(request: Request):
+    """批量新增/更新物流单：JSON 数组或 NDJSON，字段同 POST /api/logistics"""
+    records = await read_records(request)
+    return await run_in_threadpool(bulk_upsert, engine, Logistics.__table__, _logistics_row, records, (), _logistics_hook)
+
 @router.delete('/{id}')
 def delete_logistics(id: str, db: Session = Depends(get_db)):
+    r = db.query(Logistics).filter(Logistics.id == id).first()
+    if r:
+        _on_written(db, {r.id: _kpi_row(r)}, {})
     db.query(Logistics).filter(Logistics.id == id).delete()
     db.commit()
     return {'ok': True}
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from backend_py.db import SessionLocal
-from backend_py.models.model_metrics import ModelMetric, ModelExecutionLog
+from sqlalchemy import func
+from backend_py.db import SessionLocal, engine
+from backend_py.models.model_metrics import ModelMetric, ModelExecutionLog, ModelDailyRollup
 from backend_py.models.business_models import BusinessModel
 from backend_py.models.orders import Order
-from backend_py.models.algorithms import Algorithm
 from backend_py.models.logistics import Logistics
 from backend_py.models.settlements import Settlement
 from backend_py.models.customs import CustomsHeader
+from backend_py.services import kpi_rollup, model_rollup, port_congestion
+from backend_py.services.bulk_upsert import read_records
+from backend_py.services.kpi_rollup import COUNTERS, gmv_key, read_counters, reconcile_kpis
+from backend_py.services.model_traces import buffer as trace_buffer, normalize_trace
+from backend_py.services.write_buffer import BufferFull
 from typing import List, Optional
 from datetime import datetime, timedelta
 import random
@@ -16,6 +21,9 @@ import uuid
 
 router = APIRouter(prefix='/api/model-metrics', tags=['Model Metrics'])
 
+# 汇总钩子用到的执行记录字段
+LOG_FIELDS = ('model_id', 'business_outcome', 'business_impact_value', 'latency_ms', 'status', 'timestamp')
+
 def get_db():
     db = SessionLocal()
     try:
@@ -27,85 +35,40 @@ def get_db():
 def get_dashboard_stats(db: Session = Depends(get_db)):
     """
     Get high-level dashboard statistics combining model performance and business impact.
+    全部指标取自 kpi_counters：计数器随订单/执行记录/物流/算法写入在同一事务内累加，
+    这里只按主键读取固定的一组计数器，耗时与明细表规模无关。
     """
-    # 1. Online Enterprises: SELECT COUNT(DISTINCT enterprise) FROM orders
-    online_enterprises = db.query(Order.enterprise).distinct().count()
-
-    # 2. Active Orders: SELECT COUNT(id) FROM orders WHERE status NOT IN ('completed', 'blocked')
-    active_orders = db.query(Order).filter(Order.status.notin_(['completed', 'blocked'])).count()
-
-    # 3. Response Time: SELECT AVG(latency_ms) FROM model_execution_logs
-    # Taking recent 1000 for performance if needed, but here simple avg is fine for sqlite
-    avg_latency = db.query(func.avg(ModelExecutionLog.latency_ms)).scalar() or 0
-
-    # 4. Success Rate: (放行数 / 总调用数) * 100%
-    # business_outcome NOT IN ('blocked', 'reject', 'error')
-    total_calls = db.query(ModelExecutionLog).count()
-    if total_calls > 0:
-        passed_calls = db.query(ModelExecutionLog).filter(
-            ModelExecutionLog.business_outcome.notin_(['blocked', 'reject', 'error'])
-        ).count()
-        success_rate = (passed_calls / total_calls) * 100
-    else:
-        success_rate = 100.0
-
-    # 5. GMV (Today's Export Value): SUM(amount) WHERE created_at >= Today 00:00
-    # Assuming simple currency conversion for now
-    rates = {'USD': 7.12, 'EUR': 7.80, 'GBP': 8.90, 'CNY': 1.0, 'JPY': 0.05}
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # We fetch relevant orders to sum in python to handle currency conversion easily
-    # (SQLite doesn't have easy currency conversion functions built-in usually)
-    today_orders = db.query(Order.amount, Order.currency).filter(Order.created_at >= today_start).all()
-    
-    gmv_today = 0.0
-    for amt, curr in today_orders:
-        rate = rates.get(curr, 1.0)
-        gmv_today += (amt or 0) * rate
-
-    # 6. Collaboration Accuracy: SELECT AVG(accuracy) FROM algorithms WHERE status='active'
-    avg_accuracy = db.query(func.avg(Algorithm.accuracy)).filter(Algorithm.status == 'active').scalar() or 0
-
-    # 7. Logistics Exceptions: COUNT(id) WHERE status='exception' OR efficiency < 60
-    logistics_exceptions = db.query(Logistics).filter(
-        (Logistics.status == 'exception') | (Logistics.efficiency < 60)
-    ).count()
-
-    # --- User Requested Metrics Implementation ---
-
-    # 1. Total Value Created: SUM(business_impact_value)
-    total_value_sum = db.query(func.sum(ModelExecutionLog.business_impact_value)).scalar() or 0
-
-    # 2. Risk Prevented Count: COUNT(*) WHERE business_outcome contains 'block' or 'reject'
-    risk_count = db.query(ModelExecutionLog).filter(
-        or_(
-            ModelExecutionLog.business_outcome.ilike('%block%'),
-            ModelExecutionLog.business_outcome.ilike('%reject%')
-        )
-    ).count()
-
-    # 3. Efficiency Gain: AVG(value) WHERE metric_type = 'efficiency_boost'
-    efficiency_gain = db.query(func.avg(ModelMetric.value)).filter(
-        ModelMetric.metric_type == 'efficiency_boost'
-    ).scalar() or 0
-
-    # 4. Active Models Coverage: COUNT(*) FROM algorithms WHERE status = 'active'
-    active_models = db.query(Algorithm).filter(Algorithm.status == 'active').count()
+    gmv_today = gmv_key(datetime.utcnow())
+    k = read_counters(db, list(COUNTERS) + [gmv_today])
+
+    # Response Time: AVG(latency_ms) = 延迟总和 / 有延迟的调用数
+    avg_latency = k['exec_latency_sum'] / k['exec_latency_n'] if k['exec_latency_n'] else 0
+    # Success Rate: (放行数 / 总调用数) * 100%，business_outcome NOT IN ('blocked', 'reject', 'error')
+    success_rate = k['exec_passed'] / k['exec_calls'] * 100 if k['exec_calls'] else 100.0
+    # Collaboration Accuracy: AVG(accuracy) WHERE status='active'
+    avg_accuracy = k['active_accuracy_sum'] / k['active_accuracy_n'] if k['active_accuracy_n'] else 0
+    # Efficiency Gain: AVG(value) WHERE metric_type = 'efficiency_boost'
+    efficiency_gain = k['efficiency_boost_sum'] / k['efficiency_boost_n'] if k['efficiency_boost_n'] else 0
 
     return {
-        "online_enterprises": online_enterprises,
-        "active_orders": active_orders,
+        "online_enterprises": int(k['online_enterprises']),
+        "active_orders": int(k['active_orders']),
         "response_time": round(avg_latency, 1),
         "success_rate": round(success_rate, 1),
-        "gmv_today": round(gmv_today, 2),
+        "gmv_today": round(k[gmv_today], 2),
         "avg_accuracy": round(avg_accuracy, 1),
-        "logistics_exceptions": logistics_exceptions,
-        "total_value_created": round(total_value_sum, 2),
-        "risk_prevented_count": risk_count,
-        "active_models": active_models,
+        "logistics_exceptions": int(k['logistics_exceptions']),
+        "total_value_created": round(k['exec_value_sum'], 2),
+        "risk_prevented_count": int(k['exec_risk']),
+        "active_models": int(k['active_algorithms']),
         "efficiency_gain": round(efficiency_gain, 1)
     }
 
+@router.post('/dashboard-stats/reconcile')
+def reconcile_dashboard_stats():
+    """按明细表全量重算看板计数器（定时任务入口），返回发生漂移的计数器"""
+    return {'ok': True, **reconcile_kpis(engine)}
+
 @router.get('/category-distribution')
 def get_category_distribution(db: Session = Depends(get_db)):
     """
@@ -145,60 +108,22 @@ def get_process_funnel(db: Session = Depends(get_db)):
 from sqlalchemy import func
 
 @router.get('/ports-congestion')
-def get_ports_congestion(db: Session = Depends(get_db)):
+def get_ports_congestion(window: str = '24h', db: Session = Depends(get_db)):
     """
-    Get ports congestion index based on logistics efficiency and customs port code.
-    Formula: Congestion Index = AVG(100 - logistics.efficiency) / 10
+    Ports congestion index: (100 - AVG(logistics.efficiency)) / 10 over customs headers joined to shipments on order_id.
+    Reads the incrementally maintained port_stats / port_congestion tables; window is '<n>h' (hourly, n <= 168)
+    or '<n>d' (daily, n <= 366) and controls the length of each port's series.
     """
-    # Join CustomsHeader and Logistics on order_id
-    results = db.query(
-        CustomsHeader.port_code,
-        func.avg(Logistics.efficiency).label('avg_efficiency')
-    ).join(
-        Logistics, CustomsHeader.order_id == Logistics.order_id
-    ).group_by(
-        CustomsHeader.port_code
-    ).all()
-
-    # Port code mapping (frontend dictionary)
-    port_mapping = {
-        'CNSHA': '上海',
-        'CNYTN': '深圳',
-        'CNCAN': '广州',
-        'CNNGB': '宁波',
-        'CNTAO': '青岛',
-        'CNXMN': '厦门',
-        'CNTNJ': '天津',
-        'USLAX': '洛杉矶',
-        'NLRTM': '鹿特丹',
-        'JPOSA': '大阪'
-    }
-
-    data = []
-    for r in results:
-        port_code = r.port_code
-        avg_eff = r.avg_efficiency or 100 # Default to 100 if null
-        
-        # Calculate congestion index: (100 - efficiency) / 10
-        # If efficiency is 90, index is 1.0. If 60, index is 4.0.
-        congestion_index = round((100 - avg_eff) / 10, 1)
-        
-        port_name = port_mapping.get(port_code, port_code) # Fallback to code if not in map
-        
-        # Filter out ports not in our mapping if strictly required, but better to show what we have.
-        # For dashboard map compatibility, we prioritize mapped names.
-        if port_code in port_mapping:
-            data.append({
-                "port": port_name,
-                "congestionIndex": congestion_index
-            })
-    
-    # If no data (e.g. empty DB), return mock/default data or empty list
-    if not data:
-        # Optional: return some defaults if DB is empty to avoid empty chart
-        pass
+    try:
+        result = port_congestion.congestion(db, window)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='window 取值应为 <n>h（n<=168）或 <n>d（n<=366）')
+    return result['ports']
 
-    return data
+@router.post('/ports-congestion/rebuild')
+def rebuild_ports_congestion():
+    """全量重算口岸拥堵当前值，返回发生漂移的口岸数"""
+    return port_congestion.rebuild_ports(engine)
 
 
 @router.get('/execution-logs')
@@ -209,80 +134,85 @@ def get_execution_logs(limit: int = 10, db: Session = Depends(get_db)):
     logs = db.query(ModelExecutionLog).order_by(ModelExecutionLog.timestamp.desc()).limit(limit).all()
     return logs
 
+# ROI = 业务影响 / (延迟 * 成本系数)
+COST_FACTOR = 0.5
+
 @router.get('/roi-analysis')
-def get_roi_analysis(db: Session = Depends(get_db)):
+def get_roi_analysis(days: int = 7, modelId: str = 'all', db: Session = Depends(get_db)):
     """
-    Get time-series data for ROI analysis charts (Last 7 days).
-    
-    Y-Axis (Accuracy): AVG(value) from model_metrics WHERE metric_type='accuracy'
-    Y-Axis (ROI): SUM(business_impact_value) / (SUM(latency_ms) * CostFactor) from model_execution_logs
-    """
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=6) # 7 days inclusive
-    
-    # Initialize result structure map
-    # date_str -> {'roi': 0, 'accuracy': 0, 'acc_count': 0, 'impact_sum': 0, 'latency_sum': 0}
-    date_map = {}
-    for i in range(7):
-        d = (end_date - timedelta(days=i)).strftime('%Y-%m-%d')
-        date_map[d] = {
-            'accuracy_sum': 0.0, 'accuracy_count': 0, 
-            'impact_sum': 0.0, 'latency_sum': 0.0
-        }
-        
-    # 1. Query Accuracy from model_metrics
-    # Group by date
-    acc_results = db.query(
-        func.strftime('%Y-%m-%d', ModelMetric.timestamp).label('date'),
-        func.avg(ModelMetric.value).label('avg_val')
-    ).filter(
-        ModelMetric.metric_type == 'accuracy',
-        ModelMetric.timestamp >= start_date
-    ).group_by(
-        func.strftime('%Y-%m-%d', ModelMetric.timestamp)
-    ).all()
-    
-    for r in acc_results:
-        d = r.date
-        if d in date_map:
-            date_map[d]['accuracy_avg'] = r.avg_val
+    Get time-series data for ROI analysis charts (last `days` days, optionally one model).
 
-    # 2. Query ROI components from model_execution_logs
-    roi_results = db.query(
-        func.strftime('%Y-%m-%d', ModelExecutionLog.timestamp).label('date'),
-        func.sum(ModelExecutionLog.business_impact_value).label('total_impact'),
-        func.sum(ModelExecutionLog.latency_ms).label('total_latency')
-    ).filter(
-        ModelExecutionLog.timestamp >= start_date
-    ).group_by(
-        func.strftime('%Y-%m-%d', ModelExecutionLog.timestamp)
-    ).all()
-    
-    COST_FACTOR = 0.5 # Configurable cost factor
-    
-    for r in roi_results:
-        d = r.date
-        if d in date_map:
-            impact = r.total_impact or 0
-            latency = r.total_latency or 0
-            # ROI Formula: Impact / (Latency * CostFactor)
-            # Avoid division by zero
-            if latency > 0:
-                roi = impact / (latency * COST_FACTOR)
-            else:
-                roi = 0
-            date_map[d]['roi'] = roi
-
-    # Format for frontend
-    # Sort by date ascending
-    sorted_dates = sorted(date_map.keys())
-    
+    Y-Axis (Accuracy): accuracy_sum / accuracy_n，即当日 accuracy 指标的平均值
+    Y-Axis (ROI): SUM(business_impact_value) / (SUM(latency_ms) * CostFactor)
+    数据取自 model_daily_rollup，每天每个模型一行，与明细表规模无关。
+    """
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail='days 取 1~366')
+    today = datetime.utcnow().date()
+    dates = [(today - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+    query = db.query(
+        ModelDailyRollup.day,
+        func.sum(ModelDailyRollup.calls),
+        func.sum(ModelDailyRollup.impact_sum),
+        func.sum(ModelDailyRollup.latency_sum),
+        func.sum(ModelDailyRollup.accuracy_sum),
+        func.sum(ModelDailyRollup.accuracy_n)
+    ).filter(ModelDailyRollup.day >= dates[0])
+    if modelId and modelId != 'all':
+        query = query.filter(ModelDailyRollup.model_id == modelId)
+    by_day = {r[0]: r[1:] for r in query.group_by(ModelDailyRollup.day).all()}
+
+    roi, accuracy, calls = [], [], []
+    for d in dates:
+        n, impact, latency, acc_sum, acc_n = by_day.get(d, (0, 0, 0, 0, 0))
+        roi.append(round(impact / (latency * COST_FACTOR), 2) if latency else 0)
+        accuracy.append(round(acc_sum / acc_n, 2) if acc_n else 0)
+        calls.append(int(n or 0))
     return {
-        "dates": sorted_dates,
-        "roi_trend": [round(date_map[d].get('roi', 0), 2) for d in sorted_dates],
-        "accuracy_trend": [round(date_map[d].get('accuracy_avg', 0), 2) for d in sorted_dates]
+        "dates": dates,
+        "roi_trend": roi,
+        "accuracy_trend": accuracy,
+        "calls_trend": calls
     }
 
+@router.post('/rollup/backfill')
+def backfill_model_rollup(since: str = ''):
+    """按执行记录与指标明细重建 since（YYYY-MM-DD，空为全部）之后的模型日汇总"""
+    from backend_py.services.model_rollup import backfill_rollup
+    return {'ok': True, **backfill_rollup(engine, since)}
+
+@router.post('/execution-logs')
+async def ingest_execution_logs(request: Request, wait: bool = False):
+    """
+    模型执行轨迹接入：单个 JSON 对象、JSON 数组或 NDJSON，每条含 modelId，可选 traceId、orderId、modelName、
+    inputSnapshot、outputResult、businessOutcome、businessImpactValue、latencyMs、status、timestamp、metrics。
+    校验通过的轨迹进入写缓冲，由后台线程攒批写入执行记录与指标；wait=true 时等待本批落库再返回，
+    本批重试后仍写入失败时返回 503（重发同一 traceId 不会重复计数）。
+    """
+    records = await read_records(request)
+    received_at = datetime.utcnow()
+    accepted, errors = [], []
+    for i, rec in enumerate(records):
+        try:
+            if not isinstance(rec, dict):
+                raise ValueError('记录不是 JSON 对象')
+            accepted.append(normalize_trace(rec, received_at))
+        except ValueError as e:
+            errors.append({'index': i, 'error': str(e)})
+    res = {'ok': True, 'accepted': len(accepted), 'failed': len(errors), 'errors': errors}
+    if accepted:
+        try:
+            seq = trace_buffer.put_many(accepted)
+        except BufferFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+        if wait:
+            first = seq - len(accepted) + 1
+            res['flushed'] = await run_in_threadpool(trace_buffer.wait, seq, 30, first)
+            if trace_buffer.failed(first, seq):
+                raise HTTPException(status_code=503, detail='执行记录写入失败，请稍后重试', headers={'Retry-After': '1'})
+    res['pending'] = trace_buffer.pending()
+    return res
+
 @router.post('/simulate-traffic')
 def simulate_traffic(days_back: int = 0, db: Session = Depends(get_db)):
     """
@@ -299,6 +229,7 @@ def simulate_traffic(days_back: int = 0, db: Session = Depends(get_db)):
     if not order_ids:
         order_ids = [str(uuid.uuid4())]
 
+    logs, metrics = [], []
     for _ in range(5):
         m_name = random.choice(models)
         outcome = random.choice(outcomes)
@@ -323,6 +254,7 @@ def simulate_traffic(days_back: int = 0, db: Session = Depends(get_db)):
             timestamp=base_time - timedelta(minutes=random.randint(0, 1440))
         )
         db.add(log)
+        logs.append(log)
         
         # Simulate accuracy metric for this model execution
         # Occasional metric log
@@ -334,6 +266,7 @@ def simulate_traffic(days_back: int = 0, db: Session = Depends(get_db)):
                 timestamp=base_time - timedelta(minutes=random.randint(0, 1440))
             )
             db.add(acc_metric)
+            metrics.append(acc_metric)
     
     # Simulate efficiency metric
     eff_metric = ModelMetric(
@@ -343,6 +276,13 @@ def simulate_traffic(days_back: int = 0, db: Session = Depends(get_db)):
         timestamp=base_time
     )
     db.add(eff_metric)
-    
+    metrics.append(eff_metric)
+
+    log_rows = [{c: getattr(r, c) for c in LOG_FIELDS} for r in logs]
+    metric_rows = [{'model_id': r.model_id, 'metric_type': r.metric_type, 'value': r.value, 'timestamp': r.timestamp} for r in metrics]
+    kpi_rollup.on_logs_inserted(db, log_rows)
+    model_rollup.on_logs_inserted(db, log_rows)
+    kpi_rollup.on_metrics_inserted(db, metric_rows)
+    model_rollup.on_metrics_inserted(db, metric_rows)
     db.commit()
     return {"message": "Simulated 5 transactions"}
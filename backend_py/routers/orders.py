@@ -1,7 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from backend_py.db import SessionLocal
+from backend_py.db import SessionLocal, engine
+from backend_py.pagination import keyset_page
+from backend_py.services.bulk_upsert import bulk_upsert, read_records
+from backend_py.services.export import export_response
+from backend_py.services.fts import search_filter
+from backend_py.services.fx import cny_sql
+from backend_py.services.count_cache import gmv_reports, replenishment_plans
+from backend_py.services.enterprise_stats import on_orders_written, orders_hook
+from backend_py.services.risk_score import compliance_score
+from backend_py.models.customs import CustomsHeader, CustomsItem
+from backend_py.models.logistics import Logistics
+from backend_py.models.model_metrics import ModelExecutionLog
 from backend_py.models.orders import Order
+from backend_py.models.settlements import Settlement
 from backend_py.schemas.orders import OrderIn
 
 router = APIRouter(prefix='/api/orders')
@@ -13,17 +29,25 @@ def get_db():
     finally:
         db.close()
 
-@router.get('')
-def list_orders(q: str = '', status: str = 'all', category: str = 'all', offset: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def _filter_orders(db: Session, q, status, category):
     query = db.query(Order)
     if q:
-        query = query.filter((Order.order_number.like(f'%{q}%')) | (Order.enterprise.like(f'%{q}%')))
+        query = query.filter(search_filter(Order, q))
     if status and status != 'all':
         query = query.filter(Order.status == status)
     if category and category != 'all':
         query = query.filter(Order.category == category)
-    rows = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
-    return [{
+    return query
+
+@router.get('')
+def list_orders(q: str = '', status: str = 'all', category: str = 'all', offset: int = 0, limit: int = 10, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    query = _filter_orders(db, q, status, category)
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, Order.created_at, Order.id, cursor, limit)
+    else:
+        rows = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    items = [{
         'id': r.id,
         'orderNumber': r.order_number,
         'enterprise': r.enterprise,
@@ -36,21 +60,39 @@ def list_orders(q: str = '', status: str = 'all', category: str = 'all', offset:
         'tradeTerms': getattr(r, 'trade_terms', '') or '',
         'route': getattr(r, 'route', '') or ''
     } for r in rows]
+    if cursor is not None:
+        return {'items': items, 'nextCursor': next_cursor}
+    return items
 
 @router.get('/count')
 def count_orders(q: str = '', status: str = 'all', category: str = 'all', db: Session = Depends(get_db)):
-    query = db.query(Order)
-    if q:
-        query = query.filter((Order.order_number.like(f'%{q}%')) | (Order.enterprise.like(f'%{q}%')))
-    if status and status != 'all':
-        query = query.filter(Order.status == status)
-    if category and category != 'all':
-        query = query.filter(Order.category == category)
+    query = _filter_orders(db, q, status, category)
     return {'count': query.count()}
 
+@router.get('/export')
+def export_orders(format: str = 'csv', q: str = '', status: str = 'all', category: str = 'all', db: Session = Depends(get_db)):
+    query = _filter_orders(db, q, status, category).with_entities(
+        Order.id.label('id'),
+        Order.order_number.label('orderNumber'),
+        Order.enterprise.label('enterprise'),
+        Order.category.label('category'),
+        Order.status.label('status'),
+        Order.amount.label('amount'),
+        Order.currency.label('currency'),
+        Order.created_at.label('createdAt'),
+        Order.incoterms.label('incoterms'),
+        Order.trade_terms.label('tradeTerms'),
+        Order.route.label('route'),
+    )
+    return export_response(engine, query.order_by(Order.created_at.desc()).statement, format, 'orders')
+
+def _stats_row(r):
+    return {'enterprise': r.enterprise, 'status': r.status, 'amount': r.amount, 'currency': r.currency, 'created_at': r.created_at}
+
 @router.post('')
 def upsert_order(data: OrderIn, db: Session = Depends(get_db)):
     r = db.query(Order).filter(Order.id == data.id).first()
+    old = {r.id: _stats_row(r)} if r else {}
     if r:
         r.order_number = data.order_number
         r.enterprise = data.enterprise
@@ -75,11 +117,174 @@ def upsert_order(data: OrderIn, db: Session = Depends(get_db)):
             route=data.route or ''
         )
         db.add(r)
+    on_orders_written(db, old, {r.id: _stats_row(r)})
     db.commit()
+    replenishment_plans.clear()
+    gmv_reports.clear()
     return {'ok': True}
 
+def _order_row(rec):
+    data = OrderIn(**rec)
+    now = datetime.utcnow()
+    created_at = datetime.fromisoformat(data.created_at.replace('Z', '+00:00')).replace(tzinfo=None) if data.created_at else now
+    return {
+        'id': data.id,
+        'order_number': data.order_number,
+        'enterprise': data.enterprise,
+        'category': data.category,
+        'status': data.status,
+        'amount': data.amount,
+        'currency': data.currency,
+        'incoterms': data.incoterms or '',
+        'trade_terms': data.trade_terms or '',
+        'route': data.route or '',
+        'created_at': created_at,
+        'updated_at': now
+    }
+
+@router.post('/bulk')
+async def bulk_upsert_orders(request: Request):
+    """批量新增/更新订单：JSON 数组或 NDJSON，字段同 POST /api/orders；created_at 仅在新建时写入"""
+    records = await read_records(request)
+    result = await run_in_threadpool(bulk_upsert, engine, Order.__table__, _order_row, records, ('created_at',), orders_hook)
+    replenishment_plans.clear()
+    gmv_reports.clear()
+    return result
+
+# GMV 报表的分组列
+GMV_GROUPS = {'day': 'substr(orders.created_at, 1, 10)', 'category': 'orders.category', 'enterprise': 'orders.enterprise'}
+
+@router.get('/gmv')
+def gmv_report(groupBy: str = 'day', start: str = '', end: str = '', db: Session = Depends(get_db)):
+    """
+    按日/品类/企业汇总订单数与人民币 GMV，start/end 为下单日（YYYY-MM-DD，含两端）。
+    每笔订单按下单日当日有效的汇率在 SQL 内折算，一条 GROUP BY 完成；结果缓存至订单写入或汇率变更。
+    """
+    col = GMV_GROUPS.get(groupBy)
+    if col is None:
+        raise HTTPException(status_code=400, detail='groupBy 取 day/category/enterprise')
+    key = (groupBy, start, end)
+    hit = gmv_reports.get(key)
+    if hit is not None:
+        return hit
+    conds, params = ['orders.created_at IS NOT NULL'], {}
+    if start:
+        conds.append('orders.created_at >= :start')
+        params['start'] = start
+    if end:
+        conds.append("orders.created_at < date(:end, '+1 day')")
+        params['end'] = end
+    rows = db.execute(text(
+        f"SELECT {col}, COUNT(*), SUM({cny_sql('orders.amount', 'orders.currency', 'orders.created_at')}) "
+        f"FROM orders WHERE {' AND '.join(conds)} GROUP BY 1 ORDER BY 1"
+    ), params).all()
+    result = [{'key': r[0], 'orders': r[1], 'gmvCny': round(r[2] or 0, 2)} for r in rows]
+    gmv_reports.set(key, result)
+    return result
+
+@router.get('/{id}/full')
+def get_order_full(id: str, traces: int = 10, db: Session = Depends(get_db)):
+    """
+    订单全链路视图：订单、结算单、运单、报关单（含明细）、最近的模型执行记录与合规评分。
+    各部分均按 order_id 走索引一次取出，报关明细与评分共用同一次查询，共 6 条 SQL。
+    """
+    o = db.query(Order).filter(Order.id == id).first()
+    if not o:
+        raise HTTPException(status_code=404, detail='订单不存在')
+    settlements = db.query(Settlement).filter(Settlement.order_id == id).order_by(Settlement.id.desc()).all()
+    shipments = db.query(Logistics).filter(Logistics.order_id == id).order_by(Logistics.id.desc()).all()
+    headers = db.query(CustomsHeader).filter(CustomsHeader.order_id == id).order_by(CustomsHeader.declare_date.desc()).all()
+    items = db.query(CustomsItem).join(CustomsHeader, CustomsItem.header_id == CustomsHeader.id).filter(CustomsHeader.order_id == id).order_by(CustomsItem.header_id.asc(), CustomsItem.line_no.asc()).all()
+    logs = db.query(ModelExecutionLog).filter(ModelExecutionLog.order_id == id).order_by(ModelExecutionLog.timestamp.desc()).limit(traces).all()
+
+    items_by_header = {h.id: [] for h in headers}
+    for r in items:
+        items_by_header[r.header_id].append({
+            'id': r.id,
+            'lineNo': r.line_no,
+            'hsCode': r.hs_code,
+            'name': r.name,
+            'spec': r.spec,
+            'unit': r.unit,
+            'qty': r.qty,
+            'unitPrice': r.unit_price,
+            'amount': r.amount,
+            'originCountry': r.origin_country,
+            'taxRate': r.tax_rate,
+            'tariff': r.tariff,
+            'excise': r.excise,
+            'vat': r.vat
+        })
+    return {
+        'order': {
+            'id': o.id,
+            'orderNumber': o.order_number,
+            'enterprise': o.enterprise,
+            'category': o.category,
+            'status': o.status,
+            'amount': o.amount,
+            'currency': o.currency,
+            'createdAt': o.created_at.isoformat() if o.created_at else None,
+            'incoterms': o.incoterms or '',
+            'tradeTerms': o.trade_terms or '',
+            'route': o.route or ''
+        },
+        'settlements': [{
+            'id': r.id,
+            'status': r.status,
+            'settlementTime': r.settlement_time,
+            'riskLevel': r.risk_level
+        } for r in settlements],
+        'shipments': [{
+            'id': r.id,
+            'trackingNo': r.tracking_no,
+            'origin': r.origin,
+            'destination': r.destination,
+            'status': r.status,
+            'mode': r.mode,
+            'carrier': r.carrier,
+            'etd': r.etd,
+            'eta': r.eta,
+            'atd': r.atd,
+            'ata': r.ata,
+            'blNo': r.bl_no,
+            'awbNo': r.awb_no,
+            'efficiency': r.efficiency,
+            'freightCost': r.freight_cost,
+            'insuranceCost': r.insurance_cost,
+            'warehouseStatus': r.warehouse_status
+        } for r in shipments],
+        'declarations': [{
+            'id': h.id,
+            'declarationNo': h.declaration_no,
+            'portCode': h.port_code,
+            'tradeMode': h.trade_mode,
+            'currency': h.currency,
+            'totalValue': h.total_value,
+            'status': h.status,
+            'declareDate': str(h.declare_date),
+            'items': items_by_header[h.id]
+        } for h in headers],
+        'traces': [{
+            'traceId': r.id,
+            'modelId': r.model_id,
+            'modelName': r.model_name,
+            'businessOutcome': r.business_outcome,
+            'businessImpactValue': r.business_impact_value,
+            'latencyMs': r.latency_ms,
+            'status': r.status,
+            'timestamp': r.timestamp.isoformat() if r.timestamp else None
+        } for r in logs],
+        'risk': compliance_score(o, items, settlements[0] if settlements else None, shipments[0] if shipments else None)
+    }
+
 @router.delete('/{id}')
 def delete_order(id: str, db: Session = Depends(get_db)):
+    r = db.query(Order).filter(Order.id == id).first()
+    if r:
+        on_orders_written(db, {r.id: _stats_row(r)}, {})
     db.query(Order).filter(Order.id == id).delete()
     db.commit()
+    replenishment_plans.clear()
+    gmv_reports.clear()
     return {'ok': True}
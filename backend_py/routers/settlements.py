@@ -1,6 +1,14 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
-from backend_py.db import SessionLocal
+from backend_py.db import SessionLocal, engine
+from backend_py.pagination import keyset_page
+from backend_py.services.bulk_upsert import bulk_upsert, read_records
+from backend_py.services.enterprise_stats import on_settlements_written, settlements_hook
+from backend_py.services.export import export_response
+from backend_py.services.fts import capped_match_count, search_filter
 from backend_py.models.settlements import Settlement
 from backend_py.models.orders import Order
 from backend_py.schemas.settlements import SettlementIn
@@ -14,25 +22,42 @@ def get_db():
     finally:
         db.close()
 
-@router.get('')
-def list_settlements(q: str = '', status: str = 'all', offset: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+# 关键词命中的订单不超过该数量时以订单驱动半连接，否则按结算单主键顺序逐行 EXISTS 探测，分页可提前结束
+SEMI_JOIN_MAX = 2000
+
+def _filter_settlements(db: Session, q, status, orderId='', ordered=False):
+    """ordered=True 用于按 id 顺序取一页/导出的查询，计数时走订单驱动的半连接"""
     query = db.query(Settlement)
+    if orderId:
+        query = query.filter(Settlement.order_id == orderId)
     if q:
-        ids = [o.id for o in db.query(Order).filter((Order.order_number.like(f'%{q}%')) | (Order.enterprise.like(f'%{q}%'))).all()]
-        if ids:
-            query = query.filter(Settlement.order_id.in_(ids))
+        # 检索条件以子查询下推到 SQL，命中的订单 id 不回传到 Python；兼容以订单 id 直接作为 q 的旧用法
+        cond = search_filter(Order, q)
+        hits = capped_match_count(db, Order, q, SEMI_JOIN_MAX + 1) if ordered else 0
+        if hits is None or hits > SEMI_JOIN_MAX:
+            match = exists().where(Order.id == Settlement.order_id).where(cond)
         else:
-            query = query.filter(Settlement.order_id == q)
+            match = Settlement.order_id.in_(db.query(Order.id).filter(cond))
+        query = query.filter(match | (Settlement.order_id == q))
     if status and status != 'all':
         query = query.filter(Settlement.status == status)
-    rows = query.order_by(Settlement.id.desc()).offset(offset).limit(limit).all()
+    return query
+
+@router.get('')
+def list_settlements(q: str = '', status: str = 'all', orderId: str = '', offset: int = 0, limit: int = 10, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    query = _filter_settlements(db, q, status, orderId, ordered=True)
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, Settlement.id, Settlement.id, cursor, limit)
+    else:
+        rows = query.order_by(Settlement.id.desc()).offset(offset).limit(limit).all()
     order_map = {}
     if rows:
         ids2 = [r.order_id for r in rows if r.order_id]
         if ids2:
             ors = db.query(Order).filter(Order.id.in_(ids2)).all()
             order_map = {o.id: o for o in ors}
-    return [{
+    items = [{
         'id': r.id,
         'orderId': r.order_id,
         'orderNumber': (order_map.get(r.order_id).order_number if r.order_id in order_map else None),
@@ -41,23 +66,51 @@ def list_settlements(q: str = '', status: str = 'all', offset: int = 0, limit: i
         'settlementTime': r.settlement_time,
         'riskLevel': r.risk_level
     } for r in rows]
+    if cursor is not None:
+        return {'items': items, 'nextCursor': next_cursor}
+    return items
+
+@router.get('/by-order')
+def list_settlements_by_order(ids: str = '', db: Session = Depends(get_db)):
+    """按订单批量取结算单：ids 为逗号分隔的订单 id，走 order_id 索引分块 IN 查询，按订单 id 分组返回"""
+    grouped = {x: [] for x in ids.split(',') if x}
+    keys = list(grouped)
+    for i in range(0, len(keys), 500):
+        rows = db.query(Settlement).filter(Settlement.order_id.in_(keys[i:i + 500])).order_by(Settlement.order_id.asc(), Settlement.id.desc()).all()
+        for r in rows:
+            grouped[r.order_id].append({
+                'id': r.id,
+                'status': r.status,
+                'settlementTime': r.settlement_time,
+                'riskLevel': r.risk_level
+            })
+    return grouped
 
 @router.get('/count')
-def count_settlements(q: str = '', status: str = 'all', db: Session = Depends(get_db)):
-    query = db.query(Settlement)
-    if q:
-        ids = [o.id for o in db.query(Order).filter((Order.order_number.like(f'%{q}%')) | (Order.enterprise.like(f'%{q}%'))).all()]
-        if ids:
-            query = query.filter(Settlement.order_id.in_(ids))
-        else:
-            query = query.filter(Settlement.order_id == q)
-    if status and status != 'all':
-        query = query.filter(Settlement.status == status)
+def count_settlements(q: str = '', status: str = 'all', orderId: str = '', db: Session = Depends(get_db)):
+    query = _filter_settlements(db, q, status, orderId)
     return {'count': query.count()}
 
+@router.get('/export')
+def export_settlements(format: str = 'csv', q: str = '', status: str = 'all', orderId: str = '', db: Session = Depends(get_db)):
+    query = _filter_settlements(db, q, status, orderId, ordered=True).outerjoin(Order, Order.id == Settlement.order_id).with_entities(
+        Settlement.id.label('id'),
+        Settlement.order_id.label('orderId'),
+        Order.order_number.label('orderNumber'),
+        Order.enterprise.label('enterprise'),
+        Settlement.status.label('status'),
+        Settlement.settlement_time.label('settlementTime'),
+        Settlement.risk_level.label('riskLevel'),
+    )
+    return export_response(engine, query.order_by(Settlement.id.desc()).statement, format, 'settlements')
+
+def _stats_row(r):
+    return {'order_id': r.order_id, 'status': r.status}
+
 @router.post('')
 def upsert_settlement(data: SettlementIn, db: Session = Depends(get_db)):
     r = db.query(Settlement).filter(Settlement.id == data.id).first()
+    old = {r.id: _stats_row(r)} if r else {}
     if r:
         r.order_id = data.order_id
         r.status = data.status
@@ -72,11 +125,31 @@ def upsert_settlement(data: SettlementIn, db: Session = Depends(get_db)):
             risk_level=data.risk_level or 'low'
         )
         db.add(r)
+    on_settlements_written(db, old, {r.id: _stats_row(r)})
     db.commit()
     return {'ok': True}
 
+def _settlement_row(rec):
+    data = SettlementIn(**rec)
+    return {
+        'id': data.id,
+        'order_id': data.order_id,
+        'status': data.status,
+        'settlement_time': data.settlement_time or 0,
+        'risk_level': data.risk_level or 'low'
+    }
+
+@router.post('/bulk')
+async def bulk_upsert_settlements(request: Request):
+    """批量新增/更新结算单：JSON 数组或 NDJSON，字段同 POST /api/settlements"""
+    records = await read_records(request)
+    return await run_in_threadpool(bulk_upsert, engine, Settlement.__table__, _settlement_row, records, (), settlements_hook)
+
 @router.delete('/{id}')
 def delete_settlement(id: str, db: Session = Depends(get_db)):
+    r = db.query(Settlement).filter(Settlement.id == id).first()
+    if r:
+        on_settlements_written(db, {r.id: _stats_row(r)}, {})
     db.query(Settlement).filter(Settlement.id == id).delete()
     db.commit()
     return {'ok': True}
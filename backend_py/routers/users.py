@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 import uuid
 
 from backend_py.db import SessionLocal
+from backend_py.pagination import keyset_page
 from backend_py.models.users import User, Role
 from backend_py.schemas.users import (
     UserCreate,
     UserUpdate,
     UserOut,
+    UserPage,
     RoleCreate,
     RoleUpdate,
     RoleOut,
@@ -28,8 +30,8 @@ def get_db():
         db.close()
 
 
-@router.get('', response_model=List[UserOut])
-def list_users(q: str = '', offset: int = 0, limit: int = 10, db: Session = Depends(get_db), user_role=Depends(get_current_user)):
+@router.get('', response_model=Union[List[UserOut], UserPage])
+def list_users(q: str = '', offset: int = 0, limit: int = 10, cursor: Optional[str] = None, db: Session = Depends(get_db), user_role=Depends(get_current_user)):
     query = db.query(User)
     if q:
         query = query.filter(
@@ -37,7 +39,11 @@ def list_users(q: str = '', offset: int = 0, limit: int = 10, db: Session = Depe
             | (User.name.like(f'%{q}%'))
             | (User.email.like(f'%{q}%'))
         )
-    users = query.order_by(User.created_at.desc()).offset(offset).limit(limit).all()
+    next_cursor = None
+    if cursor is not None:
+        users, next_cursor = keyset_page(query, User.created_at, User.id, cursor, limit)
+    else:
+        users = query.order_by(User.created_at.desc()).offset(offset).limit(limit).all()
     result: List[UserOut] = []
     for u in users:
         result.append(
@@ -62,6 +68,8 @@ def list_users(q: str = '', offset: int = 0, limit: int = 10, db: Session = Depe
                 updated_at=u.updated_at.isoformat(),
             )
         )
+    if cursor is not None:
+        return UserPage(items=result, nextCursor=next_cursor)
     return result
 
 
@@ -1,6 +1,13 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 from sqlalchemy.orm import Session
-from backend_py.db import SessionLocal
+from backend_py.db import SessionLocal, engine
+from backend_py.pagination import keyset_page
+from backend_py.services.bulk_upsert import bulk_upsert, read_records
+from backend_py.services.count_cache import replenishment_plans
+from backend_py.services.inventory_snapshots import history_cache, record_snapshots, snapshot_all
 from backend_py.models.warehouse import Inventory
 from backend_py.schemas.warehouse import InventoryIn
 
@@ -14,12 +21,16 @@ def get_db():
         db.close()
 
 @router.get('')
-def list_inventory(q: str = '', offset: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def list_inventory(q: str = '', offset: int = 0, limit: int = 10, cursor: Optional[str] = None, db: Session = Depends(get_db)):
     query = db.query(Inventory)
     if q:
         query = query.filter(Inventory.name.like(f'%{q}%'))
-    rows = query.order_by(Inventory.name.asc()).offset(offset).limit(limit).all()
-    return [{
+    next_cursor = None
+    if cursor is not None:
+        rows, next_cursor = keyset_page(query, Inventory.name, Inventory.name, cursor, limit, desc=False)
+    else:
+        rows = query.order_by(Inventory.name.asc()).offset(offset).limit(limit).all()
+    items = [{
         'name': r.name,
         'current': r.current,
         'target': r.target,
@@ -27,6 +38,9 @@ def list_inventory(q: str = '', offset: int = 0, limit: int = 10, db: Session =
         'sales': r.sales,
         'efficiency': r.efficiency
     } for r in rows]
+    if cursor is not None:
+        return {'items': items, 'nextCursor': next_cursor}
+    return items
 
 @router.get('/count')
 def count_inventory(q: str = '', db: Session = Depends(get_db)):
@@ -54,11 +68,68 @@ def upsert_inventory(data: InventoryIn, db: Session = Depends(get_db)):
             efficiency=data.efficiency
         )
         db.add(r)
+    record_snapshots(db, [{'name': data.name, 'current': data.current, 'production': data.production, 'sales': data.sales}])
     db.commit()
+    replenishment_plans.clear()
     return {'ok': True}
 
+def _inventory_row(rec):
+    data = InventoryIn(**rec)
+    return {
+        'name': data.name,
+        'current': data.current,
+        'target': data.target,
+        'production': data.production,
+        'sales': data.sales,
+        'efficiency': data.efficiency
+    }
+
+@router.post('/bulk')
+async def bulk_upsert_inventory(request: Request):
+    """批量新增/更新库存：JSON 数组或 NDJSON，字段同 POST /api/inventory"""
+    records = await read_records(request)
+    result = await run_in_threadpool(bulk_upsert, engine, Inventory.__table__, _inventory_row, records, (), record_snapshots)
+    replenishment_plans.clear()
+    return result
+
+@router.post('/snapshots')
+def take_snapshots(db: Session = Depends(get_db)):
+    """为全部产品写入当天快照（定时任务入口）"""
+    n = snapshot_all(db)
+    db.commit()
+    return {'ok': True, 'snapshots': n}
+
+@router.get('/forecast')
+def forecast_inventory(names: str = '', horizon: int = 7, days: int = 90, season: int = 7, alpha: float = 0.4, beta: float = 0.2, gamma: float = 0.3, db: Session = Depends(get_db)):
+    """
+    按库存日快照的销量序列，用 Holt-Winters 一次性预测全部（或 names 指定的，逗号分隔）产品未来 horizon 天的需求。
+    """
+    if not (1 <= horizon <= 90 and 1 <= days <= 730):
+        raise HTTPException(status_code=400, detail='horizon 取 1~90，days 取 1~730')
+    if not all(0 <= v <= 1 for v in (alpha, beta, gamma)):
+        raise HTTPException(status_code=400, detail='alpha/beta/gamma 取 0~1')
+    from backend_py.services.demand_forecast import forecast_demand
+    picked = [n for n in names.split(',') if n] if names else None
+    # 结果只含基础类型，直接序列化，跳过逐字段的 jsonable_encoder
+    return JSONResponse(forecast_demand(db.connection(), picked, days, horizon, season, alpha, beta, gamma))
+
+@router.get('/replenishment')
+def replenishment_plan(leadTime: int = 7, safetyDays: int = 3, horizon: int = 14, capacity: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    结合当前库存、目标、产销速率与未完结订单需求，为全部产品批量计算下单日与下单量；
+    传入 capacity 时在总产能内按断货紧急程度分配。结果缓存至库存或订单发生写入。
+    """
+    if not (0 <= leadTime <= 365 and 0 <= safetyDays <= 365 and 0 <= horizon <= 365):
+        raise HTTPException(status_code=400, detail='leadTime/safetyDays/horizon 取 0~365')
+    if capacity is not None and capacity < 0:
+        raise HTTPException(status_code=400, detail='capacity 不能为负')
+    from backend_py.services.replenishment import plan_replenishment
+    return JSONResponse(plan_replenishment(db.connection(), leadTime, safetyDays, horizon, capacity))
+
 @router.delete('/{name}')
 def delete_inventory(name: str, db: Session = Depends(get_db)):
     db.query(Inventory).filter(Inventory.name == name).delete()
     db.commit()
+    history_cache.clear()
+    replenishment_plans.clear()
     return {'ok': True}
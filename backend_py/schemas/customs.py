@@ -36,3 +36,10 @@ class CustomsItemIn(BaseModel):
     tariff: Optional[float] = 0.0
     excise: Optional[float] = 0.0
     vat: Optional[float] = 0.0
+
+class HsTaxRateIn(BaseModel):
+    hs_prefix: str
+    tariff_rate: Optional[float] = 0.0
+    excise_rate: Optional[float] = 0.0
+    vat_rate: Optional[float] = 0.13
+    description: Optional[str] = None
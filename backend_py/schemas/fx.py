@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+class FxRateIn(BaseModel):
+    currency: str
+    valid_from: str
+    rate: float
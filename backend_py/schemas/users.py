@@ -90,3 +90,8 @@ class RoleOut(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class UserPage(BaseModel):
+    items: List[UserOut]
+    nextCursor: Optional[str] = None
@@ -102,9 +102,44 @@ def seed_users():
         session.close()
 
 
+# 默认 HS 前缀税率（关税率, 消费税率, 增值税率, 说明），覆盖样例数据中的商品类别
+DEFAULT_TAX_RATES = [
+    ('33', 0.05, 0.0, 0.13, '精油、香料及化妆品'),
+    ('3304', 0.01, 0.15, 0.13, '美容化妆品（高档化妆品消费税）'),
+    ('22', 0.14, 0.10, 0.13, '饮料、酒及醋'),
+    ('2203', 0.0, 0.0, 0.13, '啤酒'),
+    ('2204', 0.14, 0.10, 0.13, '葡萄酒'),
+    ('2208', 0.10, 0.20, 0.13, '蒸馏酒'),
+    ('52', 0.06, 0.0, 0.13, '棉花及棉织物'),
+    ('54', 0.06, 0.0, 0.13, '化学纤维长丝'),
+    ('62', 0.10, 0.0, 0.13, '非针织服装及衣着附件'),
+    ('84', 0.0, 0.0, 0.13, '机械器具'),
+    ('8422', 0.10, 0.0, 0.13, '洗碗机等'),
+    ('85', 0.0, 0.0, 0.13, '电机电气设备'),
+    ('8508', 0.08, 0.0, 0.13, '真空吸尘器'),
+    ('8516', 0.08, 0.0, 0.13, '电热器具'),
+]
+
+
+def seed_tax_rates():
+    """税率表为空时写入默认 HS 前缀税率"""
+    session = SessionLocal()
+    try:
+        from backend_py.models.customs import HsTaxRate
+        from datetime import datetime
+        if session.query(HsTaxRate).count() == 0:
+            now = datetime.utcnow().isoformat()
+            session.add_all([HsTaxRate(hs_prefix=p, tariff_rate=t, excise_rate=e, vat_rate=v, description=d, updated_at=now)
+                             for p, t, e, v, d in DEFAULT_TAX_RATES])
+            session.commit()
+    finally:
+        session.close()
+
+
 def seed_all():
     """统一种子入口"""
     seed_users()
+    seed_tax_rates()
     try:
         session = SessionLocal()
         from backend_py.models.enterprises import Enterprise
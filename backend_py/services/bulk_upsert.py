@@ -0,0 +1,161 @@
+import csv
+import json
+from fastapi import HTTPException, Request
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert
+
+# 每个事务写入的记录数
+CHUNK_SIZE = 5000
+# 预取已存在主键时 IN 列表的长度（避开 SQLite 变量数上限）
+PREFETCH_SIZE = 500
+
+
+async def read_records(request: Request):
+    """
+    读取批量请求体：JSON 数组，或每行一个 JSON 对象的 NDJSON（Content-Type 含 ndjson，或正文不以 '[' 开头）。
+    NDJSON 按行流式解析，单行格式错误记为 None，由调用方报告为该条失败。
+    """
+    ctype = request.headers.get('content-type', '')
+    if 'ndjson' not in ctype:
+        body = await request.body()
+        text = body.lstrip()
+        if text.startswith(b'['):
+            try:
+                records = json.loads(text)
+            except ValueError:
+                raise HTTPException(status_code=400, detail='请求体不是合法的 JSON 数组')
+            return records
+        return [_parse_line(line) for line in body.splitlines() if line.strip()]
+    return [_parse_line(line) async for line in _iter_lines(request) if line.strip()]
+
+
+async def _iter_lines(request: Request):
+    buf = b''
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b'\n')
+        for line in lines:
+            yield line
+    if buf:
+        yield buf
+
+
+async def _iter_csv_rows(request: Request):
+    """按行流式解析带表头的 CSV（兼容 UTF-8 BOM）；引号内的换行会与下一行合并后再解析"""
+    header, pending = None, ''
+    async for raw in _iter_lines(request):
+        line = raw.decode('utf-8-sig' if header is None and not pending else 'utf-8', errors='replace').rstrip('\r')
+        pending = f'{pending}\n{line}' if pending else line
+        if pending.count('"') % 2:
+            continue
+        text, pending = pending, ''
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        yield dict(zip(header, values))
+
+
+async def iter_record_chunks(request: Request, size: int = CHUNK_SIZE):
+    """
+    流式读取批量请求体，每 size 条产出一个记录列表，内存占用与请求体大小无关。
+    支持 NDJSON、带表头的 CSV（Content-Type 含 csv）；JSON 数组仍整体解析后再分块。
+    """
+    ctype = request.headers.get('content-type', '')
+    if 'csv' in ctype:
+        rows = _iter_csv_rows(request)
+    elif 'ndjson' in ctype:
+        rows = (_parse_line(line) async for line in _iter_lines(request) if line.strip())
+    else:
+        records = await read_records(request)
+        for i in range(0, len(records), size):
+            yield records[i:i + size]
+        return
+    chunk = []
+    async for rec in rows:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_line(line):
+    try:
+        rec = json.loads(line)
+    except ValueError:
+        return None
+    return rec if isinstance(rec, dict) else None
+
+
+def _error_text(e):
+    errors = getattr(e, 'errors', None)
+    if callable(errors):
+        return '; '.join(f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in errors())
+    return str(e)
+
+
+def fetch_by_ids(conn, table, cols, ids):
+    """按主键 id 分块取出当前值，返回 {id: {col: value}}；供写入钩子在同一事务内读取旧值"""
+    out = {}
+    ids = list(ids)
+    for i in range(0, len(ids), PREFETCH_SIZE):
+        chunk = ids[i:i + PREFETCH_SIZE]
+        marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+        res = conn.execute(text(f"SELECT id, {', '.join(cols)} FROM {table} WHERE id IN ({marks})"), {f'p{n}': v for n, v in enumerate(chunk)})
+        for r in res:
+            out[r[0]] = dict(zip(cols, r[1:]))
+    return out
+
+
+def bulk_upsert(engine, table, to_row, records, insert_only=(), before_write=None):
+    """
+    将记录按块以 INSERT ... ON CONFLICT DO UPDATE 写入 table，每块一个事务。
+    to_row(record) 校验并返回列字典，校验失败抛 ValueError/TypeError；insert_only 中的列仅在新建时写入。
+    before_write(conn, rows) 在同一事务内、写入前调用，用于维护汇总表等派生数据。
+    返回汇总与逐条状态（created / updated / error）。
+    """
+    pk = list(table.primary_key.columns)[0]
+    results = []
+    summary = {'total': len(records), 'created': 0, 'updated': 0, 'failed': 0}
+    with engine.connect() as conn:
+        for start in range(0, len(records), CHUNK_SIZE):
+            rows, idx = [], []
+            for i, rec in enumerate(records[start:start + CHUNK_SIZE], start):
+                try:
+                    if not isinstance(rec, dict):
+                        raise ValueError('记录不是 JSON 对象')
+                    row = to_row(rec)
+                except (ValueError, TypeError) as e:
+                    results.append({'index': i, 'id': rec.get(pk.key) if isinstance(rec, dict) else None, 'status': 'error', 'error': _error_text(e)})
+                    summary['failed'] += 1
+                    continue
+                rows.append(row)
+                idx.append(i)
+            if not rows:
+                continue
+            # 同一块内重复主键以最后一条为准
+            latest = {r[pk.key]: n for n, r in enumerate(rows)}
+            keys = list(latest)
+            unique = [rows[n] for n in latest.values()]
+            stmt = insert(table)
+            update_cols = [c for c in unique[0] if c != pk.key and c not in insert_only]
+            stmt = stmt.on_conflict_do_update(index_elements=[pk], set_={c: stmt.excluded[c] for c in update_cols})
+            existing = set()
+            with conn.begin():
+                for k in range(0, len(keys), PREFETCH_SIZE):
+                    existing.update(conn.execute(select(pk).where(pk.in_(keys[k:k + PREFETCH_SIZE]))).scalars())
+                if before_write:
+                    before_write(conn, unique)
+                conn.execute(stmt, unique)
+            for i, row in zip(idx, rows):
+                key = row[pk.key]
+                status = 'updated' if key in existing else 'created'
+                existing.add(key)
+                summary[status] += 1
+                results.append({'index': i, 'id': key, 'status': status})
+    results.sort(key=lambda r: r['index'])
+    return {'ok': True, **summary, 'results': results}
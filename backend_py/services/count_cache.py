@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class CountCache:
+    """
+    进程内短时计数缓存：按规范化的筛选条件元组缓存 COUNT 结果。
+    相关表发生写入时由路由调用 clear() 失效。
+    """
+
+    def __init__(self, ttl: float = 30.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if not hit:
+                return None
+            value, expires_at = hit
+            if time.monotonic() > expires_at:
+                self._data.pop(key, None)
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                self._data.clear()
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# customs_headers / customs_items 任一写入都会使其失效
+customs_header_counts = CountCache()
+
+# 补货计划：inventory / orders 任一写入都会使其失效
+replenishment_plans = CountCache(ttl=300.0, maxsize=64)
+
+# 订单 GMV 报表：订单写入或汇率变更时失效
+gmv_reports = CountCache(ttl=300.0, maxsize=256)
@@ -0,0 +1,125 @@
+import sys
+from collections import defaultdict
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from backend_py.models.customs import CustomsFacetCount, CustomsItem
+
+# 分面名 -> customs_headers 上的列；hs_chapter 按报关单去重计数，单独处理
+HEADER_FACETS = {'status': 'status', 'portCode': 'port_code', 'tradeMode': 'trade_mode'}
+FACETS = list(HEADER_FACETS) + ['hsChapter']
+# 批量维护时 IN 列表的长度
+LOOKUP_SIZE = 500
+
+BUMP_SQL = (
+    "INSERT INTO customs_facet_counts (facet, value, count) VALUES (:facet, :value, :delta) "
+    "ON CONFLICT(facet, value) DO UPDATE SET count = count + excluded.count"
+)
+
+
+def _bump(db: Session, facet, value, delta):
+    stmt = insert(CustomsFacetCount).values(facet=facet, value=value or '', count=delta)
+    stmt = stmt.on_conflict_do_update(index_elements=['facet', 'value'], set_={'count': CustomsFacetCount.count + delta})
+    db.execute(stmt)
+
+
+def on_header_change(db: Session, old, new):
+    """old/new 为 {'status','portCode','tradeMode'} 取值字典，新增时 old 为 None"""
+    for facet in HEADER_FACETS:
+        before = old.get(facet) if old else None
+        after = new.get(facet)
+        if old is not None and (before or '') == (after or ''):
+            continue
+        if old is not None:
+            _bump(db, facet, before, -1)
+        _bump(db, facet, after, 1)
+
+
+def on_item_added(db: Session, header_id, hs_chapter):
+    """在新明细写入前调用：该报关单首次出现此 HS 章时计数加一"""
+    if not hs_chapter:
+        return
+    exists = db.query(CustomsItem.id).filter(CustomsItem.hs_chapter == hs_chapter, CustomsItem.header_id == header_id).first()
+    if not exists:
+        _bump(db, 'hsChapter', hs_chapter, 1)
+
+
+def apply_deltas(conn, deltas):
+    """deltas: {(facet, value): 增量}，一次 executemany 累加到汇总表"""
+    rows = [{'facet': f, 'value': v or '', 'delta': d} for (f, v), d in deltas.items() if d]
+    if rows:
+        conn.execute(text(BUMP_SQL), rows)
+
+
+def on_headers_written(conn, old_rows, new_rows):
+    """批量版 on_header_change。old_rows/new_rows: {报关单id: {'status','port_code','trade_mode'}}"""
+    deltas = defaultdict(int)
+    for hid in set(old_rows) | set(new_rows):
+        for row, sign in ((old_rows.get(hid), -1), (new_rows.get(hid), 1)):
+            if row is not None:
+                for facet, col in HEADER_FACETS.items():
+                    deltas[(facet, row.get(col) or '')] += sign
+    apply_deltas(conn, deltas)
+
+
+def item_chapters(conn, header_ids):
+    """给定报关单下出现过的 (报关单id, HS 章) 组合，批量写明细前后各取一次，差集即 hsChapter 计数的增量"""
+    out = set()
+    ids = list(header_ids)
+    for i in range(0, len(ids), LOOKUP_SIZE):
+        chunk = ids[i:i + LOOKUP_SIZE]
+        marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+        out.update(tuple(r) for r in conn.execute(text(
+            f"SELECT DISTINCT header_id, hs_chapter FROM customs_items WHERE header_id IN ({marks}) AND hs_chapter IS NOT NULL AND hs_chapter != ''"
+        ), {f'p{n}': v for n, v in enumerate(chunk)}))
+    return out
+
+
+def on_item_chapters_changed(conn, before, after):
+    deltas = defaultdict(int)
+    for _, chapter in after - before:
+        deltas[('hsChapter', chapter)] += 1
+    for _, chapter in before - after:
+        deltas[('hsChapter', chapter)] -= 1
+    apply_deltas(conn, deltas)
+
+
+def rebuild_facets(conn):
+    """按业务表全量重建汇总表，用于修复漂移"""
+    conn.execute(text("DELETE FROM customs_facet_counts"))
+    for facet, col in HEADER_FACETS.items():
+        conn.execute(text(
+            f"INSERT INTO customs_facet_counts (facet, value, count) "
+            f"SELECT '{facet}', COALESCE({col}, ''), COUNT(*) FROM customs_headers GROUP BY COALESCE({col}, '')"
+        ))
+    conn.execute(text(
+        "INSERT INTO customs_facet_counts (facet, value, count) "
+        "SELECT 'hsChapter', hs_chapter, COUNT(DISTINCT header_id) FROM customs_items "
+        "WHERE hs_chapter IS NOT NULL AND hs_chapter != '' GROUP BY hs_chapter"
+    ))
+
+
+def ensure_facets(conn):
+    """汇总表为空而业务表有数据时（首次升级）做一次全量构建"""
+    empty = conn.execute(text("SELECT 1 FROM customs_facet_counts LIMIT 1")).first() is None
+    if empty and conn.execute(text("SELECT 1 FROM customs_headers LIMIT 1")).first() is not None:
+        rebuild_facets(conn)
+
+
+def summary_facets(db: Session):
+    res = {f: [] for f in FACETS}
+    for r in db.query(CustomsFacetCount).filter(CustomsFacetCount.count > 0).order_by(CustomsFacetCount.count.desc(), CustomsFacetCount.value.asc()).all():
+        if r.facet in res:
+            res[r.facet].append({'value': r.value, 'count': r.count})
+    return res
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        print('用法: python -m backend_py.services.customs_facets rebuild')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    with engine.begin() as conn:
+        rebuild_facets(conn)
+    print('customs_facet_counts rebuilt')
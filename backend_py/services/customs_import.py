@@ -0,0 +1,385 @@
+import csv
+import os
+import sys
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from backend_py.services.count_cache import customs_header_counts
+from backend_py.services import customs_facets
+from backend_py.services.customs_index import backfill_customs_index, normalize_hs
+from backend_py.services import port_congestion
+from backend_py.services.bulk_upsert import fetch_by_ids
+from backend_py.services.enterprise_stats import on_headers_written
+
+CHUNK_SIZE = 5000          # 每次 executemany 的行数
+COMMIT_EVERY = 50000       # 每个事务最多写入的行数
+MAX_ERRORS = 1000          # 返回给调用方的错误明细上限
+
+# 海关币制代码 -> ISO 币种
+CURRENCY_CODES = {'110': 'HKD', '116': 'JPY', '142': 'CNY', '300': 'EUR', '303': 'GBP', '502': 'USD'}
+
+# 字段别名：同时兼容 报关单数据样例.xlsx 的字段代码与本系统的字段名
+HEADER_FIELDS = {
+    'id': ['ENTRY_ID', 'header_id', 'id'],
+    'declaration_no': ['ENTRY_ID', 'declaration_no', 'PRE_ENTRY_ID'],
+    'enterprise': ['TRADE_NAME', 'enterprise'],
+    'owner': ['OWNER_NAME'],
+    'ie_flag': ['I_E_FLAG'],
+    'consignor': ['consignor'],
+    'consignee': ['consignee'],
+    'port_code': ['I_E_PORT', 'port_code'],
+    'trade_mode': ['TRADE_MODE', 'trade_mode'],
+    'currency': ['currency'],
+    'total_value': ['total_value'],
+    'gross_weight': ['GROSS_WT', 'gross_weight'],
+    'net_weight': ['NET_WT', 'net_weight'],
+    'packages': ['PACK_NO', 'packages'],
+    'country_origin': ['country_origin'],
+    'country_dest': ['TRADE_COUNTRY', 'country_dest'],
+    'status': ['status'],
+    'declare_date': ['D_DATE', 'declare_date'],
+    'order_id': ['order_id'],
+}
+ITEM_FIELDS = {
+    'id': ['ID', 'item_id'],
+    'header_id': ['ENTRY_ID', 'header_id'],
+    'line_no': ['G_NO', 'line_no'],
+    'hs_code': ['CODE_TS', 'hs_code'],
+    'name': ['G_NAME', 'name'],
+    'spec': ['G_MODEL', 'spec'],
+    'unit': ['G_UNIT', 'unit'],
+    'qty': ['G_QTY', 'qty'],
+    'unit_price': ['DECL_PRICE', 'unit_price'],
+    'amount': ['DECL_TOTAL', 'amount'],
+    'currency': ['TRADE_CURR', 'item_currency'],
+    'origin_country': ['ORIGIN_COUNTRY', 'origin_country'],
+    'tax_rate': ['DUTY_RATE', 'tax_rate'],
+    'tariff': ['REAL_DUTY', 'tariff'],
+    'excise': ['REAL_REG', 'excise'],
+    'vat': ['REAL_TAX', 'vat'],
+}
+
+HEADER_SQL = (
+    "INSERT INTO customs_headers (id, declaration_no, enterprise, consignor, consignee, port_code, trade_mode, currency, total_value, "
+    "gross_weight, net_weight, packages, country_origin, country_dest, status, declare_date, order_id, updated_at, has_bad_hs) "
+    "VALUES (:id, :declaration_no, :enterprise, :consignor, :consignee, :port_code, :trade_mode, :currency, :total_value, "
+    ":gross_weight, :net_weight, :packages, :country_origin, :country_dest, :status, :declare_date, :order_id, :updated_at, NULL) "
+    "ON CONFLICT(id) DO UPDATE SET declaration_no=excluded.declaration_no, enterprise=excluded.enterprise, consignor=excluded.consignor, "
+    "consignee=excluded.consignee, port_code=excluded.port_code, trade_mode=excluded.trade_mode, "
+    "currency=COALESCE(excluded.currency, customs_headers.currency), total_value=excluded.total_value, "
+    "gross_weight=excluded.gross_weight, net_weight=excluded.net_weight, packages=excluded.packages, "
+    "country_origin=excluded.country_origin, country_dest=excluded.country_dest, status=excluded.status, "
+    "declare_date=excluded.declare_date, order_id=COALESCE(excluded.order_id, customs_headers.order_id), "
+    "updated_at=excluded.updated_at, has_bad_hs=NULL"
+)
+ITEM_SQL = (
+    "INSERT INTO customs_items (id, header_id, line_no, hs_code, name, spec, unit, qty, unit_price, amount, origin_country, "
+    "tax_rate, tariff, excise, vat, hs_digits, hs_chapter, hs_heading) "
+    "VALUES (:id, :header_id, :line_no, :hs_code, :name, :spec, :unit, :qty, :unit_price, :amount, :origin_country, "
+    ":tax_rate, :tariff, :excise, :vat, :hs_digits, :hs_chapter, :hs_heading) "
+    "ON CONFLICT(id) DO UPDATE SET header_id=excluded.header_id, line_no=excluded.line_no, hs_code=excluded.hs_code, "
+    "name=excluded.name, spec=excluded.spec, unit=excluded.unit, qty=excluded.qty, unit_price=excluded.unit_price, "
+    "amount=excluded.amount, origin_country=excluded.origin_country, tax_rate=excluded.tax_rate, tariff=excluded.tariff, "
+    "excise=excluded.excise, vat=excluded.vat, hs_digits=excluded.hs_digits, hs_chapter=excluded.hs_chapter, "
+    "hs_heading=excluded.hs_heading"
+)
+# 明细写入后让所属报关单的质量标记重新计算，并刷新 updated_at 供增量质量扫描识别
+RESET_FLAGS_SQL = "UPDATE customs_headers SET has_bad_hs = NULL, updated_at = :updated_at WHERE id = :header_id"
+# 源数据没有报关单总价时按明细金额汇总
+ROLLUP_SQL = (
+    "UPDATE customs_headers SET total_value = (SELECT COALESCE(SUM(amount), 0) FROM customs_items WHERE header_id = :id), "
+    "currency = COALESCE(currency, :currency) WHERE id = :id"
+)
+
+
+class RowError(ValueError):
+    pass
+
+
+def _code(v):
+    """
+    单元格值转为编码字符串。Excel 会把长数字编码存成浮点数（如 2.90920211000002e+17），
+    按单元格中写的十进制文本还原，不经 int(float) 引入二进制舍入的尾数
+    """
+    if v is None:
+        return None
+    if isinstance(v, float):
+        if v != v:
+            return None
+        d = Decimal(repr(v))
+        if d == d.to_integral_value():
+            return str(d.quantize(Decimal(1)))
+        return repr(v)
+    s = str(v).strip()
+    return s or None
+
+
+def _num(v, cast=float):
+    if v is None or v == '':
+        return None
+    return cast(float(v))
+
+
+def _date(v):
+    if v is None or v == '':
+        return None
+    if isinstance(v, datetime):
+        return v.date().isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, (int, float)):
+        # Excel 日期序列号
+        return (datetime(1899, 12, 30) + timedelta(days=float(v))).date().isoformat()
+    return datetime.strptime(str(v).strip()[:10], '%Y-%m-%d').date().isoformat()
+
+
+def _pick(row, names):
+    for n in names:
+        if n in row and row[n] not in (None, ''):
+            return row[n]
+    return None
+
+
+def map_header(row, now):
+    hid = _code(_pick(row, HEADER_FIELDS['id']))
+    if not hid:
+        raise RowError('缺少报关单编号')
+    owner = _pick(row, HEADER_FIELDS['owner'])
+    ie = _code(_pick(row, HEADER_FIELDS['ie_flag']))
+    trade_mode = _code(_pick(row, HEADER_FIELDS['trade_mode']))
+    if trade_mode and trade_mode.isdigit():
+        trade_mode = trade_mode.zfill(4)
+    currency = _code(_pick(row, HEADER_FIELDS['currency']))
+    return {
+        'id': hid,
+        'declaration_no': _code(_pick(row, HEADER_FIELDS['declaration_no'])) or hid,
+        'enterprise': _pick(row, HEADER_FIELDS['enterprise']),
+        'consignor': _pick(row, HEADER_FIELDS['consignor']) or (owner if ie == 'E' else None),
+        'consignee': _pick(row, HEADER_FIELDS['consignee']) or (owner if ie == 'I' else None),
+        'port_code': _code(_pick(row, HEADER_FIELDS['port_code'])),
+        'trade_mode': trade_mode,
+        'currency': CURRENCY_CODES.get(currency, currency),
+        'total_value': _num(_pick(row, HEADER_FIELDS['total_value'])),
+        'gross_weight': _num(_pick(row, HEADER_FIELDS['gross_weight'])) or 0.0,
+        'net_weight': _num(_pick(row, HEADER_FIELDS['net_weight'])) or 0.0,
+        'packages': _num(_pick(row, HEADER_FIELDS['packages']), int) or 0,
+        'country_origin': _code(_pick(row, HEADER_FIELDS['country_origin'])),
+        'country_dest': _code(_pick(row, HEADER_FIELDS['country_dest'])),
+        'status': _pick(row, HEADER_FIELDS['status']) or 'declared',
+        'declare_date': _date(_pick(row, HEADER_FIELDS['declare_date'])),
+        'order_id': _pick(row, HEADER_FIELDS['order_id']),
+        'updated_at': now,
+    }
+
+
+def map_item(row):
+    header_id = _code(_pick(row, ITEM_FIELDS['header_id']))
+    if not header_id:
+        raise RowError('缺少所属报关单编号')
+    hs_code = _code(_pick(row, ITEM_FIELDS['hs_code']))
+    if not hs_code:
+        raise RowError('缺少HS编码')
+    line_no = _num(_pick(row, ITEM_FIELDS['line_no']), int)
+    if line_no is None:
+        raise RowError('缺少项号')
+    qty = _num(_pick(row, ITEM_FIELDS['qty'])) or 0.0
+    unit_price = _num(_pick(row, ITEM_FIELDS['unit_price'])) or 0.0
+    amount = _num(_pick(row, ITEM_FIELDS['amount']))
+    digits, chapter, heading = normalize_hs(hs_code)
+    currency = _code(_pick(row, ITEM_FIELDS['currency']))
+    return {
+        'id': _code(_pick(row, ITEM_FIELDS['id'])) or f'{header_id}-{line_no}',
+        'header_id': header_id,
+        'line_no': line_no,
+        'hs_code': hs_code,
+        'name': _pick(row, ITEM_FIELDS['name']),
+        'spec': _pick(row, ITEM_FIELDS['spec']),
+        'unit': _code(_pick(row, ITEM_FIELDS['unit'])),
+        'qty': qty,
+        'unit_price': unit_price,
+        'amount': amount if amount is not None else round(qty * unit_price, 2),
+        'origin_country': _code(_pick(row, ITEM_FIELDS['origin_country'])),
+        'tax_rate': _num(_pick(row, ITEM_FIELDS['tax_rate'])) or 0.0,
+        'tariff': _num(_pick(row, ITEM_FIELDS['tariff'])) or 0.0,
+        'excise': _num(_pick(row, ITEM_FIELDS['excise'])) or 0.0,
+        'vat': _num(_pick(row, ITEM_FIELDS['vat'])) or 0.0,
+        'hs_digits': digits,
+        'hs_chapter': chapter,
+        'hs_heading': heading,
+        '_currency': CURRENCY_CODES.get(currency, currency),
+    }
+
+
+def _iter_sheet(ws):
+    rows = ws.iter_rows(values_only=True)
+    names = None
+    for idx, values in enumerate(rows, start=1):
+        if names is None:
+            names = [str(v).strip() if v is not None else '' for v in values]
+            continue
+        if not any(v not in (None, '') for v in values):
+            continue
+        yield idx, dict(zip(names, values))
+
+
+def iter_workbook(path):
+    """流式读取报关单工作簿：先表头 sheet，再表体 sheet，产出 (kind, sheet, row_no, row)"""
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+    try:
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ValueError(f'无法解析工作簿: {e}') from e
+    try:
+        sheets = wb.worksheets
+        header_ws = wb['表头'] if '表头' in wb.sheetnames else sheets[0]
+        item_ws = wb['表体'] if '表体' in wb.sheetnames else (sheets[1] if len(sheets) > 1 else None)
+        for idx, row in _iter_sheet(header_ws):
+            yield 'header', header_ws.title, idx, row
+        if item_ws is not None:
+            for idx, row in _iter_sheet(item_ws):
+                yield 'item', item_ws.title, idx, row
+    finally:
+        wb.close()
+
+
+def iter_csv(fp):
+    """CSV 每行为一条明细，附带所属报关单的表头字段；表头按首次出现的行写入"""
+    reader = csv.DictReader(fp)
+    seen = set()
+    for idx, row in enumerate(reader, start=2):
+        hid = _code(_pick(row, HEADER_FIELDS['id']))
+        if hid and hid not in seen:
+            seen.add(hid)
+            yield 'header', 'csv', idx, row
+        yield 'item', 'csv', idx, row
+
+
+def _headers_hook(conn, rows):
+    """写入前读取旧值，更新分面计数、企业汇总与口岸拥堵；order_id 与 HEADER_SQL 一样，为空时沿用旧值"""
+    old = fetch_by_ids(conn, 'customs_headers', ('enterprise', 'status', 'order_id', 'port_code', 'trade_mode'), [r['id'] for r in rows])
+    new = {r['id']: {**r, 'order_id': r['order_id'] if r['order_id'] is not None else old.get(r['id'], {}).get('order_id')} for r in rows}
+    customs_facets.on_headers_written(conn, old, new)
+    on_headers_written(conn, old, new)
+    port_congestion.on_headers_written(conn, old, new)
+
+
+def import_rows(engine, rows):
+    """
+    将 (kind, sheet, row_no, row) 流分块写入 customs_headers / customs_items。
+    单行校验失败只记录错误，不中断整批导入。
+    """
+    now = datetime.utcnow().isoformat()
+    result = {'headers': 0, 'items': 0, 'errors': [], 'errorCount': 0}
+    headers, items = [], []
+    rollup = {}
+    imported, failed = set(), set()  # 本次导入中写入 / 校验失败的报关单编号
+    pending = 0
+    conn = engine.connect()
+    trans = conn.begin()
+
+    def report(sheet, idx, e):
+        result['errorCount'] += 1
+        if len(result['errors']) < MAX_ERRORS:
+            result['errors'].append({'sheet': sheet, 'row': idx, 'error': str(e)})
+
+    def flush():
+        nonlocal pending, trans
+        if headers:
+            _headers_hook(conn, headers)
+            conn.exec_driver_sql(HEADER_SQL, headers)
+            result['headers'] += len(headers)
+        # 明细只写入所属报关单本次导入成功或库中已有的行；报关单校验失败或不存在时记为错误
+        unknown = {it['header_id'] for it in items if it['header_id'] not in imported and it['header_id'] not in failed}
+        existing = fetch_by_ids(conn, 'customs_headers', ('id',), unknown) if unknown else {}
+        kept = []
+        for it in items:
+            hid = it['header_id']
+            if hid in failed:
+                report(it['_sheet'], it['_row'], RowError(f'所属报关单校验失败: {hid}'))
+            elif hid in imported or hid in existing:
+                kept.append(it)
+            else:
+                report(it['_sheet'], it['_row'], RowError(f'所属报关单不存在: {hid}'))
+        items[:] = kept
+        if items:
+            # 明细可能改挂到别的报关单，前后都要覆盖新旧两侧的报关单
+            moved = fetch_by_ids(conn, 'customs_items', ('header_id',), {it['id'] for it in items})
+            touched = {it['header_id'] for it in items} | {r['header_id'] for r in moved.values()}
+            before = customs_facets.item_chapters(conn, touched)
+            conn.exec_driver_sql(ITEM_SQL, items)
+            customs_facets.on_item_chapters_changed(conn, before, customs_facets.item_chapters(conn, touched))
+            conn.exec_driver_sql(RESET_FLAGS_SQL, [{'header_id': h, 'updated_at': now} for h in {it['header_id'] for it in items}])
+            result['items'] += len(items)
+        pending += len(headers) + len(items)
+        headers.clear()
+        items.clear()
+        if pending >= COMMIT_EVERY:
+            trans.commit()
+            trans = conn.begin()
+            pending = 0
+
+    try:
+        for kind, sheet, idx, row in rows:
+            try:
+                if kind == 'header':
+                    try:
+                        h = map_header(row, now)
+                    except (ValueError, TypeError):
+                        hid = _code(_pick(row, HEADER_FIELDS['id']))
+                        if hid and hid not in imported:
+                            failed.add(hid)
+                        raise
+                    if h['id'] in imported:
+                        raise RowError(f"报关单编号重复: {h['id']}（数值格式的编号可能已丢失精度，请将编号列设为文本）")
+                    imported.add(h['id'])
+                    if h['total_value'] is None:
+                        h['total_value'] = 0.0
+                        rollup.setdefault(h['id'], None)
+                    headers.append(h)
+                else:
+                    it = map_item(row)
+                    it['_sheet'], it['_row'] = sheet, idx
+                    if it['header_id'] in rollup and rollup[it['header_id']] is None:
+                        rollup[it['header_id']] = it['_currency']
+                    items.append(it)
+            except (ValueError, TypeError) as e:
+                report(sheet, idx, e)
+            if len(headers) + len(items) >= CHUNK_SIZE:
+                flush()
+        flush()
+        if rollup:
+            params = [{'id': k, 'currency': v} for k, v in rollup.items()]
+            for i in range(0, len(params), CHUNK_SIZE):
+                conn.exec_driver_sql(ROLLUP_SQL, params[i:i + CHUNK_SIZE])
+        backfill_customs_index(conn)
+        trans.commit()
+    except Exception:
+        trans.rollback()
+        raise
+    finally:
+        conn.close()
+        customs_header_counts.clear()
+    return result
+
+
+def import_file(engine, path, format: str = ''):
+    fmt = (format or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt in ('xlsx', 'xlsm'):
+        return import_rows(engine, iter_workbook(path))
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as fp:
+            return import_rows(engine, iter_csv(fp))
+    raise ValueError(f'不支持的文件格式: {fmt}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('用法: python -m backend_py.services.customs_import <文件.xlsx|文件.csv>')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    res = import_file(engine, sys.argv[1])
+    print(f"报关单 {res['headers']} 条，明细 {res['items']} 条，错误 {res['errorCount']} 条")
+    for err in res['errors'][:20]:
+        print(f"  [{err['sheet']}] 第 {err['row']} 行: {err['error']}")
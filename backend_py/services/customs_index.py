@@ -0,0 +1,60 @@
+from sqlalchemy import case, exists, text
+from sqlalchemy.orm import Session
+from backend_py.models.customs import CustomsHeader, CustomsItem
+
+
+# 明细级质量条件，报关单标记与质量扫描（customs_quality.RULES）共用同一口径；{i} 为明细表别名。
+# 没有 HS 编码的明细不计入 bad_hs，与原有的 onlyBadHs 筛选一致
+ITEM_CHECKS = {
+    'bad_hs': "length({i}.hs_digits) < 8",
+    'missing_unit': "{i}.unit IS NULL OR {i}.unit = ''",
+    'abnormal_qty': "{i}.qty IS NULL OR {i}.qty <= 0",
+}
+
+
+def normalize_hs(hs_code):
+    """返回 (hs_digits, hs_chapter, hs_heading)，与 SQL 中 replace(hs_code, '.', '') 的口径一致"""
+    if hs_code is None:
+        return None, None, None
+    digits = str(hs_code).replace('.', '')
+    return digits, digits[:2], digits[:4]
+
+
+def apply_hs_columns(item: CustomsItem):
+    item.hs_digits, item.hs_chapter, item.hs_heading = normalize_hs(item.hs_code)
+
+
+def _flag(check):
+    cond = text('(' + ITEM_CHECKS[check].format(i='customs_items') + ')')
+    return case((exists().where(CustomsItem.header_id == CustomsHeader.id).where(cond), 1), else_=0)
+
+
+def refresh_header_flags(db: Session, header_ids):
+    """按明细重新计算指定报关单的质量标记，不提交事务"""
+    ids = [h for h in set(header_ids) if h]
+    if not ids:
+        return
+    db.flush()
+    db.query(CustomsHeader).filter(CustomsHeader.id.in_(ids)).update({
+        CustomsHeader.has_bad_hs: _flag('bad_hs'),
+        CustomsHeader.has_missing_unit: _flag('missing_unit'),
+        CustomsHeader.has_abnormal_qty: _flag('abnormal_qty'),
+    }, synchronize_session=False)
+
+
+def backfill_customs_index(conn):
+    """
+    一次性回填：为旧数据补齐 HS 规范化列与报关单质量标记。
+    只处理尚未计算的行（hs_digits / has_bad_hs 为 NULL），重复执行代价很小。
+    """
+    conn.execute(text(
+        "UPDATE customs_items SET hs_digits = replace(hs_code, '.', ''), "
+        "hs_chapter = substr(replace(hs_code, '.', ''), 1, 2), "
+        "hs_heading = substr(replace(hs_code, '.', ''), 1, 4) "
+        "WHERE hs_digits IS NULL AND hs_code IS NOT NULL"
+    ))
+    flags = ', '.join(
+        f"has_{check} = EXISTS (SELECT 1 FROM customs_items i WHERE i.header_id = customs_headers.id AND ({cond.format(i='i')}))"
+        for check, cond in ITEM_CHECKS.items()
+    )
+    conn.execute(text(f"UPDATE customs_headers SET {flags} WHERE has_bad_hs IS NULL"))
@@ -0,0 +1,93 @@
+import json
+import sys
+import uuid
+from datetime import datetime
+from backend_py.services.customs_index import ITEM_CHECKS
+
+JOB_TYPE = 'customs_quality_scan'
+# 每批处理的报关单数量；每批单独提交，扫描期间不长时间持有写锁
+CHUNK_SIZE = 5000
+
+# (规则, 提示, 明细级条件)；i = customs_items, h = customs_headers, o = orders
+RULES = [
+    ('bad_hs', 'HS编码不完整', ITEM_CHECKS['bad_hs'].format(i='i')),
+    ('missing_unit', '缺少计量单位', ITEM_CHECKS['missing_unit'].format(i='i')),
+    ('abnormal_qty', '数量异常', ITEM_CHECKS['abnormal_qty'].format(i='i')),
+    ('missing_origin', '电子产品缺少原产国', "lower(o.category) = 'electronics' AND (i.origin_country IS NULL OR i.origin_country = '')"),
+    ('missing_spec', '纺织品缺少规格', "lower(o.category) = 'textile' AND (i.spec IS NULL OR i.spec = '')"),
+]
+
+_INSERT_SQL = (
+    "INSERT INTO customs_findings (rule, header_id, item_id, order_id, message, detected_at) "
+    "SELECT ?, i.header_id, i.id, h.order_id, ?, ? FROM quality_scope s "
+    "JOIN customs_items i ON i.header_id = s.header_id "
+    "JOIN customs_headers h ON h.id = i.header_id "
+    "LEFT JOIN orders o ON o.id = h.order_id "
+    "WHERE {cond}"
+)
+
+
+def last_watermark(conn):
+    return conn.exec_driver_sql(
+        "SELECT MAX(json_extract(payload, '$.watermark')) FROM jobs WHERE type = ? AND status = 'completed'", (JOB_TYPE,)
+    ).scalar()
+
+
+def _scan_chunk(conn, header_ids, now):
+    conn.exec_driver_sql("DELETE FROM quality_scope")
+    conn.exec_driver_sql("INSERT INTO quality_scope (header_id) VALUES (?)", [(h,) for h in header_ids])
+    conn.exec_driver_sql("DELETE FROM customs_findings WHERE header_id IN (SELECT header_id FROM quality_scope)")
+    found = 0
+    for rule, message, cond in RULES:
+        found += conn.exec_driver_sql(_INSERT_SQL.format(cond=cond), (rule, message, now)).rowcount
+    return found
+
+
+def scan_findings(engine, full: bool = False):
+    """
+    按规则集扫描报关单明细并写入 customs_findings。
+    默认只重算上次扫描以来 updated_at 有变化的报关单；首次运行或 full=True 时全量重建。
+    每次运行记录为一条 jobs 记录（type=customs_quality_scan），其 watermark 作为下次增量的起点。
+    """
+    watermark = datetime.utcnow().isoformat()
+    stats = {'full': full, 'headers': 0, 'findings': 0}
+    with engine.connect() as conn:
+        since = None if full else last_watermark(conn)
+        stats['full'] = since is None
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS quality_scope (header_id TEXT PRIMARY KEY)")
+        if since is None:
+            conn.exec_driver_sql("DELETE FROM customs_findings")
+            conn.commit()
+        last = ''
+        while True:
+            if since is None:
+                rows = conn.exec_driver_sql(
+                    "SELECT id FROM customs_headers WHERE id > ? ORDER BY id LIMIT ?", (last, CHUNK_SIZE)).all()
+            else:
+                rows = conn.exec_driver_sql(
+                    "SELECT id FROM customs_headers WHERE updated_at > ? AND id > ? ORDER BY id LIMIT ?", (since, last, CHUNK_SIZE)).all()
+            if not rows:
+                break
+            ids = [r[0] for r in rows]
+            stats['findings'] += _scan_chunk(conn, ids, watermark)
+            stats['headers'] += len(ids)
+            conn.commit()
+            last = ids[-1]
+        conn.exec_driver_sql("DELETE FROM quality_scope")
+        conn.exec_driver_sql(
+            "INSERT INTO jobs (id, type, payload, status) VALUES (?, ?, ?, 'completed')",
+            (str(uuid.uuid4()), JOB_TYPE, json.dumps({'since': since, 'watermark': watermark, **stats})),
+        )
+        conn.commit()
+    stats['since'] = since
+    stats['watermark'] = watermark
+    return stats
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ['scan']:
+        print('用法: python -m backend_py.services.customs_quality scan [--full]')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    print(scan_findings(engine, full='--full' in sys.argv[2:]))
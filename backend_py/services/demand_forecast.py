@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import text
+from backend_py.services.inventory_snapshots import history_cache
+
+# 平滑系数沿用算法库中 DemandForecaster 的默认值；日序列按周季节性处理
+ALPHA, BETA, GAMMA = 0.4, 0.2, 0.3
+SEASON = 7
+# 取快照时 IN 列表的长度
+LOOKUP_SIZE = 500
+
+
+def holt_winters(Y, horizon, season=SEASON, alpha=ALPHA, beta=BETA, gamma=GAMMA):
+    """
+    加法 Holt-Winters：Y 为 (产品数, 天数) 矩阵，每个时间步对全部产品做一次数组运算。
+    历史不足两个季节周期时退化为 Holt 线性趋势。返回 (预测矩阵 (产品数, horizon), 一步预测残差的 RMSE)。
+    """
+    n, t_len = Y.shape
+    m = season if season > 1 and t_len >= 2 * season else 0
+    if m:
+        level = Y[:, :m].mean(axis=1)
+        trend = (Y[:, m:2 * m].mean(axis=1) - level) / m
+        S = Y[:, :m] - level[:, None]
+    else:
+        level = Y[:, 0].copy()
+        trend = (Y[:, -1] - Y[:, 0]) / t_len
+        S = np.zeros((n, 1))
+    sq_err = np.zeros(n)
+    for t in range(t_len):
+        y = Y[:, t]
+        k = t % m if m else 0
+        s = S[:, k]
+        sq_err += (y - (level + trend + s)) ** 2
+        prev = level
+        level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev) + (1 - beta) * trend
+        if m:
+            S[:, k] = gamma * (y - level) + (1 - gamma) * s
+    steps = np.arange(1, horizon + 1)
+    fc = level[:, None] + trend[:, None] * steps
+    if m:
+        fc += S[:, (t_len + steps - 1) % m]
+    return np.clip(fc, 0, None), np.sqrt(sq_err / t_len)
+
+
+def _fill(Y):
+    """沿时间轴前向填充缺失日；首个快照之前的日子用首个观测值回填。全缺失的行保持 NaN"""
+    mask = ~np.isnan(Y)
+    idx = np.where(mask, np.arange(Y.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    Y = Y[np.arange(Y.shape[0])[:, None], idx]
+    first = mask.argmax(axis=1)
+    lead = ~np.logical_or.accumulate(mask, axis=1)
+    return np.where(lead, Y[np.arange(Y.shape[0]), first][:, None], Y)
+
+
+def _load_history(conn, names, start, days):
+    """读取产品列表与窗口内的销量日序列，返回 (产品行, 前向填充后的 (产品数, days) 矩阵, 各产品快照点数)"""
+    # 每个产品的窗口内快照在库内拼成 "日序号,销量,..." 一行返回，避免逐行构造 Python 对象；
+    # 窗口两端都要限定，晚于今天的快照（跨 UTC 零点写入或手工导入）不计入
+    series_sql = (
+        "SELECT name, group_concat(CAST(julianday(day) - julianday(:start) AS INTEGER) || ',' || COALESCE(sales, 0)) "
+        "FROM inventory_snapshots WHERE day >= :start AND day < :end {cond} GROUP BY name"
+    )
+    window = {'start': start.isoformat(), 'end': (start + timedelta(days=days)).isoformat()}
+    if names:
+        inv, series = [], []
+        for i in range(0, len(names), LOOKUP_SIZE):
+            chunk = names[i:i + LOOKUP_SIZE]
+            marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+            params = {f'p{n}': v for n, v in enumerate(chunk)}
+            inv += conn.execute(text(f"SELECT name, current, sales FROM inventory WHERE name IN ({marks})"), params).all()
+            series += conn.execute(text(series_sql.format(cond=f'AND name IN ({marks})')), {**params, **window}).all()
+    else:
+        inv = conn.execute(text("SELECT name, current, sales FROM inventory")).all()
+        series = conn.execute(text(series_sql.format(cond='')), window).all()
+
+    index = {r[0]: i for i, r in enumerate(inv)}
+    Y = np.full((len(inv), days), np.nan)
+    observed = np.zeros(len(inv), dtype=int)
+    series = [r for r in series if r[0] in index]  # 已删除产品的历史快照忽略
+    if series:
+        pairs = np.array(','.join(r[1] for r in series).split(','), dtype=float).reshape(-1, 2)
+        counts = np.array([r[1].count(',') // 2 + 1 for r in series])
+        rows = np.repeat([index[r[0]] for r in series], counts)
+        Y[rows, pairs[:, 0].astype(int)] = pairs[:, 1]
+        observed[[index[r[0]] for r in series]] = counts
+    return inv, _fill(Y), observed
+
+
+def forecast_demand(conn, names=None, days=90, horizon=7, season=SEASON, alpha=ALPHA, beta=BETA, gamma=GAMMA):
+    """
+    用最近 days 天的 inventory_snapshots.sales 日序列为产品预测未来 horizon 天的需求。
+    names 为空时预测全部产品；没有任何快照的产品按当前 sales 水平外推。
+    """
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+    dates = [(today + timedelta(days=h)).isoformat() for h in range(1, horizon + 1)]
+    key = (start.isoformat(), days)
+    hit = None if names else history_cache.get(key)
+    inv, Y, observed = hit if hit else _load_history(conn, names, start, days)
+    if not names and not hit:
+        history_cache.set(key, (inv, Y, observed))
+    if not inv:
+        return {'horizon': horizon, 'season': season, 'historyDays': days, 'dates': dates, 'items': []}
+    current = np.array([r[1] or 0 for r in inv], dtype=float)
+    sales = np.array([r[2] or 0 for r in inv], dtype=float)
+    Y = Y.copy()
+    empty = np.isnan(Y[:, 0])
+    Y[empty] = sales[empty, None]
+
+    fc, rmse = holt_winters(Y, horizon, season, alpha, beta, gamma)
+    total = fc.sum(axis=1)
+    daily = total / horizon
+    cover = np.divide(current, daily, out=np.full(len(inv), np.nan), where=daily > 0)
+    items = [{
+        'name': inv[i][0],
+        'current': int(current[i]),
+        'historyPoints': int(observed[i]),
+        'forecast': np.round(fc[i], 2).tolist(),
+        'total': round(float(total[i]), 2),
+        'rmse': round(float(rmse[i]), 2),
+        'coverDays': None if np.isnan(cover[i]) else round(float(cover[i]), 1),
+    } for i in range(len(inv))]
+    return {'horizon': horizon, 'season': season, 'historyDays': days, 'dates': dates, 'items': items}
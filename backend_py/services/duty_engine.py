@@ -0,0 +1,153 @@
+import sys
+import numpy as np
+from sqlalchemy import select
+from backend_py.models.customs import CustomsItem, HsTaxRate
+
+# 未命中税率表时的增值税率；关税率沿用明细原有 tax_rate，消费税为 0
+DEFAULT_VAT_RATE = 0.13
+# 每次从游标取出并向量化计算的明细行数
+CHUNK_SIZE = 200000
+# 金额比较容差（分）
+EPS = 0.005
+
+_ITEM_COLS = [CustomsItem.id, CustomsItem.header_id, CustomsItem.hs_digits, CustomsItem.qty, CustomsItem.unit_price,
+              CustomsItem.amount, CustomsItem.tax_rate, CustomsItem.tariff, CustomsItem.excise, CustomsItem.vat]
+
+_TMP_DDL = [
+    "CREATE TEMP TABLE IF NOT EXISTS duty_results (id TEXT PRIMARY KEY, amount REAL, tax_rate REAL, tariff REAL, excise REAL, vat REAL)",
+    "CREATE TEMP TABLE IF NOT EXISTS duty_scope (header_id TEXT PRIMARY KEY)",
+    "DELETE FROM duty_results",
+    "DELETE FROM duty_scope",
+]
+# 计算结果暂存到临时表后一条 UPDATE ... FROM 回写（SQLite >= 3.33）
+UPDATE_ITEMS_SQL = (
+    "UPDATE customs_items SET amount = r.amount, tax_rate = r.tax_rate, tariff = r.tariff, excise = r.excise, vat = r.vat "
+    "FROM duty_results r WHERE customs_items.id = r.id"
+)
+ROLLUP_SQL = (
+    "UPDATE customs_headers SET total_value = t.total FROM ("
+    "SELECT header_id, ROUND(SUM(amount), 2) AS total FROM customs_items "
+    "WHERE header_id IN (SELECT header_id FROM duty_scope) GROUP BY header_id) t "
+    "WHERE customs_headers.id = t.header_id AND customs_headers.total_value IS NOT t.total"
+)
+
+
+class RateTable:
+    """按前缀长度分组的有序前缀数组，支持对整列 HS 编码做向量化最长前缀匹配"""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.rates = np.array([[r.tariff_rate or 0.0, r.excise_rate or 0.0,
+                                DEFAULT_VAT_RATE if r.vat_rate is None else r.vat_rate] for r in rows], dtype=float).reshape(-1, 3)
+        self.default = None
+        self.levels = []
+        by_len = {}
+        for i, r in enumerate(rows):
+            p = (r.hs_prefix or '').replace('.', '')
+            if not p:
+                self.default = i
+            else:
+                by_len.setdefault(len(p), []).append((p, i))
+        for n in sorted(by_len, reverse=True):
+            pairs = sorted(by_len[n])
+            self.levels.append((n, np.array([p for p, _ in pairs], dtype=f'<U{n}'), np.array([i for _, i in pairs], dtype=np.int64)))
+
+    def lookup(self, codes):
+        """返回每个编码命中的税率行下标，未命中为 -1（或空前缀兜底行）"""
+        idx = np.full(len(codes), -1 if self.default is None else self.default, dtype=np.int64)
+        pending = np.ones(len(codes), dtype=bool)
+        for n, keys, rows in self.levels:
+            head = codes.astype(f'<U{n}')
+            pos = np.minimum(np.searchsorted(keys, head), len(keys) - 1)
+            hit = pending & (keys[pos] == head)
+            idx[hit] = rows[pos[hit]]
+            pending &= ~hit
+        return idx
+
+
+def load_rates(conn):
+    return RateTable(conn.execute(select(HsTaxRate)).all())
+
+
+def compute(rates: RateTable, hs, qty, unit_price, amount, tax_rate):
+    """
+    向量化计算一批明细的税费：
+    完税价格 = 数量 × 单价（缺失时沿用原金额），关税 = 完税价格 × 关税率，
+    消费税按组成计税价格 (完税价格 + 关税) / (1 - 消费税率) 从价计征，增值税 = (完税价格 + 关税 + 消费税) × 增值税率。
+    """
+    idx = rates.lookup(hs)
+    hit = idx >= 0
+    safe = np.where(hit, idx, 0)
+    table = rates.rates if len(rates.rates) else np.zeros((1, 3))
+    t_rate = np.where(hit, table[safe, 0], tax_rate)
+    e_rate = np.where(hit, table[safe, 1], 0.0)
+    v_rate = np.where(hit, table[safe, 2], DEFAULT_VAT_RATE)
+    value = np.where((qty > 0) & (unit_price > 0), np.round(qty * unit_price, 2), amount)
+    tariff = np.round(value * t_rate, 2)
+    excise = np.round((value + tariff) * e_rate / (1.0 - e_rate), 2)
+    vat = np.round((value + tariff + excise) * v_rate, 2)
+    return value, t_rate, tariff, excise, vat, hit
+
+
+def _statements(header_ids, where):
+    base = select(*_ITEM_COLS)
+    if header_ids is not None:
+        ids = list(dict.fromkeys(header_ids))
+        return [base.where(CustomsItem.header_id.in_(ids[i:i + 500])) for i in range(0, len(ids), 500)]
+    if where is not None:
+        return [base.where(CustomsItem.header_id.in_(where))]
+    return [base]
+
+
+def recompute_duties(conn, header_ids=None, where=None):
+    """
+    重算报关单明细的金额与税费并回写，随后汇总报关单 total_value。
+    范围：header_ids 为报关单 id 列表，where 为返回报关单 id 的 select，均为空时为全库。不提交事务。
+    """
+    rates = load_rates(conn)
+    for stmt in _TMP_DDL:
+        conn.exec_driver_sql(stmt)
+    stats = {'items': 0, 'matched': 0, 'updated': 0, 'headers': 0}
+    for stmt in _statements(header_ids, where):
+        result = conn.execute(stmt)
+        while True:
+            rows = result.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            ids, hids, hs, *nums = zip(*rows)
+            qty, unit_price, amount, tax_rate, tariff, excise, vat = (np.nan_to_num(np.array(c, dtype=float)) for c in nums)
+            codes = np.array([h or '' for h in hs], dtype=str)
+            n_value, n_rate, n_tariff, n_excise, n_vat, hit = compute(rates, codes, qty, unit_price, amount, tax_rate)
+            changed = ((np.abs(n_value - amount) > EPS) | (np.abs(n_rate - tax_rate) > 1e-9) | (np.abs(n_tariff - tariff) > EPS)
+                       | (np.abs(n_excise - excise) > EPS) | (np.abs(n_vat - vat) > EPS))
+            sel = np.flatnonzero(changed)
+            if len(sel):
+                ids_arr = np.array(ids, dtype=object)
+                conn.exec_driver_sql(
+                    "INSERT OR REPLACE INTO duty_results (id, amount, tax_rate, tariff, excise, vat) VALUES (?, ?, ?, ?, ?, ?)",
+                    list(zip(ids_arr[sel].tolist(), n_value[sel].tolist(), n_rate[sel].tolist(), n_tariff[sel].tolist(),
+                             n_excise[sel].tolist(), n_vat[sel].tolist())),
+                )
+            conn.exec_driver_sql("INSERT OR IGNORE INTO duty_scope (header_id) VALUES (?)", [(h,) for h in set(hids)])
+            stats['items'] += len(rows)
+            stats['matched'] += int(hit.sum())
+            stats['updated'] += len(sel)
+    stats['headers'] = conn.exec_driver_sql("SELECT COUNT(*) FROM duty_scope").scalar()
+    if stats['updated']:
+        conn.exec_driver_sql(UPDATE_ITEMS_SQL)
+    conn.exec_driver_sql(ROLLUP_SQL)
+    conn.exec_driver_sql("DELETE FROM duty_results")
+    conn.exec_driver_sql("DELETE FROM duty_scope")
+    return stats
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ['recompute']:
+        print('用法: python -m backend_py.services.duty_engine recompute [orderId]')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    from backend_py.models.customs import CustomsHeader
+    init_db()
+    scope = select(CustomsHeader.id).where(CustomsHeader.order_id == sys.argv[2]) if len(sys.argv) > 2 else None
+    with engine.begin() as conn:
+        print(recompute_duties(conn, where=scope))
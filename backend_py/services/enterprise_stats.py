@@ -0,0 +1,211 @@
+import json
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import Float, cast, func, text
+from sqlalchemy.dialects.sqlite import insert
+from backend_py.models.enterprises import EnterpriseStats
+from backend_py.services.bulk_upsert import fetch_by_ids
+from backend_py.services.fx import cny_sql, to_cny
+from backend_py.services.kpi_rollup import INACTIVE_ORDER_STATUSES, add_counters, gmv_key
+
+JOB_TYPE = 'enterprise_stats_rebuild'
+CLEARED_STATUSES = ('cleared', 'released')
+COUNTERS = ('orders_total', 'active_orders', 'gmv_cny', 'settled_orders', 'declarations', 'cleared_declarations')
+# 取旧值时 IN 列表的长度
+LOOKUP_SIZE = 500
+
+_inactive = ', '.join(f"'{s}'" for s in INACTIVE_ORDER_STATUSES)
+_cleared = ', '.join(f"'{s}'" for s in CLEARED_STATUSES)
+_SELECT_SQL = (
+    "SELECT enterprise, SUM(o_total), SUM(o_active), SUM(gmv), SUM(settled), SUM(decl), SUM(cleared), "
+    "CAST(SUM(cleared) AS REAL) / NULLIF(SUM(decl), 0), :now FROM ("
+    f"SELECT enterprise, COUNT(*) AS o_total, COALESCE(SUM(status NOT IN ({_inactive})), 0) AS o_active, "
+    f"SUM({cny_sql('orders.amount', 'orders.currency', 'orders.created_at')}) AS gmv, 0 AS settled, 0 AS decl, 0 AS cleared "
+    "FROM orders WHERE enterprise IS NOT NULL GROUP BY enterprise "
+    "UNION ALL SELECT o.enterprise, 0, 0, 0, COUNT(*), 0, 0 FROM settlements s JOIN orders o ON o.id = s.order_id "
+    "WHERE s.status = 'completed' AND o.enterprise IS NOT NULL GROUP BY o.enterprise "
+    f"UNION ALL SELECT enterprise, 0, 0, 0, 0, COUNT(*), COALESCE(SUM(status IN ({_cleared})), 0) "
+    "FROM customs_headers WHERE enterprise IS NOT NULL GROUP BY enterprise"
+    ") GROUP BY enterprise"
+)
+_COLS = 'enterprise, orders_total, active_orders, gmv_cny, settled_orders, declarations, cleared_declarations, clearance_rate, updated_at'
+
+
+def _online_delta(conn, rows):
+    """订单数在 0 与正数之间变化的企业数，即看板在线企业数的增量"""
+    changed = {r['enterprise']: r['orders_total'] for r in rows if r['orders_total']}
+    before = {}
+    names = list(changed)
+    for i in range(0, len(names), LOOKUP_SIZE):
+        chunk = names[i:i + LOOKUP_SIZE]
+        marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+        res = conn.execute(text(f"SELECT enterprise, orders_total FROM enterprise_stats WHERE enterprise IN ({marks})"), {f'p{n}': v for n, v in enumerate(chunk)})
+        before.update(res.all())
+    return sum(((before.get(e) or 0) + d > 0) - ((before.get(e) or 0) > 0) for e, d in changed.items())
+
+
+def _apply(conn, deltas):
+    """deltas: {enterprise: {counter: 增量}}，累加到汇总表并重算通关率"""
+    now = datetime.utcnow().isoformat()
+    rows = []
+    for ent, d in deltas.items():
+        if ent is None or not any(d.values()):
+            continue
+        row = {'enterprise': ent, **{c: d.get(c, 0) for c in COUNTERS}, 'updated_at': now}
+        row['clearance_rate'] = row['cleared_declarations'] / row['declarations'] if row['declarations'] > 0 else None
+        rows.append(row)
+    if not rows:
+        return
+    add_counters(conn, {'online_enterprises': _online_delta(conn, rows)})
+    t = EnterpriseStats.__table__
+    stmt = insert(t)
+    set_ = {c: t.c[c] + stmt.excluded[c] for c in COUNTERS}
+    set_['clearance_rate'] = cast(t.c.cleared_declarations + stmt.excluded.cleared_declarations, Float) / func.nullif(t.c.declarations + stmt.excluded.declarations, 0)
+    set_['updated_at'] = stmt.excluded.updated_at
+    conn.execute(stmt.on_conflict_do_update(index_elements=['enterprise'], set_=set_), rows)
+
+
+def _completed_settlements(conn, order_ids):
+    out = {}
+    ids = list(order_ids)
+    for i in range(0, len(ids), LOOKUP_SIZE):
+        chunk = ids[i:i + LOOKUP_SIZE]
+        marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+        res = conn.execute(text(
+            f"SELECT order_id, COUNT(*) FROM settlements WHERE status = 'completed' AND order_id IN ({marks}) GROUP BY order_id"
+        ), {f'p{n}': v for n, v in enumerate(chunk)})
+        out.update({r[0]: r[1] for r in res})
+    return out
+
+
+def on_orders_written(conn, old_rows, new_rows):
+    """
+    old_rows/new_rows: {订单id: {'enterprise','status','amount','currency','created_at'}}；新建时 old 中无该 id，删除时 new 中无该 id。
+    订单换了企业（或新建/删除）时，已完成结算数随订单一起迁移。看板的在途订单数与按日 GMV 计数器在此一并更新。
+    """
+    deltas = defaultdict(lambda: defaultdict(float))
+    kpis = defaultdict(float)
+    moved = {}
+    for oid in set(old_rows) | set(new_rows):
+        old, new = old_rows.get(oid), new_rows.get(oid)
+        for row, sign in ((old, -1), (new, 1)):
+            if row is None:
+                continue
+            d = deltas[row['enterprise']]
+            active = sign * (row['status'] is not None and row['status'] not in INACTIVE_ORDER_STATUSES)
+            gmv = sign * to_cny(row['amount'], row['currency'], row.get('created_at'))
+            d['orders_total'] += sign
+            d['active_orders'] += active
+            d['gmv_cny'] += gmv
+            kpis['active_orders'] += active
+            kpis[gmv_key(row.get('created_at'))] += gmv
+        old_ent = old['enterprise'] if old else None
+        new_ent = new['enterprise'] if new else None
+        if old_ent != new_ent:
+            moved[oid] = (old_ent, new_ent)
+    if moved:
+        for oid, n in _completed_settlements(conn, moved).items():
+            old_ent, new_ent = moved[oid]
+            deltas[old_ent]['settled_orders'] -= n
+            deltas[new_ent]['settled_orders'] += n
+    _apply(conn, deltas)
+    add_counters(conn, kpis)
+
+
+def on_settlements_written(conn, old_rows, new_rows):
+    """old_rows/new_rows: {结算单id: {'order_id','status'}}；只有 completed 状态计入 settled_orders"""
+    changes = defaultdict(int)
+    for sid in set(old_rows) | set(new_rows):
+        for row, sign in ((old_rows.get(sid), -1), (new_rows.get(sid), 1)):
+            if row is not None and row['status'] == 'completed' and row['order_id']:
+                changes[row['order_id']] += sign
+    changes = {k: v for k, v in changes.items() if v}
+    if not changes:
+        return
+    owners = fetch_by_ids(conn, 'orders', ('enterprise',), changes)
+    deltas = defaultdict(lambda: defaultdict(float))
+    for oid, n in changes.items():
+        if oid in owners:
+            deltas[owners[oid]['enterprise']]['settled_orders'] += n
+    _apply(conn, deltas)
+
+
+def on_headers_written(conn, old_rows, new_rows):
+    """old_rows/new_rows: {报关单id: {'enterprise','status'}}"""
+    deltas = defaultdict(lambda: defaultdict(float))
+    for hid in set(old_rows) | set(new_rows):
+        for row, sign in ((old_rows.get(hid), -1), (new_rows.get(hid), 1)):
+            if row is None:
+                continue
+            d = deltas[row['enterprise']]
+            d['declarations'] += sign
+            d['cleared_declarations'] += sign * (row['status'] in CLEARED_STATUSES)
+    _apply(conn, deltas)
+
+
+# 批量写入钩子：在同一事务内、写入前读取旧值并累加增量；rows 为即将写入的行（同一 id 以最后一条为准）
+def orders_hook(conn, rows):
+    old = fetch_by_ids(conn, 'orders', ('enterprise', 'status', 'amount', 'currency', 'created_at'), [r['id'] for r in rows])
+    # created_at 只在新建时写入，已存在的订单沿用原值
+    new = {r['id']: {**r, 'created_at': old[r['id']]['created_at']} if r['id'] in old else r for r in rows}
+    on_orders_written(conn, old, new)
+
+
+def settlements_hook(conn, rows):
+    new = {r['id']: r for r in rows}
+    on_settlements_written(conn, fetch_by_ids(conn, 'settlements', ('order_id', 'status'), new), new)
+
+
+def refresh_enterprise_gmv(conn):
+    """汇率变更后按下单日汇率重算各企业的 gmv_cny"""
+    conn.execute(text(
+        f"UPDATE enterprise_stats SET gmv_cny = COALESCE((SELECT SUM({cny_sql('orders.amount', 'orders.currency', 'orders.created_at')}) "
+        "FROM orders WHERE orders.enterprise = enterprise_stats.enterprise), 0), updated_at = :now"
+    ), {'now': datetime.utcnow().isoformat()})
+
+
+def rebuild_stats(engine):
+    """
+    按业务表全量重算汇总表，用于修复漂移。先算到临时表与现有数据比对，
+    返回企业数与发生漂移的企业数，并记录一条 jobs 记录（type=enterprise_stats_rebuild）。
+    """
+    now = datetime.utcnow().isoformat()
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS enterprise_stats_new AS SELECT {_COLS} FROM enterprise_stats WHERE 0"))
+        conn.execute(text("DELETE FROM enterprise_stats_new"))
+        conn.execute(text(f"INSERT INTO enterprise_stats_new ({_COLS}) {_SELECT_SQL}"), {'now': now})
+        diff = ' OR '.join(f"n.{c} IS NOT s.{c}" for c in COUNTERS if c != 'gmv_cny')
+        drifted = conn.execute(text(
+            "SELECT COUNT(*) FROM enterprise_stats_new n LEFT JOIN enterprise_stats s ON s.enterprise = n.enterprise "
+            f"WHERE s.enterprise IS NULL OR {diff} OR abs(n.gmv_cny - s.gmv_cny) > 0.01"
+        )).scalar()
+        drifted += conn.execute(text(
+            "SELECT COUNT(*) FROM enterprise_stats s WHERE NOT EXISTS (SELECT 1 FROM enterprise_stats_new n WHERE n.enterprise = s.enterprise)"
+        )).scalar()
+        conn.execute(text("DELETE FROM enterprise_stats"))
+        total = conn.execute(text(f"INSERT INTO enterprise_stats ({_COLS}) SELECT {_COLS} FROM enterprise_stats_new")).rowcount
+        conn.execute(text("DELETE FROM enterprise_stats_new"))
+        stats = {'enterprises': total, 'drifted': drifted}
+        conn.execute(
+            text("INSERT INTO jobs (id, type, payload, status) VALUES (:id, :type, :payload, 'completed')"),
+            {'id': str(uuid.uuid4()), 'type': JOB_TYPE, 'payload': json.dumps({'finishedAt': now, **stats})},
+        )
+    return stats
+
+
+def ensure_stats(conn):
+    """汇总表为空而业务表有数据时（首次升级）做一次全量构建"""
+    empty = conn.execute(text("SELECT 1 FROM enterprise_stats LIMIT 1")).first() is None
+    if empty and (conn.execute(text("SELECT 1 FROM orders LIMIT 1")).first() or conn.execute(text("SELECT 1 FROM customs_headers LIMIT 1")).first()):
+        conn.execute(text(f"INSERT INTO enterprise_stats ({_COLS}) {_SELECT_SQL}"), {'now': datetime.utcnow().isoformat()})
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        print('用法: python -m backend_py.services.enterprise_stats rebuild')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    print(rebuild_stats(engine))
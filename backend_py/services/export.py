@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer
+
+# 每次从服务端游标取出并编码的行数，内存占用与结果集大小无关
+CHUNK_SIZE = 5000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class _Sink:
+    """ParquetWriter 的输出端：写入的字节暂存起来，由生成器逐块取走"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _chunks(engine, stmt, date_pos):
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(stmt)
+        while True:
+            rows = result.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            if date_pos:
+                rows = [list(r) for r in rows]
+                for r in rows:
+                    for i in date_pos:
+                        v = r[i]
+                        if isinstance(v, (date, datetime)):
+                            r[i] = v.isoformat()
+            yield rows
+
+
+def _csv(names, chunks):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    buf.write('\ufeff')  # BOM，便于 Excel 正确识别中文
+    w.writerow(names)
+    for rows in chunks:
+        w.writerows(rows)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def _ndjson(names, chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(names, r)), ensure_ascii=False) + '\n' for r in rows).encode('utf-8')
+
+
+def _parquet(names, types, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(n, t) for n, t in zip(names, types)])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in chunks:
+            cols = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=t) for c, t in zip(cols, types)], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _arrow_type(col):
+    import pyarrow as pa
+    t = col.type
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, Integer):
+        return pa.int64()
+    if isinstance(t, Float):
+        return pa.float64()
+    return pa.string()
+
+
+def export_response(engine, stmt, fmt: str, filename: str):
+    """
+    以流式响应导出 select 语句的结果：列名取语句中各列的 label（与列表接口字段一致），
+    日期时间统一为 ISO 字符串。fmt 为 csv / ndjson / parquet（需要 pyarrow）。
+    """
+    fmt = (fmt or '').lower()
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail='format 仅支持 csv、ndjson 或 parquet')
+    cols = list(stmt.selected_columns)
+    names = [c.key for c in cols]
+    date_pos = [i for i, c in enumerate(cols) if isinstance(c.type, (Date, DateTime))]
+    chunks = _chunks(engine, stmt, date_pos)
+    if fmt == 'csv':
+        body = _csv(names, chunks)
+    elif fmt == 'ndjson':
+        body = _ndjson(names, chunks)
+    else:
+        try:
+            types = [_arrow_type(c) for c in cols]
+        except ImportError:
+            raise HTTPException(status_code=400, detail='parquet 导出需要安装 pyarrow')
+        body = _parquet(names, types, chunks)
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'}
+    return StreamingResponse(body, media_type=FORMATS[fmt], headers=headers)
@@ -0,0 +1,90 @@
+from sqlalchemy import bindparam, or_, text
+
+# 业务表 -> 参与全文检索的列；FTS5 外部内容表以业务表 rowid 关联，由触发器保持同步
+FTS_COLUMNS = {
+    'orders': ['order_number', 'enterprise'],
+    'customs_headers': ['declaration_no', 'enterprise'],
+    'logistics': ['tracking_no', 'origin', 'destination', 'order_id'],
+    'enterprises': ['name', 'reg_no', 'region'],
+}
+
+# 建表成功的 FTS 表；SQLite 不支持 FTS5/trigram 时为空，检索回退为 LIKE
+enabled_tables: set = set()
+
+# trigram 分词至少需要 3 个字符才能命中索引
+MIN_QUERY_LEN = 3
+
+
+def _ddl(table, cols):
+    fts = f'{table}_fts'
+    col_list = ', '.join(cols)
+    new_vals = ', '.join(f'new.{c}' for c in cols)
+    old_vals = ', '.join(f'old.{c}' for c in cols)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({col_list}, content='{table}', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col_list} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_vals}); END",
+    ]
+
+
+def ensure_fts(engine):
+    """创建 FTS5 影子表与同步触发器；首次创建时从业务表全量构建索引"""
+    for table, cols in FTS_COLUMNS.items():
+        fts = f'{table}_fts'
+        try:
+            with engine.begin() as conn:
+                exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {'n': fts}).first()
+                ddl = _ddl(table, cols)
+                if not exists:
+                    conn.execute(text(ddl[0]))
+                for stmt in ddl[1:]:
+                    conn.execute(text(stmt))
+                if not exists:
+                    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            enabled_tables.add(table)
+        except Exception:
+            enabled_tables.discard(table)
+
+
+def rebuild_fts(engine):
+    """全量重建索引。VACUUM 可能重排无 INTEGER PRIMARY KEY 表的 rowid，执行后需要调用一次"""
+    with engine.begin() as conn:
+        for table in FTS_COLUMNS:
+            if table in enabled_tables:
+                conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+
+def search_filter(model, q: str):
+    """
+    返回 q 的筛选条件：可用时走 FTS5 trigram 索引做子串匹配，
+    否则（FTS 不可用或 q 少于 3 个字符）回退为各列 LIKE '%q%'。
+    """
+    table = model.__tablename__
+    cols = FTS_COLUMNS[table]
+    if table not in enabled_tables or len(q) < MIN_QUERY_LEN:
+        return or_(*[getattr(model, c).like(f'%{q}%') for c in cols])
+    phrase = '"' + q.replace('"', '""') + '"'
+    # unique=True 编译时为每个条件生成独立的参数名，同一语句中可以组合多个检索条件
+    return text(f"{table}.rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :fts_q)").bindparams(bindparam('fts_q', phrase, unique=True))
+
+
+def capped_match_count(db, model, q: str, cap: int):
+    """FTS 命中行数，最多数到 cap 为止；不走 FTS 时返回 None。用于在半连接与逐行 EXISTS 之间选择执行方式"""
+    table = model.__tablename__
+    if table not in enabled_tables or len(q) < MIN_QUERY_LEN:
+        return None
+    phrase = '"' + q.replace('"', '""') + '"'
+    return db.execute(text(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table}_fts WHERE {table}_fts MATCH :fts_q LIMIT :cap)"),
+                      {'fts_q': phrase, 'cap': cap}).scalar()
+
+
+if __name__ == '__main__':
+    from backend_py.db import engine, init_db
+    init_db()
+    rebuild_fts(engine)
+    print('FTS rebuilt:', ', '.join(sorted(enabled_tables)))
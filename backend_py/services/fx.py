@@ -0,0 +1,95 @@
+import bisect
+import threading
+from datetime import date, datetime
+from sqlalchemy import text
+from backend_py.db import engine
+
+# fx_rates 为空时写入的默认汇率（折算人民币），自 EPOCH_DAY 起效
+DEFAULT_RATES = {'USD': 7.12, 'EUR': 7.80, 'GBP': 8.90, 'CNY': 1.0, 'JPY': 0.05}
+EPOCH_DAY = '1970-01-01'
+# 日期为空的记录按最新汇率折算
+_LATEST = '9999-12-31'
+
+_lock = threading.Lock()
+_rates = None  # {币种: ([valid_from 升序], [rate])}，进程内缓存，汇率变更后由 invalidate() 失效
+
+
+def as_day(value):
+    """date/datetime/字符串转为 YYYY-MM-DD；为空时取今天（UTC），与 created_at 的默认值一致"""
+    if value is None:
+        value = datetime.utcnow()
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    return str(value)[:10]
+
+
+def _load():
+    global _rates
+    with _lock:
+        if _rates is None:
+            table = {}
+            with engine.connect() as conn:
+                for cur, day, rate in conn.execute(text("SELECT currency, valid_from, rate FROM fx_rates ORDER BY currency, valid_from")):
+                    days, rates = table.setdefault(cur, ([], []))
+                    days.append(day)
+                    rates.append(rate)
+            _rates = table
+        return _rates
+
+
+def invalidate():
+    global _rates
+    with _lock:
+        _rates = None
+
+
+def rate_on(currency, day=None):
+    """day 当日有效的汇率；早于首个版本时取首个版本，未登记的币种按 1.0"""
+    hit = _load().get(currency)
+    if not hit:
+        return 1.0
+    days, rates = hit
+    i = bisect.bisect_right(days, as_day(day) if day is not None else _LATEST) - 1
+    return rates[max(i, 0)]
+
+
+def to_cny(amount, currency, day=None):
+    return (amount or 0) * rate_on(currency, day)
+
+
+def cny_sql(amount_col: str, currency_col: str, date_col: str = None):
+    """
+    返回把 amount_col 按 date_col 当日有效汇率折算为人民币的 SQL 表达式（取值规则同 rate_on），
+    不传 date_col 时按最新汇率。列名需带表名限定，以免与 fx_rates 的列混淆。
+    """
+    day = f"COALESCE(substr({date_col}, 1, 10), '{_LATEST}')" if date_col else f"'{_LATEST}'"
+    return (
+        f"COALESCE({amount_col}, 0) * COALESCE("
+        f"(SELECT fx.rate FROM fx_rates fx WHERE fx.currency = {currency_col} AND fx.valid_from <= {day} ORDER BY fx.valid_from DESC LIMIT 1), "
+        f"(SELECT fx.rate FROM fx_rates fx WHERE fx.currency = {currency_col} ORDER BY fx.valid_from LIMIT 1), 1.0)"
+    )
+
+
+def set_rate(conn, currency, valid_from, rate):
+    """
+    写入（或覆盖）一个汇率版本，返回折算结果受影响的最早日期；
+    该币种此前没有更早的版本时，更早的记录也回退到此版本，返回空串表示全部历史。
+    调用方提交事务后需调用 invalidate()。
+    """
+    conn.execute(text(
+        "INSERT INTO fx_rates (currency, valid_from, rate, updated_at) VALUES (:cur, :day, :rate, :now) "
+        "ON CONFLICT(currency, valid_from) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at"
+    ), {'cur': currency, 'day': valid_from, 'rate': rate, 'now': datetime.utcnow().isoformat()})
+    earlier = conn.execute(text("SELECT 1 FROM fx_rates WHERE currency = :cur AND valid_from < :day LIMIT 1"), {'cur': currency, 'day': valid_from}).first()
+    return valid_from if earlier else ''
+
+
+def ensure_rates(conn):
+    """汇率表为空时写入默认汇率"""
+    if conn.execute(text("SELECT 1 FROM fx_rates LIMIT 1")).first() is None:
+        now = datetime.utcnow().isoformat()
+        conn.execute(
+            text("INSERT INTO fx_rates (currency, valid_from, rate, updated_at) VALUES (:cur, :day, :rate, :now)"),
+            [{'cur': cur, 'day': EPOCH_DAY, 'rate': rate, 'now': now} for cur, rate in DEFAULT_RATES.items()],
+        )
+        invalidate()
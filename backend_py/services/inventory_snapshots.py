@@ -0,0 +1,53 @@
+import sys
+from datetime import datetime
+from sqlalchemy import text
+from backend_py.services.count_cache import CountCache
+
+# 需求预测读取的全量日序列矩阵；写入快照时失效
+history_cache = CountCache(ttl=300.0, maxsize=16)
+
+UPSERT_SQL = (
+    "INSERT INTO inventory_snapshots (name, day, current, production, sales, taken_at) "
+    "VALUES (:name, :day, :current, :production, :sales, :taken_at) "
+    "ON CONFLICT(name, day) DO UPDATE SET current=excluded.current, production=excluded.production, "
+    "sales=excluded.sales, taken_at=excluded.taken_at"
+)
+
+
+def record_snapshots(conn, rows):
+    """按当天日期为 rows（含 name/current/production/sales）写入快照；可直接作为 bulk_upsert 的 before_write 钩子"""
+    if not rows:
+        return
+    history_cache.clear()
+    now = datetime.utcnow()
+    day, taken_at = now.strftime('%Y-%m-%d'), now.isoformat()
+    conn.execute(text(UPSERT_SQL), [{
+        'name': r['name'],
+        'day': day,
+        'current': r['current'],
+        'production': r['production'],
+        'sales': r['sales'],
+        'taken_at': taken_at,
+    } for r in rows])
+
+
+def snapshot_all(conn):
+    """为全部产品写入当天快照，供定时任务调用以保证没有变更的产品也有连续的日序列"""
+    history_cache.clear()
+    now = datetime.utcnow()
+    return conn.execute(text(
+        "INSERT INTO inventory_snapshots (name, day, current, production, sales, taken_at) "
+        "SELECT name, :day, current, production, sales, :taken_at FROM inventory WHERE true "
+        "ON CONFLICT(name, day) DO UPDATE SET current=excluded.current, production=excluded.production, "
+        "sales=excluded.sales, taken_at=excluded.taken_at"
+    ), {'day': now.strftime('%Y-%m-%d'), 'taken_at': now.isoformat()}).rowcount
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['snapshot']:
+        print('用法: python -m backend_py.services.inventory_snapshots snapshot')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    with engine.begin() as conn:
+        print({'snapshots': snapshot_all(conn)})
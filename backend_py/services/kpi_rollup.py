@@ -0,0 +1,184 @@
+import json
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import text
+from backend_py.services.fx import as_day, cny_sql
+
+JOB_TYPE = 'kpi_reconcile'
+# 不计入在途订单的状态；看板 active_orders 与企业汇总共用此口径
+INACTIVE_ORDER_STATUSES = ('completed', 'blocked')
+# 不计为放行的模型调用结果
+FAILED_OUTCOMES = ('blocked', 'reject', 'error')
+# 物流异常：状态为 exception 或时效评分低于该值
+EXCEPTION_EFFICIENCY = 60
+
+_inactive = ', '.join(f"'{s}'" for s in INACTIVE_ORDER_STATUSES)
+_failed = ', '.join(f"'{s}'" for s in FAILED_OUTCOMES)
+# 对账：(聚合 SQL, 各列对应的计数器)；每张明细表只扫描一次
+_RECONCILE = (
+    (f"SELECT COUNT(DISTINCT enterprise), COALESCE(SUM(status NOT IN ({_inactive})), 0) FROM orders",
+     ('online_enterprises', 'active_orders')),
+    (f"SELECT COUNT(*), COALESCE(SUM(business_outcome NOT IN ({_failed})), 0), COALESCE(SUM(latency_ms), 0), COUNT(latency_ms), "
+     "COALESCE(SUM(business_impact_value), 0), "
+     "COALESCE(SUM(business_outcome LIKE '%block%' OR business_outcome LIKE '%reject%'), 0) FROM model_execution_logs",
+     ('exec_calls', 'exec_passed', 'exec_latency_sum', 'exec_latency_n', 'exec_value_sum', 'exec_risk')),
+    (f"SELECT COUNT(*) FROM logistics WHERE status = 'exception' OR efficiency < {EXCEPTION_EFFICIENCY}",
+     ('logistics_exceptions',)),
+    ("SELECT COUNT(*), COALESCE(SUM(accuracy), 0), COUNT(accuracy) FROM algorithms WHERE status = 'active'",
+     ('active_algorithms', 'active_accuracy_sum', 'active_accuracy_n')),
+    ("SELECT COALESCE(SUM(value), 0), COUNT(value) FROM model_metrics WHERE metric_type = 'efficiency_boost'",
+     ('efficiency_boost_sum', 'efficiency_boost_n')),
+)
+_GMV_SQL = (
+    f"SELECT 'gmv_cny:' || substr(created_at, 1, 10), SUM({cny_sql('orders.amount', 'orders.currency', 'orders.created_at')}) "
+    "FROM orders WHERE created_at >= :since GROUP BY substr(created_at, 1, 10)"
+)
+COUNTERS = tuple(c for _, cols in _RECONCILE for c in cols)
+UPSERT_SQL = (
+    "INSERT INTO kpi_counters (name, value, updated_at) VALUES (:name, :value, :updated_at) "
+    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value, updated_at = excluded.updated_at"
+)
+
+
+def gmv_key(day):
+    """订单创建日对应的 GMV 计数器；day 为 date/datetime/字符串，为空时按今天（与 created_at 默认值一致）"""
+    return f'gmv_cny:{as_day(day)}'
+
+
+def add_counters(conn, deltas):
+    """deltas: {计数器: 增量}，在调用方事务内累加，增量为 0 的跳过"""
+    now = datetime.utcnow().isoformat()
+    rows = [{'name': k, 'value': v, 'updated_at': now} for k, v in deltas.items() if v]
+    if rows:
+        conn.execute(text(UPSERT_SQL), rows)
+
+
+def read_counters(conn, names):
+    """按主键读取一组计数器，不存在的按 0 返回"""
+    marks = ', '.join(f':p{n}' for n in range(len(names)))
+    res = conn.execute(text(f"SELECT name, value FROM kpi_counters WHERE name IN ({marks})"), {f'p{n}': v for n, v in enumerate(names)})
+    values = dict.fromkeys(names, 0.0)
+    values.update(res.all())
+    return values
+
+
+def _diff(old_rows, new_rows, counters_of):
+    deltas = defaultdict(float)
+    for key in set(old_rows) | set(new_rows):
+        for row, sign in ((old_rows.get(key), -1), (new_rows.get(key), 1)):
+            if row is not None:
+                for k, v in counters_of(row).items():
+                    deltas[k] += sign * v
+    return deltas
+
+
+def _log_counters(row):
+    outcome = row.get('business_outcome')
+    latency = row.get('latency_ms')
+    low = (outcome or '').lower()
+    return {
+        'exec_calls': 1,
+        'exec_passed': outcome is not None and outcome not in FAILED_OUTCOMES,
+        'exec_latency_sum': latency or 0,
+        'exec_latency_n': latency is not None,
+        'exec_value_sum': row.get('business_impact_value') or 0,
+        'exec_risk': 'block' in low or 'reject' in low,
+    }
+
+
+def _logistics_counters(row):
+    eff = row.get('efficiency')
+    return {'logistics_exceptions': row.get('status') == 'exception' or (eff is not None and eff < EXCEPTION_EFFICIENCY)}
+
+
+def _algorithm_counters(row):
+    if row.get('status') != 'active':
+        return {}
+    acc = row.get('accuracy')
+    return {'active_algorithms': 1, 'active_accuracy_sum': acc or 0, 'active_accuracy_n': acc is not None}
+
+
+def on_logs_inserted(conn, rows):
+    """rows: 新写入的模型执行记录（列名为表字段），执行记录只增不改"""
+    deltas = defaultdict(float)
+    for row in rows:
+        for k, v in _log_counters(row).items():
+            deltas[k] += v
+    add_counters(conn, deltas)
+
+
+def on_metrics_inserted(conn, rows):
+    """rows: 新写入的 model_metrics 行，只有 efficiency_boost 计入看板"""
+    values = [r['value'] for r in rows if r.get('metric_type') == 'efficiency_boost' and r.get('value') is not None]
+    add_counters(conn, {'efficiency_boost_sum': sum(values), 'efficiency_boost_n': len(values)})
+
+
+def on_logistics_written(conn, old_rows, new_rows):
+    """old_rows/new_rows: {运单id: {'status','efficiency'}}"""
+    add_counters(conn, _diff(old_rows, new_rows, _logistics_counters))
+
+
+def on_algorithms_written(conn, old_rows, new_rows):
+    """old_rows/new_rows: {算法id: {'status','accuracy'}}"""
+    add_counters(conn, _diff(old_rows, new_rows, _algorithm_counters))
+
+
+def refresh_gmv_counters(conn, since=''):
+    """汇率变更后按下单日汇率重算 since（YYYY-MM-DD，空串为全部）及之后各日的 GMV 计数器"""
+    conn.execute(text("DELETE FROM kpi_counters WHERE name >= :lo AND name < 'gmv_cny;'"), {'lo': gmv_key(since) if since else 'gmv_cny:'})
+    conn.execute(
+        text(f"INSERT INTO kpi_counters (name, value, updated_at) SELECT *, :now FROM ({_GMV_SQL})"),
+        {'since': since, 'now': datetime.utcnow().isoformat()},
+    )
+
+
+def _compute(conn):
+    values = {}
+    for sql, cols in _RECONCILE:
+        values.update(zip(cols, conn.execute(text(sql)).first()))
+    values.update(conn.execute(text(_GMV_SQL), {'since': ''}).all())
+    return values
+
+
+def reconcile_kpis(engine):
+    """
+    按明细表全量重算全部计数器并覆盖，用于修复漂移（定时任务调用）。
+    返回计数器个数与发生漂移的计数器名，并记录一条 jobs 记录（type=kpi_reconcile）。
+    """
+    now = datetime.utcnow().isoformat()
+    with engine.begin() as conn:
+        fresh = _compute(conn)
+        stored = dict(conn.execute(text("SELECT name, value FROM kpi_counters")).all())
+        drifted = sorted(k for k in set(fresh) | set(stored) if abs((fresh.get(k) or 0) - (stored.get(k) or 0)) > 0.01)
+        conn.execute(text("DELETE FROM kpi_counters"))
+        conn.execute(
+            text("INSERT INTO kpi_counters (name, value, updated_at) VALUES (:name, :value, :updated_at)"),
+            [{'name': k, 'value': v or 0, 'updated_at': now} for k, v in fresh.items()],
+        )
+        stats = {'counters': len(fresh), 'drifted': drifted}
+        conn.execute(
+            text("INSERT INTO jobs (id, type, payload, status) VALUES (:id, :type, :payload, 'completed')"),
+            {'id': str(uuid.uuid4()), 'type': JOB_TYPE, 'payload': json.dumps({'finishedAt': now, **stats})},
+        )
+    return stats
+
+
+def ensure_kpis(conn):
+    """计数器表为空时（首次升级）按明细表构建一次"""
+    if conn.execute(text("SELECT 1 FROM kpi_counters LIMIT 1")).first() is None:
+        now = datetime.utcnow().isoformat()
+        conn.execute(
+            text("INSERT INTO kpi_counters (name, value, updated_at) VALUES (:name, :value, :updated_at)"),
+            [{'name': k, 'value': v or 0, 'updated_at': now} for k, v in _compute(conn).items()],
+        )
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['reconcile']:
+        print('用法: python -m backend_py.services.kpi_rollup reconcile')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    print(reconcile_kpis(engine))
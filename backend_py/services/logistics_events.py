@@ -0,0 +1,107 @@
+from datetime import datetime
+from backend_py.db import engine
+from backend_py.services.bulk_upsert import fetch_by_ids
+from backend_py.services.kpi_rollup import on_logistics_written
+from backend_py.services.milestones import parse_ts
+from backend_py.services.write_buffer import GroupCommitBuffer
+
+# 事件代码 -> (投影到 logistics.status 的状态, 对应里程碑)；未列出的代码只入事件表
+EVENT_CODES = {
+    'PU': ('pickup', None),
+    'DEP': ('transit', 'atd'),
+    'ARR': ('customs', 'ata'),
+    'CUS': ('customs', None),
+    'CLR': ('delivery', None),
+    'OFD': ('delivery', None),
+    'DLV': ('completed', None),
+}
+
+# tracking_no 反查运单时 IN 列表的长度
+LOOKUP_SIZE = 500
+
+INSERT_SQL = (
+    "INSERT INTO logistics_events (shipment_id, tracking_no, event_code, location, event_time, event_ts, received_at) "
+    "VALUES (:shipment_id, :tracking_no, :event_code, :location, :event_time, :event_ts, :received_at)"
+)
+# 状态只接受不早于已投影事件的更新；atd/ata 取最早一次离港/到港。SET 右侧读取的都是更新前的值
+PROJECT_SQL = (
+    "UPDATE logistics SET "
+    "status = CASE WHEN :status IS NOT NULL AND (last_event_ts IS NULL OR :status_ts >= last_event_ts) THEN :status ELSE status END, "
+    "last_event_ts = CASE WHEN :status IS NOT NULL AND (last_event_ts IS NULL OR :status_ts >= last_event_ts) THEN :status_ts ELSE last_event_ts END, "
+    "atd = CASE WHEN :atd_ts IS NOT NULL AND (atd_ts IS NULL OR :atd_ts < atd_ts) THEN :atd ELSE atd END, "
+    "atd_ts = CASE WHEN :atd_ts IS NOT NULL AND (atd_ts IS NULL OR :atd_ts < atd_ts) THEN :atd_ts ELSE atd_ts END, "
+    "ata = CASE WHEN :ata_ts IS NOT NULL AND (ata_ts IS NULL OR :ata_ts < ata_ts) THEN :ata ELSE ata END, "
+    "ata_ts = CASE WHEN :ata_ts IS NOT NULL AND (ata_ts IS NULL OR :ata_ts < ata_ts) THEN :ata_ts ELSE ata_ts END "
+    "WHERE id = :id"
+)
+
+
+def normalize_event(rec: dict, received_at: str):
+    """校验并规范化一条承运商事件，返回待入库的行；不合法时抛 ValueError"""
+    shipment_id = rec.get('shipmentId') or rec.get('shipment_id')
+    tracking_no = rec.get('trackingNo') or rec.get('tracking_no')
+    if not shipment_id and not tracking_no:
+        raise ValueError('缺少 shipmentId 或 trackingNo')
+    code = str(rec.get('eventCode') or rec.get('event_code') or rec.get('code') or '').strip().upper()
+    if not code:
+        raise ValueError('缺少 eventCode')
+    raw_time = rec.get('eventTime') or rec.get('event_time') or rec.get('timestamp')
+    ts = parse_ts(raw_time)
+    if ts is None:
+        raise ValueError(f'无法解析事件时间: {raw_time!r}')
+    return {
+        'shipment_id': shipment_id,
+        'tracking_no': tracking_no,
+        'event_code': code,
+        'location': rec.get('location'),
+        'event_time': str(raw_time),
+        'event_ts': ts,
+        'received_at': received_at,
+    }
+
+
+def _iso(ts):
+    return datetime.utcfromtimestamp(ts).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def project(events):
+    """把一批事件归并为每个运单一条投影参数：最新状态事件、最早离港/到港时间"""
+    proj = {}
+    for e in events:
+        sid = e['shipment_id']
+        if not sid or e['event_code'] not in EVENT_CODES:
+            continue
+        status, milestone = EVENT_CODES[e['event_code']]
+        p = proj.setdefault(sid, {'id': sid, 'status': None, 'status_ts': None, 'atd': None, 'atd_ts': None, 'ata': None, 'ata_ts': None})
+        ts = e['event_ts']
+        if p['status_ts'] is None or ts >= p['status_ts']:
+            p['status'], p['status_ts'] = status, ts
+        if milestone and (p[f'{milestone}_ts'] is None or ts < p[f'{milestone}_ts']):
+            p[f'{milestone}_ts'] = ts
+            p[milestone] = _iso(ts)
+    return list(proj.values())
+
+
+def flush_events(events):
+    """一次事务写入一批事件并更新运单投影"""
+    with engine.begin() as conn:
+        missing = list({e['tracking_no'] for e in events if not e['shipment_id']})
+        ids = {}
+        for i in range(0, len(missing), LOOKUP_SIZE):
+            chunk = missing[i:i + LOOKUP_SIZE]
+            marks = ', '.join('?' * len(chunk))
+            ids.update(conn.exec_driver_sql(f"SELECT tracking_no, id FROM logistics WHERE tracking_no IN ({marks})", tuple(chunk)).all())
+        for e in events:
+            if not e['shipment_id']:
+                e['shipment_id'] = ids.get(e['tracking_no'])
+        conn.exec_driver_sql(INSERT_SQL, events)
+        params = project(events)
+        if params:
+            ids = [p['id'] for p in params]
+            before = fetch_by_ids(conn, 'logistics', ('status', 'efficiency'), ids)
+            conn.exec_driver_sql(PROJECT_SQL, params)
+            on_logistics_written(conn, before, fetch_by_ids(conn, 'logistics', ('status', 'efficiency'), ids))
+
+
+# 承运商事件写缓冲：攒批后 group commit，积压超过 max_pending 时接口返回 503
+buffer = GroupCommitBuffer('logistics-events', flush_events, max_batch=5000, max_delay=0.2, max_pending=200000)
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from sqlalchemy import text
+
+# 字符串里程碑列 -> 对应的 epoch 秒列
+MILESTONES = {'etd': 'etd_ts', 'eta': 'eta_ts', 'atd': 'atd_ts', 'ata': 'ata_ts'}
+
+_ISO_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
+_FORMATS = ('%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y/%m/%d', '%Y%m%d')
+
+# 回填时每批处理的行数
+CHUNK_SIZE = 10000
+
+
+def parse_ts(value):
+    """把自由格式的时间字符串解析为 UTC epoch 秒；无时区的按 UTC 处理，无法解析时返回 None"""
+    if value is None:
+        return None
+    s = str(value).strip()
+    if not s:
+        return None
+    if s.isdigit() and len(s) >= 10:
+        n = int(s)
+        return n // 1000 if n > 10 ** 11 else n
+    dt = None
+    try:
+        dt = datetime.fromisoformat(s.replace('Z', '+00:00'))
+    except ValueError:
+        for fmt in _FORMATS:
+            try:
+                dt = datetime.strptime(s, fmt)
+                break
+            except ValueError:
+                continue
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def milestone_columns(row: dict):
+    """按 row 中的 etd/eta/atd/ata 字符串返回对应的 *_ts 列，并标记该行已解析"""
+    return {**{ts: parse_ts(row.get(col)) for col, ts in MILESTONES.items()}, 'milestones_parsed': 1}
+
+
+def apply_milestone_columns(r):
+    for col, ts in MILESTONES.items():
+        setattr(r, ts, parse_ts(getattr(r, col)))
+    r.milestones_parsed = 1
+
+
+def backfill_milestones(conn):
+    """
+    迁移 / 补漏：为 milestones_parsed 为空的物流单解析字符串里程碑并写入 *_ts 列，处理后置 1。
+    无法解析的原值保持不变，但同样标记为已处理，之后启动不会重复扫描；待处理行走部分索引。
+    """
+    # ISO 8601 形式先在 SQL 内解析（strftime 同样按 UTC 归一化时区偏移），其余格式逐行交给 parse_ts
+    sets = ', '.join(
+        f"{ts} = COALESCE({ts}, CASE WHEN {c} GLOB '{_ISO_GLOB}' THEN CAST(strftime('%s', {c}) AS INTEGER) END)"
+        for c, ts in MILESTONES.items()
+    )
+    conn.exec_driver_sql(f"UPDATE logistics SET {sets} WHERE milestones_parsed IS NULL")
+    unresolved = ' OR '.join(f"({c} IS NOT NULL AND {c} != '' AND {ts} IS NULL)" for c, ts in MILESTONES.items())
+    conn.exec_driver_sql(f"UPDATE logistics SET milestones_parsed = 1 WHERE milestones_parsed IS NULL AND NOT ({unresolved})")
+    while True:
+        rows = conn.execute(text(
+            "SELECT rowid, etd, eta, atd, ata FROM logistics WHERE milestones_parsed IS NULL ORDER BY rowid LIMIT :n"
+        ), {'n': CHUNK_SIZE}).all()
+        if not rows:
+            break
+        params = [{'rid': r[0], **milestone_columns(dict(zip(MILESTONES, r[1:])))} for r in rows]
+        conn.exec_driver_sql(
+            "UPDATE logistics SET etd_ts = COALESCE(etd_ts, :etd_ts), eta_ts = COALESCE(eta_ts, :eta_ts), "
+            "atd_ts = COALESCE(atd_ts, :atd_ts), ata_ts = COALESCE(ata_ts, :ata_ts), milestones_parsed = 1 WHERE rowid = :rid", params
+        )
@@ -0,0 +1,95 @@
+import json
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import text
+from backend_py.services.fx import as_day
+from backend_py.services.kpi_rollup import FAILED_OUTCOMES
+
+JOB_TYPE = 'model_rollup_backfill'
+COLUMNS = ('calls', 'passed', 'risk', 'errors', 'impact_sum', 'latency_sum', 'accuracy_sum', 'accuracy_n')
+
+_failed = ', '.join(f"'{s}'" for s in FAILED_OUTCOMES)
+UPSERT_SQL = (
+    f"INSERT INTO model_daily_rollup (model_id, day, {', '.join(COLUMNS)}) "
+    f"VALUES (:model_id, :day, {', '.join(':' + c for c in COLUMNS)}) "
+    f"ON CONFLICT(model_id, day) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in COLUMNS)}"
+)
+# 回填：执行记录与准确率指标各按 (模型, 日) 聚合一次再合并
+_BACKFILL_SQL = (
+    f"INSERT INTO model_daily_rollup (model_id, day, {', '.join(COLUMNS)}) "
+    f"SELECT model_id, day, {', '.join(f'SUM({c})' for c in COLUMNS)} FROM ("
+    "SELECT COALESCE(model_id, '') AS model_id, substr(timestamp, 1, 10) AS day, COUNT(*) AS calls, "
+    f"COALESCE(SUM(business_outcome NOT IN ({_failed})), 0) AS passed, "
+    "COALESCE(SUM(business_outcome LIKE '%block%' OR business_outcome LIKE '%reject%'), 0) AS risk, "
+    "COALESCE(SUM(status = 'error'), 0) AS errors, COALESCE(SUM(business_impact_value), 0) AS impact_sum, "
+    "COALESCE(SUM(latency_ms), 0) AS latency_sum, 0 AS accuracy_sum, 0 AS accuracy_n "
+    "FROM model_execution_logs WHERE timestamp >= :since GROUP BY 1, 2 "
+    "UNION ALL SELECT COALESCE(model_id, ''), substr(timestamp, 1, 10), 0, 0, 0, 0, 0, 0, COALESCE(SUM(value), 0), COUNT(value) "
+    "FROM model_metrics WHERE metric_type = 'accuracy' AND timestamp >= :since GROUP BY 1, 2"
+    ") GROUP BY model_id, day"
+)
+
+
+def _upsert(conn, acc):
+    rows = [{'model_id': m, 'day': d, **{c: v.get(c, 0) for c in COLUMNS}} for (m, d), v in acc.items()]
+    if rows:
+        conn.execute(text(UPSERT_SQL), rows)
+
+
+def on_logs_inserted(conn, rows):
+    """rows: 新写入的模型执行记录（列名为表字段），按 (模型, 日) 累加"""
+    acc = defaultdict(lambda: defaultdict(float))
+    for r in rows:
+        outcome = r.get('business_outcome')
+        low = (outcome or '').lower()
+        d = acc[(r.get('model_id') or '', as_day(r.get('timestamp')))]
+        d['calls'] += 1
+        d['passed'] += outcome is not None and outcome not in FAILED_OUTCOMES
+        d['risk'] += 'block' in low or 'reject' in low
+        d['errors'] += r.get('status') == 'error'
+        d['impact_sum'] += r.get('business_impact_value') or 0
+        d['latency_sum'] += r.get('latency_ms') or 0
+    _upsert(conn, acc)
+
+
+def on_metrics_inserted(conn, rows):
+    """rows: 新写入的 model_metrics 行，只有 accuracy 计入"""
+    acc = defaultdict(lambda: defaultdict(float))
+    for r in rows:
+        if r.get('metric_type') == 'accuracy' and r.get('value') is not None:
+            d = acc[(r.get('model_id') or '', as_day(r.get('timestamp')))]
+            d['accuracy_sum'] += r['value']
+            d['accuracy_n'] += 1
+    _upsert(conn, acc)
+
+
+def backfill_rollup(engine, since=''):
+    """按明细表重建 since（YYYY-MM-DD，空串为全部）及之后各日的汇总，记录一条 jobs 记录（type=model_rollup_backfill）"""
+    now = datetime.utcnow().isoformat()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM model_daily_rollup WHERE day >= :since"), {'since': since})
+        rows = conn.execute(text(_BACKFILL_SQL), {'since': since}).rowcount
+        stats = {'since': since or None, 'rows': rows}
+        conn.execute(
+            text("INSERT INTO jobs (id, type, payload, status) VALUES (:id, :type, :payload, 'completed')"),
+            {'id': str(uuid.uuid4()), 'type': JOB_TYPE, 'payload': json.dumps({'finishedAt': now, **stats})},
+        )
+    return stats
+
+
+def ensure_rollup(conn):
+    """汇总表为空而已有执行记录时（首次升级）回填全部历史"""
+    empty = conn.execute(text("SELECT 1 FROM model_daily_rollup LIMIT 1")).first() is None
+    if empty and conn.execute(text("SELECT 1 FROM model_execution_logs LIMIT 1")).first():
+        conn.execute(text(_BACKFILL_SQL), {'since': ''})
+
+
+if __name__ == '__main__':
+    if not sys.argv[1:] or sys.argv[1] != 'backfill' or len(sys.argv) > 3:
+        print('用法: python -m backend_py.services.model_rollup backfill [YYYY-MM-DD]')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    print(backfill_rollup(engine, sys.argv[2] if len(sys.argv) > 2 else ''))
@@ -0,0 +1,114 @@
+import json
+import uuid
+from datetime import datetime
+from backend_py.db import engine
+from backend_py.services import kpi_rollup, model_rollup
+from backend_py.services.bulk_upsert import fetch_by_ids
+from backend_py.services.milestones import parse_ts
+from backend_py.services.write_buffer import GroupCommitBuffer
+
+# 与 SQLAlchemy 在 SQLite 中存储 DateTime 的格式一致，ORM 读取时可直接解析
+TS_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+LOG_SQL = (
+    "INSERT INTO model_execution_logs (id, order_id, model_id, model_name, input_snapshot, output_result, "
+    "business_outcome, business_impact_value, latency_ms, status, timestamp) "
+    "VALUES (:id, :order_id, :model_id, :model_name, :input_snapshot, :output_result, "
+    ":business_outcome, :business_impact_value, :latency_ms, :status, :timestamp)"
+)
+METRIC_SQL = "INSERT INTO model_metrics (model_id, metric_type, value, timestamp) VALUES (:model_id, :metric_type, :value, :timestamp)"
+
+
+def _text(value):
+    """快照 / 输出允许传 JSON 对象，统一存为文本"""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _number(rec, *keys, cast=float):
+    for k in keys:
+        v = rec.get(k)
+        if v is not None and v != '':
+            try:
+                return cast(v)
+            except (TypeError, ValueError):
+                raise ValueError(f'{keys[0]} 不是数值: {v!r}')
+    return None
+
+
+def normalize_trace(rec: dict, received_at: datetime):
+    """
+    校验并规范化一条模型执行轨迹，返回 {'log': 执行记录行, 'metrics': [指标行]}；不合法时抛 ValueError。
+    metrics 可为 {指标类型: 数值} 或 [{metricType, value}]，时间与模型沿用该条轨迹。
+    """
+    model_id = rec.get('modelId') or rec.get('model_id')
+    if not model_id:
+        raise ValueError('缺少 modelId')
+    raw_time = rec.get('timestamp')
+    if raw_time in (None, ''):
+        ts = received_at
+    else:
+        epoch = parse_ts(raw_time)
+        if epoch is None:
+            raise ValueError(f'无法解析时间: {raw_time!r}')
+        ts = datetime.utcfromtimestamp(epoch)
+    ts = ts.strftime(TS_FORMAT)
+    latency = _number(rec, 'latencyMs', 'latency_ms', cast=int)
+    log = {
+        'id': str(rec.get('traceId') or rec.get('id') or uuid.uuid4()),
+        'order_id': rec.get('orderId') or rec.get('order_id'),
+        'model_id': model_id,
+        'model_name': rec.get('modelName') or rec.get('model_name') or model_id,
+        'input_snapshot': _text(rec.get('inputSnapshot', rec.get('input_snapshot'))),
+        'output_result': _text(rec.get('outputResult', rec.get('output_result'))),
+        'business_outcome': rec.get('businessOutcome') or rec.get('business_outcome'),
+        'business_impact_value': _number(rec, 'businessImpactValue', 'business_impact_value'),
+        'latency_ms': latency,
+        'status': rec.get('status') or 'success',
+        'timestamp': ts,
+    }
+    raw = rec.get('metrics') or []
+    if isinstance(raw, dict):
+        raw = [{'metricType': k, 'value': v} for k, v in raw.items()]
+    if not isinstance(raw, list):
+        raise ValueError('metrics 应为对象或数组')
+    metrics = []
+    for m in raw:
+        if not isinstance(m, dict):
+            raise ValueError('metrics 中的元素应为对象')
+        kind = m.get('metricType') or m.get('metric_type')
+        value = _number(m, 'value')
+        if not kind or value is None:
+            raise ValueError('metrics 中每项需含 metricType 与 value')
+        metrics.append({'model_id': model_id, 'metric_type': kind, 'value': value, 'timestamp': ts})
+    return {'log': log, 'metrics': metrics}
+
+
+def flush_traces(traces):
+    """
+    一次事务批量写入执行记录与指标，并累加看板计数器与模型日汇总。
+    trace id 已存在（客户端重试）或同批重复的轨迹整条跳过，保证重发不会重复计数。
+    """
+    unique = {}
+    for t in traces:
+        unique.setdefault(t['log']['id'], t)
+    with engine.begin() as conn:
+        existing = fetch_by_ids(conn, 'model_execution_logs', ('id',), unique)
+        fresh = [t for tid, t in unique.items() if tid not in existing]
+        if not fresh:
+            return
+        logs = [t['log'] for t in fresh]
+        metrics = [m for t in fresh for m in t['metrics']]
+        conn.exec_driver_sql(LOG_SQL, logs)
+        if metrics:
+            conn.exec_driver_sql(METRIC_SQL, metrics)
+        kpi_rollup.on_logs_inserted(conn, logs)
+        model_rollup.on_logs_inserted(conn, logs)
+        if metrics:
+            kpi_rollup.on_metrics_inserted(conn, metrics)
+            model_rollup.on_metrics_inserted(conn, metrics)
+
+
+# 模型执行轨迹写缓冲：接口只入队即返回，后台线程攒批 group commit，积压超过 max_pending 时返回 503
+buffer = GroupCommitBuffer('model-traces', flush_traces, max_batch=5000, max_delay=0.2, max_pending=200000)
@@ -0,0 +1,195 @@
+import json
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+# 口岸维度的初始数据，覆盖样例报关单中出现的口岸代码
+DEFAULT_PORTS = {
+    'CNSHA': '上海',
+    'CNSGH': '上海',
+    'CNYTN': '深圳',
+    'CNCAN': '广州',
+    'CNNGB': '宁波',
+    'CNTAO': '青岛',
+    'CNXMN': '厦门',
+    'CNTNJ': '天津',
+    'CNHKG': '香港',
+    'USLAX': '洛杉矶',
+    'NLRTM': '鹿特丹',
+    'JPOSA': '大阪',
+}
+JOB_TYPE = 'port_congestion_rebuild'
+# 时间序列粒度 -> bucket 格式
+GRAINS = {'hour': '%Y-%m-%dT%H', 'day': '%Y-%m-%d'}
+# 取关联行时 IN 列表的长度
+LOOKUP_SIZE = 500
+
+APPLY_SQL = (
+    "INSERT INTO port_stats (port_code, eff_sum, pairs, updated_at) VALUES (:port_code, :eff_sum, :pairs, :now) "
+    "ON CONFLICT(port_code) DO UPDATE SET eff_sum = eff_sum + excluded.eff_sum, pairs = pairs + excluded.pairs, updated_at = excluded.updated_at"
+)
+# 把变更后的当前值写入所在小时 / 天的 bucket（同一时段内多次变更保留最后一次）
+SAMPLE_SQL = (
+    "INSERT INTO port_congestion (port_code, grain, bucket, eff_sum, pairs) "
+    "SELECT port_code, :grain, :bucket, eff_sum, pairs FROM port_stats WHERE port_code IN ({marks}) "
+    "ON CONFLICT(port_code, grain, bucket) DO UPDATE SET eff_sum = excluded.eff_sum, pairs = excluded.pairs"
+)
+# 全量：报关单与运单按 order_id 关联（走两侧 order_id 索引），空 order_id 不参与
+_STATS_SQL = (
+    "SELECT h.port_code, COALESCE(SUM(l.efficiency), 0), COUNT(l.efficiency) FROM customs_headers h "
+    "JOIN logistics l ON l.order_id = h.order_id "
+    "WHERE h.port_code IS NOT NULL AND h.order_id IS NOT NULL AND h.order_id != '' GROUP BY h.port_code"
+)
+
+
+def congestion_index(eff_sum, pairs):
+    """拥堵指数 = (100 - 平均 efficiency) / 10；没有关联数据时为 0"""
+    return round((100 - eff_sum / pairs) / 10, 1) if pairs else 0.0
+
+
+def _grouped(conn, sql, keys):
+    out = []
+    keys = list(keys)
+    for i in range(0, len(keys), LOOKUP_SIZE):
+        chunk = keys[i:i + LOOKUP_SIZE]
+        marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+        out += conn.execute(text(sql.format(marks=marks)), {f'p{n}': v for n, v in enumerate(chunk)}).all()
+    return out
+
+
+def _apply(conn, deltas):
+    """deltas: {port_code: [eff_sum 增量, pairs 增量]}，累加到当前值并写入当前小时 / 天的时间序列"""
+    deltas = {p: d for p, d in deltas.items() if d[0] or d[1]}
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    conn.execute(text(APPLY_SQL), [{'port_code': p, 'eff_sum': d[0], 'pairs': d[1], 'now': now.isoformat()} for p, d in deltas.items()])
+    ports = list(deltas)
+    for grain, fmt in GRAINS.items():
+        for i in range(0, len(ports), LOOKUP_SIZE):
+            chunk = ports[i:i + LOOKUP_SIZE]
+            marks = ', '.join(f':p{n}' for n in range(len(chunk)))
+            conn.execute(text(SAMPLE_SQL.format(marks=marks)), {'grain': grain, 'bucket': now.strftime(fmt), **{f'p{n}': v for n, v in enumerate(chunk)}})
+
+
+def on_logistics_written(conn, old_rows, new_rows):
+    """old_rows/new_rows: {运单id: {'order_id','efficiency'}}；运单的 efficiency 计入其订单下每张报关单所在口岸"""
+    by_order = defaultdict(lambda: [0.0, 0])
+    for sid in set(old_rows) | set(new_rows):
+        for row, sign in ((old_rows.get(sid), -1), (new_rows.get(sid), 1)):
+            if row is not None and row.get('order_id') and row.get('efficiency') is not None:
+                d = by_order[row['order_id']]
+                d[0] += sign * row['efficiency']
+                d[1] += sign
+    by_order = {o: d for o, d in by_order.items() if d[0] or d[1]}
+    if not by_order:
+        return
+    deltas = defaultdict(lambda: [0.0, 0])
+    for oid, port, k in _grouped(conn, "SELECT order_id, port_code, COUNT(*) FROM customs_headers WHERE order_id IN ({marks}) AND port_code IS NOT NULL GROUP BY order_id, port_code", by_order):
+        eff, n = by_order[oid]
+        deltas[port][0] += k * eff
+        deltas[port][1] += k * n
+    _apply(conn, deltas)
+
+
+def on_headers_written(conn, old_rows, new_rows):
+    """old_rows/new_rows: {报关单id: {'order_id','port_code'}}；报关单换口岸或换订单时，其订单下全部运单随之迁移"""
+    counts = defaultdict(int)
+    for hid in set(old_rows) | set(new_rows):
+        for row, sign in ((old_rows.get(hid), -1), (new_rows.get(hid), 1)):
+            if row is not None and row.get('order_id') and row.get('port_code') is not None:
+                counts[(row['order_id'], row['port_code'])] += sign
+    counts = {k: v for k, v in counts.items() if v}
+    if not counts:
+        return
+    shipments = {oid: (eff, n) for oid, eff, n in _grouped(
+        conn, "SELECT order_id, COALESCE(SUM(efficiency), 0), COUNT(efficiency) FROM logistics WHERE order_id IN ({marks}) GROUP BY order_id", {o for o, _ in counts}
+    )}
+    deltas = defaultdict(lambda: [0.0, 0])
+    for (oid, port), k in counts.items():
+        if oid in shipments:
+            eff, n = shipments[oid]
+            deltas[port][0] += k * eff
+            deltas[port][1] += k * n
+    _apply(conn, deltas)
+
+
+def _resync(conn):
+    """按两表全量重算当前值，差额按增量写入（同时进入当前小时 / 天的时间序列）"""
+    fresh = {p: (eff, n) for p, eff, n in conn.execute(text(_STATS_SQL))}
+    stored = {p: (eff, n) for p, eff, n in conn.execute(text("SELECT port_code, eff_sum, pairs FROM port_stats"))}
+    deltas = {}
+    for p in set(fresh) | set(stored):
+        eff, n = fresh.get(p, (0.0, 0))
+        old_eff, old_n = stored.get(p, (0.0, 0))
+        if abs(eff - old_eff) > 1e-6 or n != old_n:
+            deltas[p] = [eff - old_eff, n - old_n]
+    _apply(conn, deltas)
+    return {'ports': len(fresh), 'drifted': len(deltas)}
+
+
+def rebuild_ports(engine):
+    """全量重算口岸拥堵当前值用于修复漂移，返回口岸数与发生漂移的口岸数，并记录一条 jobs 记录（type=port_congestion_rebuild）"""
+    with engine.begin() as conn:
+        stats = _resync(conn)
+        conn.execute(
+            text("INSERT INTO jobs (id, type, payload, status) VALUES (:id, :type, :payload, 'completed')"),
+            {'id': str(uuid.uuid4()), 'type': JOB_TYPE, 'payload': json.dumps({'finishedAt': datetime.utcnow().isoformat(), **stats})},
+        )
+    return stats
+
+
+def ensure_ports(conn):
+    """口岸维度为空时写入默认口岸；当前值为空而已有数据时（首次升级）全量构建一次"""
+    if conn.execute(text("SELECT 1 FROM ports LIMIT 1")).first() is None:
+        conn.execute(text("INSERT INTO ports (code, name) VALUES (:code, :name)"), [{'code': c, 'name': n} for c, n in DEFAULT_PORTS.items()])
+    if conn.execute(text("SELECT 1 FROM port_stats LIMIT 1")).first() is None:
+        _resync(conn)
+
+
+def _window(window):
+    """'24h' / '30d' -> (粒度, bucket 列表)；不合法时抛 ValueError"""
+    unit, n = window[-1:], int(window[:-1])
+    now = datetime.utcnow()
+    if unit == 'h' and 1 <= n <= 168:
+        return 'hour', [(now - timedelta(hours=i)).strftime(GRAINS['hour']) for i in range(n - 1, -1, -1)]
+    if unit == 'd' and 1 <= n <= 366:
+        return 'day', [(now - timedelta(days=i)).strftime(GRAINS['day']) for i in range(n - 1, -1, -1)]
+    raise ValueError(window)
+
+
+def congestion(conn, window='24h'):
+    """
+    各口岸的当前拥堵指数与窗口内的时间序列，以 port_stats 为准，维度表中没有的口岸以代码作为名称。
+    没有变更的时段沿用之前最近一次的值，每个口岸只读取窗口内的 bucket 及窗口前最后一个 bucket，耗时与明细表规模无关。
+    """
+    grain, buckets = _window(window)
+    ports = conn.execute(text(
+        "SELECT s.port_code, COALESCE(p.name, s.port_code), s.eff_sum, s.pairs FROM port_stats s "
+        "LEFT JOIN ports p ON p.code = s.port_code WHERE s.pairs > 0 ORDER BY s.port_code"
+    )).all()
+    out = []
+    for code, name, eff_sum, pairs in ports:
+        prev = conn.execute(text(
+            "SELECT eff_sum, pairs FROM port_congestion WHERE port_code = :p AND grain = :g AND bucket < :start ORDER BY bucket DESC LIMIT 1"
+        ), {'p': code, 'g': grain, 'start': buckets[0]}).first()
+        samples = dict((b, (e, n)) for b, e, n in conn.execute(text(
+            "SELECT bucket, eff_sum, pairs FROM port_congestion WHERE port_code = :p AND grain = :g AND bucket >= :start"
+        ), {'p': code, 'g': grain, 'start': buckets[0]}))
+        series, last = [], prev
+        for b in buckets:
+            last = samples.get(b, last)
+            series.append({'t': b, 'congestionIndex': congestion_index(*last) if last else None})
+        out.append({'code': code, 'port': name, 'congestionIndex': congestion_index(eff_sum, pairs), 'series': series})
+    return {'grain': grain, 'ports': out}
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        print('用法: python -m backend_py.services.port_congestion rebuild')
+        sys.exit(1)
+    from backend_py.db import engine, init_db
+    init_db()
+    print(rebuild_ports(engine))
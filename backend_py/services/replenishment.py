@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import text
+from backend_py.services.count_cache import replenishment_plans
+from backend_py.services.kpi_rollup import INACTIVE_ORDER_STATUSES
+from backend_py.services.fx import cny_sql
+
+# 订单品类 -> 库存产品，与前端 getAlgorithmRecommendations 的对应一致；未列出的品类按同名产品匹配
+CATEGORY_PRODUCTS = {'beauty': '化妆品', 'electronics': '电子产品', 'textile': '服装', 'wine': '食品', 'appliance': '机械设备'}
+# 在途订单金额折算为需求件数时的单位货值（人民币）
+UNIT_VALUE = 1000.0
+LEAD_TIME = 7
+SAFETY_DAYS = 3
+
+_inactive = ', '.join(f"'{s}'" for s in INACTIVE_ORDER_STATUSES)
+_OPEN_DEMAND_SQL = (
+    f"SELECT category, SUM({cny_sql('orders.amount', 'orders.currency')}) FROM orders "
+    f"WHERE status NOT IN ({_inactive}) AND category IS NOT NULL GROUP BY category"
+)
+
+
+def allocate(qty, priority, capacity):
+    """
+    在总产能 capacity 内分配补货量：max Σ priority·x，s.t. Σx ≤ capacity，0 ≤ x ≤ qty。
+    这是分数背包形式的 LP，按 priority 从高到低依次满足即为最优解，用累加和一次算出。
+    """
+    order = np.argsort(-priority, kind='stable')
+    before = np.cumsum(qty[order]) - qty[order]
+    out = np.zeros_like(qty)
+    out[order] = np.clip(capacity - before, 0, qty[order])
+    return out
+
+
+def _open_demand(conn, names):
+    """按品类汇总未完结订单金额并折算为各产品的需求件数"""
+    index = {n: i for i, n in enumerate(names)}
+    demand = np.zeros(len(names))
+    for category, amount in conn.execute(text(_OPEN_DEMAND_SQL)):
+        i = index.get(CATEGORY_PRODUCTS.get(category, category))
+        if i is not None:
+            demand[i] += (amount or 0) / UNIT_VALUE
+    return demand
+
+
+def plan_replenishment(conn, lead_time=LEAD_TIME, safety_days=SAFETY_DAYS, horizon=14, capacity=None):
+    """
+    对全部产品一次性计算 (s, S) 补货计划。sales/production 视为日速率：
+    可用量 = 当前库存 - 在途订单需求；再订货点 s = 提前期内净消耗 + safety_days 天销量；
+    补到 S = max(target, s)。可用量降到 s 的日期即下单日，下单量为 S 减届时可用量。
+    horizon 天内需要下单的产品参与产能分配（capacity 为空时不限）。
+    """
+    today = datetime.utcnow().date()
+    key = (today.isoformat(), lead_time, safety_days, horizon, capacity)
+    hit = replenishment_plans.get(key)
+    if hit is not None:
+        return hit
+
+    inv = conn.execute(text("SELECT name, current, target, production, sales FROM inventory ORDER BY name")).all()
+    names = [r[0] for r in inv]
+    cur, target, prod, sales = (np.array([r[k] or 0 for r in inv], dtype=float) for k in range(1, 5))
+    demand = _open_demand(conn, names)
+
+    available = cur - demand
+    draw = sales - prod
+    rop = lead_time * np.maximum(draw, 0) + safety_days * sales
+    up_to = np.maximum(target, rop)
+    consuming = draw > 0
+    # 已低于再订货点的当天下单；净消耗不为正且尚未低于 s 的无需下单（inf）
+    days = np.where(available <= rop, 0.0, np.inf)
+    later = consuming & (available > rop)
+    days[later] = np.floor((available[later] - rop[later]) / draw[later])
+    stockout = np.full(len(inv), np.inf)
+    stockout[consuming] = np.maximum(available[consuming], 0) / draw[consuming]
+    qty = np.where(np.isfinite(days), np.ceil(up_to - np.minimum(available, rop)), 0)
+    due = (days <= horizon) & (qty > 0)
+    # 越早断货越优先；不会断货的低于安全库存产品排在最后
+    priority = np.where(due, 1.0 / (1.0 + np.minimum(stockout, 1e9)), 0.0)
+    planned = np.where(due, qty, 0)
+    alloc = planned if capacity is None else allocate(planned, priority, float(capacity))
+
+    items = []
+    for i in np.argsort(-priority, kind='stable'):
+        items.append({
+            'name': names[i],
+            'current': int(cur[i]),
+            'target': int(target[i]),
+            'openDemand': round(float(demand[i]), 1),
+            'netDraw': float(draw[i]),
+            'reorderPoint': round(float(rop[i]), 1),
+            'orderUpTo': round(float(up_to[i]), 1),
+            'reorderDate': (today + timedelta(days=int(days[i]))).isoformat() if np.isfinite(days[i]) else None,
+            'stockoutDays': round(float(stockout[i]), 1) if np.isfinite(stockout[i]) else None,
+            'due': bool(due[i]),
+            'qty': int(planned[i]),
+            'allocated': int(alloc[i]),
+        })
+    result = {
+        'date': today.isoformat(),
+        'leadTime': lead_time,
+        'safetyDays': safety_days,
+        'horizon': horizon,
+        'capacity': capacity,
+        'due': int(due.sum()),
+        'required': int(planned.sum()),
+        'allocated': int(alloc.sum()),
+        'shortfall': int(planned.sum() - alloc.sum()),
+        'items': items,
+    }
+    replenishment_plans.set(key, result)
+    return result
@@ -0,0 +1,41 @@
+# 订单合规评分规则；调用方负责取数，便于 /api/risk/score 与订单全链路接口共用同一批查询结果
+
+
+def _blank(v):
+    return v is None or v == ''
+
+
+def compliance_score(order, items, settlement, shipment):
+    """
+    order: 订单；items: 该订单全部报关明细；settlement: 该订单的结算单（可为 None）；
+    shipment: 该订单最新一票运单（可为 None）。返回 {'compliance', 'messages'}
+    """
+    score = 95
+    messages = []
+    cat = (order.category or '').lower()
+
+    if cat == 'electronics':
+        if any(_blank(i.origin_country) for i in items):
+            messages.append('电子产品缺少原产国')
+            score -= 5
+    elif cat == 'textile':
+        if any(_blank(i.spec) for i in items):
+            messages.append('纺织品缺少规格')
+            score -= 5
+    elif cat == 'appliance':
+        if not settlement or settlement.status != 'completed':
+            messages.append('家电建议在结算完成后安排发运')
+            score -= 3
+
+    if any(_blank(i.hs_code) or len(i.hs_code.replace('.', '')) < 8 for i in items):
+        messages.append('HS编码不完整')
+        score -= 6
+
+    if getattr(order, 'incoterms', '') == 'CIF':
+        if not shipment or not (shipment.efficiency or 0):
+            messages.append('CIF缺少保险费用')
+            score -= 6
+
+    if score < 0:
+        score = 0
+    return {'compliance': score, 'messages': messages}
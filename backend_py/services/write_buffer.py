@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """缓冲区已满，调用方应返回 503 让上游稍后重试"""
+
+
+class GroupCommitBuffer:
+    """
+    进程内有界写缓冲：写入方只追加到内存列表，后台线程攒够 max_batch 条或等待 max_delay 秒后
+    整批交给 flush_fn 在一个事务里写入（group commit）。
+    pending 超过 max_pending 时拒绝写入（背压）；stop() 会把剩余数据全部刷完。
+    flush_fn 抛异常时整批放回队首，按 retry_delay 指数退避重试 max_retries 次（如 database is locked）；
+    仍失败才丢弃并记下这段序号，wait() 对其返回 False。flush_fn 须在单个事务内写入，失败即整批回滚。
+    """
+
+    MAX_FAILED = 1000
+
+    def __init__(self, name, flush_fn, max_batch=5000, max_delay=0.2, max_pending=200000, max_retries=5, retry_delay=0.1):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._items = []
+        self._cond = threading.Condition()
+        self._accepted = 0  # 已接收条数（序号）
+        self._flushed = 0  # 已处理完（成功或失败）的序号
+        self._thread = None
+        self._stopping = False
+        self._urgent = False  # 有调用方在 wait()，不再等满 max_delay
+        self._attempts = 0  # 队首这批已失败的次数
+        self._failed = []  # 重试后仍写入失败的序号区间 [(first, last)]，只保留最近 MAX_FAILED 段
+        self.stats = {'flushes': 0, 'written': 0, 'failed': 0, 'retries': 0}
+
+    def put_many(self, items):
+        """追加一批数据，返回这批最后一条的序号，可交给 wait() 等待落库"""
+        with self._cond:
+            if self._stopping:
+                raise BufferFull(f'{self.name} 正在关闭')
+            if len(self._items) + len(items) > self.max_pending:
+                raise BufferFull(f'{self.name} 缓冲区已满')
+            self._ensure_started()
+            self._items.extend(items)
+            self._accepted += len(items)
+            self._cond.notify_all()
+            return self._accepted
+
+    def wait(self, seq, timeout=None, first=1):
+        """等待序号 seq 之前的数据全部刷完；超时，或 [first, seq] 中有数据最终写入失败时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._flushed < seq:
+                self._urgent = True
+                self._cond.notify_all()
+            while self._flushed < seq:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._failed_in(first, seq)
+
+    def failed(self, first, last):
+        """[first, last] 中是否有数据在重试后仍写入失败（已被丢弃）"""
+        with self._cond:
+            return self._failed_in(first, last)
+
+    def _failed_in(self, first, last):
+        return any(a <= last and b >= first for a, b in self._failed)
+
+    def pending(self):
+        with self._cond:
+            return len(self._items)
+
+    def stop(self, timeout=30):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items and not self._stopping:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_delay
+                while self._items and len(self._items) < self.max_batch and not self._stopping and not self._urgent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._items:
+                    return
+                batch = self._items[:self.max_batch]
+                del self._items[:self.max_batch]
+                if not self._items:
+                    self._urgent = False
+            try:
+                self.flush_fn(batch)
+                ok = True
+            except Exception:
+                ok = False
+                if self._attempts < self.max_retries:
+                    self._attempts += 1
+                    delay = self.retry_delay * 2 ** (self._attempts - 1)
+                    logger.warning('%s flush failed, retry %d/%d in %.1fs', self.name, self._attempts, self.max_retries, delay, exc_info=True)
+                    with self._cond:
+                        # 放回队首保持顺序，序号与 _flushed 的对应关系不变；积压计入 pending，背压照常生效
+                        self._items[:0] = batch
+                        self.stats['retries'] += 1
+                    time.sleep(delay)
+                    continue
+                logger.exception('%s flush failed after %d retries, dropped %d records', self.name, self.max_retries, len(batch))
+            self._attempts = 0
+            with self._cond:
+                self.stats['flushes'] += 1
+                self.stats['written' if ok else 'failed'] += len(batch)
+                if not ok:
+                    self._failed.append((self._flushed + 1, self._flushed + len(batch)))
+                    del self._failed[:-self.MAX_FAILED]
+                self._flushed += len(batch)
+                self._cond.notify_all()
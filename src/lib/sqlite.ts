@@ -587,13 +587,13 @@ function seed(db: Database) {
 
 async function syncFromBackendInto(db: Database) {
   try {
-    const cntRes = await fetch('/api/orders/count')
-    const cntJson = await cntRes.json()
-    const total = cntJson.count || 0
     const page = 200
-    for (let offset = 0; offset < total; offset += page) {
-      const res = await fetch(`/api/orders?offset=${offset}&limit=${page}`)
-      const rows = await res.json()
+    let cursor: string | null = ''
+    while (cursor !== null) {
+      const res = await fetch(`/api/orders?limit=${page}&cursor=${encodeURIComponent(cursor)}`)
+      const json = await res.json()
+      const rows = json.items || []
+      cursor = json.nextCursor || null
       for (const o of rows) {
         db.run(`INSERT INTO orders(id,order_number,enterprise,category,status,amount,currency,created_at,updated_at)
                 VALUES($id,$num,$ent,$cat,$st,$amt,$cur,$cr,$up)
@@ -604,13 +604,13 @@ async function syncFromBackendInto(db: Database) {
       }
     }
 
-    const hdrCntRes = await fetch(`/api/customs/headers/count?status=all&portCode=all&tradeMode=all`)
-    const hdrCntJson = await hdrCntRes.json()
-    const hTotal = hdrCntJson.count || 0
     const hPage = 200
-    for (let offset = 0; offset < hTotal; offset += hPage) {
-      const res = await fetch(`/api/customs/headers?status=all&portCode=all&tradeMode=all&offset=${offset}&limit=${hPage}`)
-      const rows = await res.json()
+    let hCursor: string | null = ''
+    while (hCursor !== null) {
+      const res = await fetch(`/api/customs/headers?status=all&portCode=all&tradeMode=all&limit=${hPage}&cursor=${encodeURIComponent(hCursor)}`)
+      const json = await res.json()
+      const rows = json.items || []
+      hCursor = json.nextCursor || null
       for (const r of rows) {
         db.run(`INSERT INTO customs_headers(id,declaration_no,enterprise,port_code,trade_mode,currency,total_value,status,declare_date,order_id,updated_at)
                 VALUES($id,$no,$ent,$pc,$tm,$cur,$tv,$st,$dd,$oid,$upd)
@@ -1332,11 +1332,39 @@ export async function countCustomsHeaders(q: string, status: string, portCode: s
   return json.count || 0
 }
 
+export async function getCustomsHeadersPagedWithTotal(q: string, status: string, portCode: string, tradeMode: string, offset: number, limit: number, hsChap?: string, hsHead?: string, hsSub?: string, onlyBadHs?: boolean, onlyMissingUnit?: boolean, onlyAbnormalQty?: boolean, orderId?: string, includeItems?: boolean) {
+  const qs = new URLSearchParams()
+  if (q) qs.set('q', q)
+  if (status) qs.set('status', status)
+  if (portCode) qs.set('portCode', portCode)
+  if (tradeMode) qs.set('tradeMode', tradeMode)
+  if (hsChap) qs.set('hsChap', hsChap)
+  if (hsHead) qs.set('hsHead', hsHead)
+  if (hsSub) qs.set('hsSub', hsSub)
+  if (onlyBadHs) qs.set('onlyBadHs', 'true')
+  if (onlyMissingUnit) qs.set('onlyMissingUnit', 'true')
+  if (onlyAbnormalQty) qs.set('onlyAbnormalQty', 'true')
+  if (orderId) qs.set('orderId', orderId)
+  qs.set('offset', String(offset))
+  qs.set('limit', String(limit))
+  qs.set('withTotal', 'true')
+  if (includeItems) qs.set('include', 'items')
+  const res = await fetch(`/api/customs/headers?${qs.toString()}`)
+  const json = await res.json()
+  return { items: json.items || [], total: json.total || 0 }
+}
+
 export async function getCustomsItems(headerId: string) {
   const res = await fetch(`/api/customs/items/${headerId}`)
   return await res.json()
 }
 
+export async function getCustomsItemsBatch(headerIds: string[]) {
+  if (!headerIds.length) return {}
+  const res = await fetch(`/api/customs/items/batch?headerIds=${encodeURIComponent(headerIds.join(','))}`)
+  return await res.json()
+}
+
 export async function getHsHeadings(chapter?: string) {
   const params: any = {}
   const where = chapter ? `WHERE substr(replace(hs_code,'.',''),1,2)=$c` : ''
@@ -1501,7 +1529,7 @@ export async function updateSettlementStatus(id: string, status: string) {
 }
 
 export async function getSettlementByOrder(orderId: string) {
-  const res = await fetch(`/api/settlements?q=${encodeURIComponent(orderId)}&offset=0&limit=1`)
+  const res = await fetch(`/api/settlements?orderId=${encodeURIComponent(orderId)}&offset=0&limit=1`)
   const rows = await res.json()
   return rows[0] || null
 }
@@ -1540,6 +1568,27 @@ export async function getCustomsHeaderByOrder(orderId: string) {
   }
 }
 
+export async function getOrderFull(orderId: string) {
+  const res = await fetch(`/api/orders/${encodeURIComponent(orderId)}/full`)
+  if (!res.ok) return null
+  return res.json()
+}
+
+export async function getDownstreamByOrder(orderIds: string[]) {
+  if (!orderIds.length) return { settlements: {}, shipments: {}, declarations: {} }
+  const ids = encodeURIComponent(orderIds.join(','))
+  const get = async (path: string) => {
+    const res = await fetch(`${path}?ids=${ids}`)
+    return res.ok ? res.json() : {}
+  }
+  const [settlements, shipments, declarations] = await Promise.all([
+    get('/api/settlements/by-order'),
+    get('/api/logistics/by-order'),
+    get('/api/customs/headers/by-order')
+  ])
+  return { settlements, shipments, declarations }
+}
+
 export async function getCustomsClearances() {
   return queryAll(`SELECT id, declaration_no as declarationNo, product, enterprise, status, clearance_time as clearanceTime, compliance, risk_score as riskScore FROM customs_clearances ORDER BY id`)
 }
@@ -2306,17 +2355,20 @@ export async function getPortsCongestion() {
       SELECT ch.port_code, AVG(l.efficiency) as avg_eff 
       FROM customs_headers ch 
       JOIN logistics l ON ch.order_id = l.order_id 
+      WHERE ch.order_id != ''
       GROUP BY ch.port_code
     `)
     
     const portMapping: Record<string, string> = {
       'CNSHA': '上海',
+      'CNSGH': '上海',
       'CNYTN': '深圳',
       'CNCAN': '广州',
       'CNNGB': '宁波',
       'CNTAO': '青岛',
       'CNXMN': '厦门',
       'CNTNJ': '天津',
+      'CNHKG': '香港',
       'USLAX': '洛杉矶',
       'NLRTM': '鹿特丹',
       'JPOSA': '大阪'
@@ -2789,6 +2841,15 @@ export async function countInventory(q: string) {
   return json.count || 0
 }
 
+export async function getInventoryForecast(names: string[], horizon = 7) {
+  const qs = new URLSearchParams()
+  if (names.length) qs.set('names', names.join(','))
+  qs.set('horizon', String(horizon))
+  const res = await fetch(`/api/inventory/forecast?${qs.toString()}`)
+  if (!res.ok) return { items: [] }
+  return res.json()
+}
+
 export async function upsertInventory(i: any) {
   await fetch('/api/inventory', {
     method: 'POST',
@@ -42,6 +42,7 @@ export const Capabilities: React.FC = () => {
   const [paymentMethods, setPaymentMethods] = useState<any[]>([]);
   const flowGraphRef = useRef<HTMLDivElement|null>(null);
   const [roiData, setRoiData] = useState<any>(null);
+  const [roiDays, setRoiDays] = useState(7);
   const [valueMetrics, setValueMetrics] = useState({
     totalValueCreated: 0,
     riskPrevented: 0,
@@ -235,10 +236,6 @@ export const Capabilities: React.FC = () => {
             });
         }
 
-        // Fetch ROI Data
-        const roiRes = await fetch('/api/model-metrics/roi-analysis');
-        if (roiRes.ok) setRoiData(await roiRes.json());
-
         // Fetch Execution Logs
         const logsRes = await fetch('/api/model-metrics/execution-logs?limit=10');
         if (logsRes.ok) { /* consumed elsewhere in future */ await logsRes.json(); }
@@ -269,6 +266,14 @@ export const Capabilities: React.FC = () => {
     load();
   }, [algPage, algPageSize, traceQuery, traceOutcome, traceModel, traceHs, tracePage, tracePageSize]);
 
+  // ROI 趋势取自按日汇总表，切换 7/30/365 天只重新拉取趋势
+  useEffect(() => {
+    fetch(`/api/model-metrics/roi-analysis?days=${roiDays}`)
+      .then(res => res.ok ? res.json() : null)
+      .then(data => { if (data) setRoiData(data) })
+      .catch(() => {})
+  }, [roiDays]);
+
   useEffect(() => {
     const id = setInterval(() => {
       setValueMetrics(prev => ({
@@ -592,6 +597,11 @@ export const Capabilities: React.FC = () => {
           {/* 2. 可视化监控看板 (Visual Monitoring) */}
           <div className="grid grid-cols-1 lg:grid-cols-3 gap-6">
             <HudPanel title="模型效果与业务ROI趋势" subtitle="准确率 vs 业务回报率" className="lg:col-span-3 w-full">
+              <div className="flex justify-end gap-2 mb-2 text-xs">
+                {[7, 30, 365].map(d => (
+                  <button key={d} onClick={() => setRoiDays(d)} className={`px-2 py-1 rounded border ${roiDays === d ? 'border-cyber-cyan text-cyber-cyan' : 'border-gray-700 text-gray-400'}`}>{d}天</button>
+                ))}
+              </div>
               <div className="h-80">
                 {roiData ? (
                   <ResponsiveContainer width="100%" height="100%">
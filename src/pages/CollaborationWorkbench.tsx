@@ -1,7 +1,7 @@
 import React, { useEffect, useState, useCallback } from 'react'
 import { CreditCard, Truck } from 'lucide-react'
 import { HudPanel, StatusBadge, GlowButton } from '../components/ui/HudPanel'
-import { getPaymentMethods, completeSettlement, getAlgorithmRecommendations, getHsChapters, getIncotermsList, getTransportModes, getOrdersPaged, countOrders, countCustomsHeaders, getSettlementByOrder, getLatestLogisticsByOrder, getCustomsHeaderByOrder, getCustomsHeadersPaged } from '../lib/sqlite'
+import { getPaymentMethods, completeSettlement, getAlgorithmRecommendations, getHsChapters, getIncotermsList, getTransportModes, getOrdersPaged, countOrders, countCustomsHeaders, getDownstreamByOrder, getCustomsHeadersPaged } from '../lib/sqlite'
 
 export const CollaborationWorkbench: React.FC = () => {
   const [selectedTask, setSelectedTask] = useState<string | null>(null)
@@ -27,12 +27,12 @@ export const CollaborationWorkbench: React.FC = () => {
   const load = useCallback(async () => {
     const offset = (page-1)*pageSize
     const orders = await getOrdersPaged(q, 'all', offset, pageSize, category)
-    const enrich = await Promise.all(orders.map(async (o:any)=>{
-      const [sett, cust, lg] = await Promise.all([
-        getSettlementByOrder(o.id),
-        getCustomsHeaderByOrder(o.id),
-        getLatestLogisticsByOrder(o.id)
-      ])
+    // 整页订单的结算 / 报关 / 物流各一次批量查询，行摘要只取每类的第一条
+    const downstream = await getDownstreamByOrder(orders.map((o:any)=>o.id))
+    const enrich = orders.map((o:any)=>{
+      const sett = downstream.settlements?.[o.id]?.[0]
+      const cust = downstream.declarations?.[o.id]?.[0]
+      const lg = downstream.shipments?.[o.id]?.[0]
       const payStatus = sett?.status || undefined
       const customsStatus = cust?.status || undefined
       const logisticsStatus = lg?.status || undefined
@@ -44,7 +44,7 @@ export const CollaborationWorkbench: React.FC = () => {
       if (payStatus==='pending') tags.push('待支付')
       if (!tags.length) tags.push('处理中')
       return { id: o.orderNumber, orderId: o.id, title: o.enterprise, route, tags, payStatus, customsStatus, logisticsStatus }
-    }))
+    })
     setTasks(enrich)
     // 统计总数（考虑分类过滤）
     const totalCnt = await countOrders(q, 'all', category)
@@ -1,7 +1,7 @@
 import React, { useCallback, useEffect, useMemo, useState } from 'react'
 import { useAuth } from '../hooks/useAuth'
 import { HudPanel, GlowButton, StatusBadge } from '../components/ui/HudPanel'
-import { getCustomsHeadersPaged, countCustomsHeaders, getCustomsItems, upsertCustomsHeader, insertCustomsItem, computeTaxes, computeLandedCost, getKpiImprovements, getAlgorithmRecommendations, ensureCustomsTables, getHsChapters, getHsHeadings, getHsSubheadings, getPorts, getLinkableOrders, queryAll, applyBusinessModel } from '../lib/sqlite'
+import { getCustomsHeadersPaged, getCustomsHeadersPagedWithTotal, getCustomsItemsBatch, upsertCustomsHeader, insertCustomsItem, computeTaxes, computeLandedCost, getKpiImprovements, getAlgorithmRecommendations, ensureCustomsTables, getHsChapters, getHsHeadings, getHsSubheadings, getPorts, getLinkableOrders, queryAll, applyBusinessModel } from '../lib/sqlite'
 import * as XLSX from 'xlsx'
 
 export const Customs: React.FC = () => {
@@ -47,9 +47,8 @@ export const Customs: React.FC = () => {
   const load = useCallback(async () => {
     setLoading(true)
     try {
-      const list = await getCustomsHeadersPaged(q, status, port, mode, (page-1)*pageSize, pageSize, hsChapter==='unclassified'?'':hsChapter, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderIdFilter)
-      setRows(list)
-      const cnt = await countCustomsHeaders(q, status, port, mode, hsChapter==='unclassified'?'':hsChapter, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderIdFilter)
+      const { items, total: cnt } = await getCustomsHeadersPagedWithTotal(q, status, port, mode, (page-1)*pageSize, pageSize, hsChapter==='unclassified'?'':hsChapter, hsHead, hsSub, onlyBadHs, onlyMissingUnit, onlyAbnormalQty, orderIdFilter, true)
+      setRows(items)
       setTotal(cnt)
     } finally {
       setLoading(false)
@@ -79,7 +78,8 @@ export const Customs: React.FC = () => {
   useEffect(() => {
     const run = async () => {
       if (!selected) { setItems([]); return }
-      const its = await getCustomsItems(selected.id)
+      // 列表已随报关单一并返回明细（include=items），仅在缺失时补取
+      const its = Array.isArray(selected.items) ? selected.items : ((await getCustomsItemsBatch([selected.id]))[selected.id] || [])
       setItems(its)
     }
     const id = setTimeout(() => { void run() }, 0)
@@ -526,8 +526,9 @@ export const Customs: React.FC = () => {
                           const tax = computeTaxes(hs, share * fx(currency))
                           await insertCustomsItem({ id: `${selected.id}_${i+1}`, headerId: selected.id, lineNo: i+1, hsCode: hs, name, spec: 'Standard', unit, qty, unitPrice, amount: share, originCountry: 'CN', taxRate: (Math.round((tax.tariffRate+tax.vatRate+tax.exciseRate)*1000)/1000), tariff: tax.tariff, excise: tax.excise, vat: tax.vat })
                         }
-                        const its = await getCustomsItems(selected.id)
+                        const its = (await getCustomsItemsBatch([selected.id]))[selected.id] || []
                         setItems(its)
+                        setRows(prev => prev.map(r => r.id === selected.id ? { ...r, items: its } : r))
                       }}>按SKU归并生成报关项</GlowButton>
                       )}
                     </div>
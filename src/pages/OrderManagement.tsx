@@ -1,6 +1,6 @@
 import React, { useCallback, useEffect, useState } from 'react'
 import { HudPanel, GlowButton, StatusBadge } from '../components/ui/HudPanel'
-import { getOrdersPaged, countOrders, upsertOrder, deleteOrder, getEnterprisesPaged, queryAll, applyBusinessModel, analyzeOrderRisk } from '../lib/sqlite'
+import { getOrdersPaged, countOrders, upsertOrder, deleteOrder, getEnterprisesPaged, getDownstreamByOrder, queryAll, applyBusinessModel, analyzeOrderRisk } from '../lib/sqlite'
 import { ShoppingCart, RefreshCw, Upload, Plus, Trash2, TrendingUp, AlertTriangle } from 'lucide-react'
 import * as XLSX from 'xlsx'
 import { useAuth } from '../hooks/useAuth'
@@ -52,7 +52,14 @@ export const OrderManagement: React.FC = () => {
         const risk = await applyBusinessModel(r.id)
         return { ...r, incoterms: ext?.incoterms || '', tradeTerms: ext?.tradeTerms || '', route: ext?.route || '', riskScore: risk.compliance || 0, riskMsgs: risk.messages || [] }
       }))
-      setRows(enriched)
+      // 结算、物流、报关状态各用一次按订单批量查询补齐
+      const down = await getDownstreamByOrder(list.map((r:any) => r.id))
+      setRows(enriched.map((r:any) => ({
+        ...r,
+        settlementStatus: down.settlements[r.id]?.[0]?.status,
+        logisticsStatus: down.shipments[r.id]?.[0]?.status,
+        customsStatus: down.declarations[r.id]?.[0]?.status
+      })))
       const cnt = await countOrders(q, status)
       setTotal(cnt)
     } finally {
@@ -220,6 +227,7 @@ export const OrderManagement: React.FC = () => {
                     <th className="px-4 py-3">品类</th>
                     <th className="px-4 py-3">金额</th>
                     <th className="px-4 py-3">状态</th>
+                    <th className="px-4 py-3">结算 / 物流 / 报关</th>
                     <th className="px-4 py-3">操作</th>
                   </tr>
                 </thead>
@@ -235,6 +243,7 @@ export const OrderManagement: React.FC = () => {
                       <td className="px-4 py-3">{row.category==='beauty'?'美妆':row.category==='electronics'?'电子':row.category==='wine'?'酒水':row.category==='textile'?'纺织':row.category==='appliance'?'家电':row.category}</td>
                       <td className="px-4 py-3 text-emerald-400">{isWarehouse ? '***' : `${row.currency}${['USD','CNY','EUR','GBP'].includes(row.currency)?`（${row.currency==='USD'?'美元':row.currency==='CNY'?'人民币':row.currency==='EUR'?'欧元':'英镑'}）`:''} ${row.amount?.toLocaleString()}`}</td>
                       <td className="px-4 py-3"><StatusBadge status={row.status} /></td>
+                      <td className="px-4 py-3 text-xs text-gray-400">{row.settlementStatus || '-'} / {row.logisticsStatus || '-'} / {row.customsStatus || '-'}</td>
                       <td className="px-4 py-3">
                         {canEdit && (
                           <button onClick={(e) => { e.stopPropagation(); handleDelete(row.id) }} className="text-red-400 hover:text-red-300 transition-colors p-1">
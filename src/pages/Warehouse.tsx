@@ -1,6 +1,6 @@
 import React, { useCallback, useEffect, useState } from 'react'
 import { HudPanel, GlowButton } from '../components/ui/HudPanel'
-import { getInventoryPaged, countInventory, upsertInventory, deleteInventory, analyzeWarehouse } from '../lib/sqlite'
+import { getInventoryPaged, countInventory, upsertInventory, deleteInventory, getInventoryForecast, analyzeWarehouse } from '../lib/sqlite'
 import { Factory, Package, ArrowDownCircle, TrendingUp, Layers } from 'lucide-react'
 import { useAuth } from '../hooks/useAuth'
 
@@ -35,7 +35,9 @@ export const Warehouse: React.FC = () => {
         const analysis = await analyzeWarehouse(`Zone ${zone}`)
         return { ...r, zoneAnalysis: analysis }
       }))
-      setRows(enriched)
+      const fc = list.length ? await getInventoryForecast(list.map((r:any) => r.name)) : { items: [] }
+      const byName = new Map((fc.items || []).map((f:any) => [f.name, f]))
+      setRows(enriched.map((r:any) => ({ ...r, forecast: byName.get(r.name) })))
       const cnt = await countInventory(q)
       setTotal(cnt)
     } finally {
@@ -141,6 +143,15 @@ export const Warehouse: React.FC = () => {
                       <span className="text-white font-mono">{row.sales}</span>
                     </div>
                   </div>
+                  {row.forecast && (
+                    <div className="flex justify-between items-center text-xs">
+                      <span className="text-gray-400">预测7日需求</span>
+                      <span className="text-white font-mono">
+                        {Math.round(row.forecast.total)}
+                        {row.forecast.coverDays != null && <span className="text-gray-500 ml-2">可售 {row.forecast.coverDays} 天</span>}
+                      </span>
+                    </div>
+                  )}
 
                   <div className="flex justify-between items-center text-xs border-t border-gray-700 pt-2 mt-2">
                     <span className="text-gray-400">周转效率</span>
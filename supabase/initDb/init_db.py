@@ -419,8 +419,14 @@ def _flush(cursor, data):
     )
     cursor.executemany("INSERT INTO settlements VALUES (?,?,?,?,?)", data['settlements'])
     cursor.executemany("INSERT INTO logistics VALUES (?,?,?,?,?,?,?,?,?)", data['logistics'])
-    cursor.executemany("INSERT INTO customs_headers VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", data['customs_headers'])
-    cursor.executemany("INSERT INTO customs_items VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", data['customs_items'])
+    cursor.executemany(
+        "INSERT INTO customs_headers (id, declaration_no, enterprise, consignor, consignee, port_code, trade_mode, currency, total_value, gross_weight, net_weight, packages, country_origin, country_dest, status, declare_date, order_id, updated_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+        data['customs_headers']
+    )
+    cursor.executemany(
+        "INSERT INTO customs_items (id, header_id, line_no, hs_code, name, spec, unit, qty, unit_price, amount, origin_country, tax_rate, tariff, excise, vat) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+        data['customs_items']
+    )
     for k in data: data[k].clear()
 
 # --- 主程序入口 ---